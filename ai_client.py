@@ -1,75 +1,405 @@
 """Anthropic API wrapper for idea extraction, dedup, enrichment, and prompt building."""
 
+import asyncio
+import json
 import re
 import time
+from typing import Callable
 
-from anthropic import Anthropic, APIConnectionError, APIStatusError
+import aio
+import issue_index
+import metrics
+import rate_governor
+import response_cache
+from chunker import estimate_tokens, iter_chunks, merge_issues
+from config import (
+    MODEL, FAST_MODEL, FAST_MAX_INPUT_TOKENS, PROMPT_MODEL, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS,
+    CHUNK_CONCURRENCY, DEDUP_TOP_K, DEDUP_MIN_SCORE, STRUCTURED_OUTPUT, log,
+)
+from parser import ISSUES_TOOL, parse_issues, parse_numbered_issues, format_issues
 
-from config import ANTHROPIC_API_KEY, MODEL, log
-
-RETRY_DELAYS = [5, 15, 30]  # seconds — exponential backoff for transient errors
 RETRYABLE_STATUS_CODES = {429, 529}
 
 
-def call_anthropic(user_content: str, max_tokens: int = 4096, model: str | None = None,
-                   timeout: float = 120.0, stream: bool | None = None) -> str:
-    """Call Anthropic API. Auto-streams for large max_tokens to avoid WSL2 TCP drops."""
-    use_stream = stream if stream is not None else (max_tokens > 2048)
-    client = Anthropic(api_key=ANTHROPIC_API_KEY, timeout=timeout)
+USAGE = {"calls": 0, "input_tokens": 0, "cache_read_input_tokens": 0,
+         "cache_creation_input_tokens": 0, "output_tokens": 0}
+
+ROUTES: dict[tuple[str, str], list] = {}  # (task, model) → [calls, seconds, escalations, prompts under cache minimum]
+
+# Shortest prefix (tools + system) each model will cache, in tokens. First substring match wins.
+CACHE_MIN_TOKENS = [
+    ("haiku-4-5", 4096),
+    ("haiku", 2048),
+    ("opus-4-5", 4096),
+    ("", 1024),
+]
+
+
+def _cache_min_tokens(model: str) -> int:
+    return next(tokens for fragment, tokens in CACHE_MIN_TOKENS if fragment in model)
+
+
+def cacheable(model: str, system: str | None, tool: dict | None = None) -> bool:
+    """Whether the ``tool`` + ``system`` prefix is long enough for ``model`` to cache it."""
+    if not system:
+        return False
+    prefix = system + (json.dumps(tool) if tool else "")
+    return estimate_tokens(prefix) >= _cache_min_tokens(model)
+
+
+def message_params(user_content: str, max_tokens: int = 4096, model: str | None = None,
+                   system: str | None = None, tool: dict | None = None) -> dict:
+    """Messages API parameters for one call — shared by live calls and batch submissions.
+
+    ``system`` carries the static prompt file. It is marked cacheable when the
+    prefix reaches the model's minimum (CACHE_MIN_TOKENS), so repeat calls with
+    the same prompt reuse the processed prefix and only the per-item
+    ``user_content`` is new input; a shorter prefix would never be cached and
+    is sent plain. ``tool``, if given, is the only tool offered and the model is
+    made to call it, so the answer comes back as its JSON input.
+    """
+    model = model or MODEL
+    params = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "messages": [{"role": "user", "content": user_content}],
+    }
+    if system:
+        params["system"] = [{"type": "text", "text": system}]
+        if cacheable(model, system, tool):
+            params["system"][0]["cache_control"] = {"type": "ephemeral"}
+    if tool:
+        params["tools"] = [tool]
+        params["tool_choice"] = {"type": "tool", "name": tool["name"]}
+    return params
+
+
+def message_text(message) -> str:
+    """The answer in a Message — a forced tool call's input as JSON text, otherwise the text block."""
+    for block in message.content:
+        if block.type == "tool_use":
+            return json.dumps(block.input)
+    return next((block.text for block in message.content if block.type == "text"), "")
+
+
+def _record_usage(usage) -> dict:
+    """Add one response's token usage to USAGE and the open metrics span, log it and return the counts."""
+    counts = {key: getattr(usage, key, 0) or 0 for key in USAGE if key != "calls"}
+    USAGE["calls"] += 1
+    for key, value in counts.items():
+        USAGE[key] += value
+    log(f"  Tokens: {counts['input_tokens'] + counts['cache_read_input_tokens'] + counts['cache_creation_input_tokens']} in "
+        f"({counts['cache_read_input_tokens']} cached, {counts['cache_creation_input_tokens']} cache-written), "
+        f"{counts['output_tokens']} out")
+    metrics.add(**counts)
+    return counts
+
+
+def usage_summary() -> str:
+    if not USAGE["calls"]:
+        return "AI usage: no calls."
+    prompt_tokens = USAGE["input_tokens"] + USAGE["cache_read_input_tokens"] + USAGE["cache_creation_input_tokens"]
+    hit_rate = USAGE["cache_read_input_tokens"] / prompt_tokens * 100 if prompt_tokens else 0.0
+    return (f"AI usage: {USAGE['calls']} call(s), {prompt_tokens} input tokens "
+            f"({USAGE['cache_read_input_tokens']} from cache, {hit_rate:.0f}%), {USAGE['output_tokens']} output tokens.")
+
+
+async def call_anthropic_async(user_content: str, max_tokens: int = 4096, model: str | None = None,
+                               timeout: float = 120.0, stream: bool | None = None,
+                               system: str | None = None, on_text: Callable[[str], None] | None = None,
+                               tool: dict | None = None) -> str:
+    """Call Anthropic API on the shared client. Auto-streams for large max_tokens to avoid WSL2 TCP drops.
+
+    Identical requests are answered from the on-disk response cache. ``on_text``,
+    if given, forces streaming and receives each text delta as it arrives (a
+    cached response is passed in one piece). With ``tool`` the returned text is
+    the tool input as JSON, and the deltas are pieces of that JSON.
+    """
+    params = message_params(user_content, max_tokens, model, system, tool)
+    cache_key = response_cache.cache_key(params)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        log("  AI response cache hit — skipping API call.")
+        with metrics.span("ai_cache", "hit") as span:
+            span.add(bytes=len(cached.encode("utf-8")))
+        if on_text is not None:
+            on_text(cached)
+        return cached
+
+    text = await _call_api(params, max_tokens, timeout, stream, on_text)
+    response_cache.put(cache_key, params["model"], text)
+    return text
+
+
+def _input_tokens(params: dict) -> int:
+    """Rough input-token count of a request, for the rate governor's token budget."""
+    system = "".join(block["text"] for block in params.get("system", []))
+    return estimate_tokens(system + params["messages"][0]["content"])
+
+
+async def _call_api(params: dict, max_tokens: int, timeout: float, stream: bool | None,
+                    on_text: Callable[[str], None] | None = None) -> str:
+    """Send one request through the model's rate governor, retrying transient failures.
+
+    Each attempt holds a governor slot and hands the response's rate-limit
+    headers back to it. Once any text has reached ``on_text`` a failure is
+    raised rather than retried, since a retry would produce a different response.
+    """
+    from anthropic import APIConnectionError, APIStatusError  # deferred: the SDK takes over a second to import
+
+    use_stream = on_text is not None or (stream if stream is not None else (max_tokens > 2048))
+    client = aio.anthropic_client().with_options(timeout=timeout, max_retries=0)  # retries go through the governor
+    gov = rate_governor.governor(params["model"])
+    tokens = _input_tokens(params)
+    retries = len(rate_governor.RETRY_DELAYS)
     last_exc = None
-    for attempt in range(len(RETRY_DELAYS) + 1):
-        try:
-            if use_stream:
-                # Streaming keeps the TCP connection alive — prevents WSL2
-                # network bridge from dropping idle long-running requests.
-                chunks: list[str] = []
-                with client.messages.stream(
-                    model=model or MODEL,
-                    max_tokens=max_tokens,
-                    messages=[{"role": "user", "content": user_content}],
-                ) as stream_resp:
-                    for text in stream_resp.text_stream:
-                        chunks.append(text)
-                return "".join(chunks)
-            else:
-                message = client.messages.create(
-                    model=model or MODEL,
-                    max_tokens=max_tokens,
-                    messages=[{"role": "user", "content": user_content}],
-                )
-                return message.content[0].text
-        except APIStatusError as exc:
-            if exc.status_code not in RETRYABLE_STATUS_CODES or attempt >= len(RETRY_DELAYS):
-                raise
-            last_exc = exc
-            delay = RETRY_DELAYS[attempt]
-            log(f"  API returned {exc.status_code} — retrying in {delay}s (attempt {attempt + 1}/{len(RETRY_DELAYS)})...")
-            time.sleep(delay)
-        except (APIConnectionError, ConnectionError, TimeoutError) as exc:
-            if attempt >= len(RETRY_DELAYS):
-                raise
-            last_exc = exc
-            delay = RETRY_DELAYS[attempt]
-            log(f"  Connection error ({type(exc).__name__}) — retrying in {delay}s (attempt {attempt + 1}/{len(RETRY_DELAYS)})...")
-            time.sleep(delay)
+    chunks: list[str] = []
+    with metrics.span("anthropic", params["model"]) as span:
+        if "cache_control" in (params.get("system") or [{}])[0]:
+            span.add(cacheable_calls=1)  # in the run report next to count: which tier can hit the prompt cache
+        for attempt in range(retries + 1):
+            await gov.acquire(tokens)
+            headers, throttled, server_delay, succeeded = None, False, None, False
+            try:
+                if use_stream:
+                    # Streaming keeps the TCP connection alive — prevents WSL2
+                    # network bridge from dropping idle long-running requests.
+                    chunks = []
+                    async with client.messages.stream(**params) as stream_resp:
+                        headers = stream_resp.response.headers
+                        async for event in stream_resp:
+                            if event.type == "text":
+                                text = event.text
+                            elif event.type == "input_json":
+                                text = event.partial_json
+                            else:
+                                continue
+                            chunks.append(text)
+                            if on_text is not None:
+                                on_text(text)
+                        message = await stream_resp.get_final_message()
+                    _record_usage(message.usage)
+                    text = message_text(message) if "tools" in params else "".join(chunks)
+                    span.add(bytes=len(text.encode("utf-8")))
+                    succeeded = True
+                    return text
+                else:
+                    raw = await client.messages.with_raw_response.create(**params)
+                    headers = raw.headers
+                    message = await raw.parse()
+                    _record_usage(message.usage)
+                    text = message_text(message)
+                    span.add(bytes=len(text.encode("utf-8")))
+                    succeeded = True
+                    return text
+            except APIStatusError as exc:
+                headers = exc.response.headers
+                throttled = exc.status_code in RETRYABLE_STATUS_CODES
+                server_delay = rate_governor.retry_after(headers) if throttled else None
+                if not throttled or attempt >= retries or (on_text and chunks):
+                    raise
+                last_exc = exc
+                delay = rate_governor.backoff(attempt, server_delay)
+                log(f"  API returned {exc.status_code} — retrying in {delay:.1f}s (attempt {attempt + 1}/{retries})...")
+            except (APIConnectionError, ConnectionError, TimeoutError) as exc:
+                if attempt >= retries or (on_text and chunks):
+                    raise
+                last_exc = exc
+                delay = rate_governor.backoff(attempt)
+                log(f"  Connection error ({type(exc).__name__}) — retrying in {delay:.1f}s (attempt {attempt + 1}/{retries})...")
+            finally:
+                await gov.release(headers, throttled, server_delay, succeeded)
+            span.add(retries=1)
+            await asyncio.sleep(delay)
     raise last_exc  # unreachable, but satisfies type checker
 
 
+def call_anthropic(user_content: str, max_tokens: int = 4096, model: str | None = None,
+                   timeout: float = 120.0, stream: bool | None = None, system: str | None = None) -> str:
+    """Sync wrapper around call_anthropic_async (no ``on_text`` — callbacks would run on the loop thread)."""
+    return aio.run(call_anthropic_async(user_content, max_tokens, model, timeout, stream, system))
+
+
+def route(task: str, user_content: str) -> str:
+    """Pick the model for one call from its task and input size.
+
+    Dedup verdicts and short extractions (quick ideas, micro-batches, small
+    files) go to FAST_MODEL. Longer extractions and enrichment stay on MODEL,
+    and prompt building uses PROMPT_MODEL. An empty FAST_MODEL sends
+    everything but prompt building to MODEL.
+    """
+    if task == "prompt":
+        return PROMPT_MODEL
+    if not FAST_MODEL or task == "enrich":
+        return MODEL
+    if task == "dedup" or estimate_tokens(user_content) <= FAST_MAX_INPUT_TOKENS:
+        return FAST_MODEL
+    return MODEL
+
+
+async def _timed_call_async(task: str, model: str, user_content: str, **kwargs) -> str:
+    started = time.monotonic()
+    try:
+        return await call_anthropic_async(user_content, model=model, **kwargs)
+    finally:
+        elapsed = time.monotonic() - started
+        stats = ROUTES.setdefault((task, model), [0, 0.0, 0, 0])
+        stats[0] += 1
+        stats[1] += elapsed
+        system = kwargs.get("system")
+        stats[3] += bool(system) and not cacheable(model, system, kwargs.get("tool"))
+        log(f"  Routed {task} (~{estimate_tokens(user_content)} tokens in) to {model} — {elapsed:.1f}s")
+
+
+async def _routed_call_async(task: str, user_content: str, valid: Callable[[str], bool] | None = None,
+                             on_restart: Callable[[], object] | None = None, **kwargs) -> str:
+    """Call the routed model; if a cheaper model's output fails ``valid``, repeat the call on MODEL.
+
+    ``on_restart`` runs before an escalated call re-streams to the same ``on_text``.
+    """
+    model = route(task, user_content)
+    text = await _timed_call_async(task, model, user_content, **kwargs)
+    if valid is None or model == MODEL or valid(text):
+        return text
+    log(f"  {model} output for {task} failed validation — escalating to {MODEL}.")
+    ROUTES[(task, model)][2] += 1
+    if on_restart is not None:
+        on_restart()
+    return await _timed_call_async(task, MODEL, user_content, **kwargs)
+
+
+def routing_summary() -> str:
+    if not ROUTES:
+        return "Model routing: no calls."
+    parts = []
+    for (task, model), (calls, seconds, escalated, uncacheable) in sorted(ROUTES.items()):
+        part = f"{task}→{model} {calls} call(s), avg {seconds / calls:.1f}s"
+        if escalated:
+            part += f", {escalated} escalated"
+        if uncacheable:
+            # The fast tier's minimum is above every prompt file, so cache hits come from the full model.
+            part += f", {uncacheable} with a prompt under {model}'s {_cache_min_tokens(model)}-token cache minimum"
+        parts.append(part)
+    return "Model routing: " + "; ".join(parts) + "."
+
+
+def _has_issues(text: str) -> bool:
+    return bool(parse_issues(text))
+
+
+def _issues_tool() -> dict | None:
+    return ISSUES_TOOL if STRUCTURED_OUTPUT else None
+
+
+def extraction_request(prompt_text: str, file_contents: str) -> dict | None:
+    """Batch request params for a single-call extraction, or None if the file needs chunking."""
+    if estimate_tokens(file_contents) > CHUNK_TOKENS:
+        return None
+    return message_params(file_contents, max_tokens=8192, system=prompt_text, tool=_issues_tool())
+
+
+async def extract_ideas_async(prompt_text: str, file_contents: str,
+                              on_text: Callable[[str], None] | None = None,
+                              on_restart: Callable[[], object] | None = None,
+                              emitted: Callable[[], int] | None = None) -> str:
+    """Extract ideas from file contents.
+
+    Files within CHUNK_TOKENS go out in a single call, streamed to ``on_text``
+    if given (``on_restart`` runs if the call is escalated and streamed again).
+    ``emitted`` reports how many issues the caller has already taken from the
+    stream: once any have, a response that fails validation is not escalated,
+    since a second extraction would hand the same ideas over again.
+    Larger files are split on paragraph/heading boundaries, each chunk is
+    extracted concurrently, and ideas repeated across chunk overlaps are merged
+    before the blocks are returned (``on_text`` is not used).
+    """
+    if estimate_tokens(file_contents) <= CHUNK_TOKENS:
+        valid = _has_issues if emitted is None else (lambda text: _has_issues(text) or emitted() > 0)
+        return await _routed_call_async("extract", file_contents, valid, on_restart, max_tokens=8192,
+                                        system=prompt_text, on_text=on_text, tool=_issues_tool())
+
+    chunks = list(iter_chunks(file_contents, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS))
+    log(f"  Large input (~{estimate_tokens(file_contents)} tokens) — extracting {len(chunks)} chunks...")
+    slots = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+    async def _extract_chunk(i: int, chunk: str) -> str:
+        header = f"[Excerpt {i} of {len(chunks)} from a longer transcript — extract only ideas present in this excerpt]"
+        async with slots:
+            return await _routed_call_async("extract", f"{header}\n\n{chunk}", _has_issues, max_tokens=8192,
+                                            system=prompt_text, tool=_issues_tool())
+
+    results = await asyncio.gather(
+        *(_extract_chunk(i, c) for i, c in enumerate(chunks, 1)), return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    per_chunk = [parse_issues(text) for text in results]
+    issues = merge_issues(per_chunk)
+    log(f"  Merged {sum(len(p) for p in per_chunk)} chunk issue(s) into {len(issues)}.")
+    if not issues:
+        return "\n\n".join(results)  # keep the raw text so the caller's preview shows what went wrong
+    return format_issues(issues)
+
+
 def extract_ideas(prompt_text: str, file_contents: str) -> str:
-    """Extract ideas from file contents. Single call — Sonnet handles large files natively."""
-    return call_anthropic(prompt_text + "\n\n" + file_contents, max_tokens=8192)
+    return aio.run(extract_ideas_async(prompt_text, file_contents))
 
 
-def enrich_issue(prompt_text: str, title: str, description: str) -> str:
+QUICK_BATCH_HEADER = """\
+[Batch of {count} separate quick ideas, each under its own === ITEM n === marker. \
+Treat every item as an independent input: output exactly one issue block per item, \
+numbered with that item's number — "### GITLAB ISSUE: [n]" for ITEM n. Do not merge or skip items.]"""
+
+QUICK_BATCH_STRUCTURED_HEADER = """\
+[Batch of {count} separate quick ideas, each under its own === ITEM n === marker. \
+Treat every item as an independent input: record exactly one issue per item, \
+with "item" set to that item's number. Do not merge or skip items.]"""
+
+
+async def extract_quick_batch_async(prompt_text: str, items: list[str]) -> str:
+    """Extract several short quick-idea inputs in one call.
+
+    Items are packed under numbered delimiters and the model is asked to number
+    each issue after its item, so parse_numbered_issues can map issues back to
+    their source.
+    """
+    header = QUICK_BATCH_STRUCTURED_HEADER if STRUCTURED_OUTPUT else QUICK_BATCH_HEADER
+    body = "\n\n".join(f"=== ITEM {i} ===\n{text.strip()}" for i, text in enumerate(items, 1))
+    content = f"{header.format(count=len(items))}\n\n{body}"
+    return await _routed_call_async("quick-batch", content, lambda text: bool(parse_numbered_issues(text)),
+                                    max_tokens=max(8192, 600 * len(items)), system=prompt_text,
+                                    tool=_issues_tool())
+
+
+def _enrichment_content(title: str, description: str) -> str:
+    return f"**Title:** {title}\n\n**Current Description:**\n{description}"
+
+
+def enrichment_request(prompt_text: str, title: str, description: str) -> dict:
+    """Batch request params for enriching one issue."""
+    return message_params(_enrichment_content(title, description), max_tokens=4096, system=prompt_text)
+
+
+async def enrich_issue_async(prompt_text: str, title: str, description: str) -> str:
     """Call Sonnet to enrich a Spark issue into Shaped."""
-    content = f"{prompt_text}\n\n**Title:** {title}\n\n**Current Description:**\n{description}"
-    return call_anthropic(content, max_tokens=4096, timeout=120.0)
+    content = _enrichment_content(title, description)
+    return await _routed_call_async("enrich", content, max_tokens=4096, timeout=120.0, system=prompt_text)
+
+
+def enrich_issue(prompt_text: str, title: str, description: str) -> str:
+    return aio.run(enrich_issue_async(prompt_text, title, description))
+
+
+async def build_prompt_async(prompt_text: str, title: str, description: str) -> str:
+    """Call PROMPT_MODEL to build a finished prompt from an enriched issue."""
+    content = f"**Title:** {title}\n\n**Description:**\n{description}"
+    return await _routed_call_async("prompt", content, max_tokens=8192, timeout=180.0, system=prompt_text)
 
 
 def build_prompt(prompt_text: str, title: str, description: str) -> str:
-    """Call Sonnet to build a finished prompt from an enriched issue."""
-    content = f"{prompt_text}\n\n**Title:** {title}\n\n**Description:**\n{description}"
-    return call_anthropic(content, max_tokens=8192, timeout=180.0)
+    return aio.run(build_prompt_async(prompt_text, title, description))
 
 
 DEDUP_PROMPT = """\
@@ -78,7 +408,7 @@ You are a duplicate detector. Compare NEW issues against EXISTING issues on a Gi
 Two issues are duplicates if they describe the same idea, even if worded differently.
 For example: "Build Discord-to-GitLab Kanban bot" and "Build Discord-to-GitLab Kanban intake bot" are duplicates.
 
-EXISTING ISSUES (already on the board):
+EXISTING ISSUES (the closest matches {where}):
 {existing}
 
 NEW ISSUES (candidates to add):
@@ -93,38 +423,154 @@ NEW 2: DUPLICATE of #18
 NEW 3: KEEP
 """
 
+VERDICTS_TOOL = {
+    "name": "record_verdicts",
+    "description": "Record a KEEP or DUPLICATE verdict for every new issue.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "verdicts": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "new": {"type": "integer", "description": "The NEW issue number."},
+                        "verdict": {"type": "string", "enum": ["KEEP", "DUPLICATE"]},
+                        "duplicate_of": {"type": ["integer", "null"], "description": "iid of the existing issue, if a duplicate."},
+                    },
+                    "required": ["new", "verdict"],
+                },
+            },
+        },
+        "required": ["verdicts"],
+    },
+}
 
-def filter_duplicates(
-    new_issues: list[dict],
-    existing_issues: list[dict],
-) -> list[dict]:
-    """Use AI to semantically filter duplicates. Returns only non-duplicate issues."""
+
+def _verdicts(response: str) -> dict[int, str]:
+    """NEW number → "KEEP"/"DUPLICATE", from the structured verdicts or else the ``NEW n: ...`` lines."""
+    if response.lstrip().startswith("{"):
+        try:
+            verdicts = json.loads(response).get("verdicts")
+        except (ValueError, AttributeError):
+            verdicts = None
+        if isinstance(verdicts, list):
+            return {
+                v["new"]: str(v.get("verdict", "")).upper() for v in verdicts
+                if isinstance(v, dict) and isinstance(v.get("new"), int)
+            }
+    return {
+        int(m.group(1)): m.group(2).upper()
+        for m in re.finditer(r"NEW\s+(\d+)\s*:\s*(KEEP|DUPLICATE)", response, re.IGNORECASE)
+    }
+
+
+def _dedup_candidates(new_issues: list[dict], existing_issues: list[dict]) -> tuple[list[dict], dict]:
+    """The new issues with a close match on the board, and those matches (iid → title)."""
+    issue_index.sync(existing_issues)
+    candidates: dict = {}
+    suspects = []
+    for issue in new_issues:
+        matches = issue_index.find_candidates(issue["title"], k=DEDUP_TOP_K, min_score=DEDUP_MIN_SCORE)
+        if matches:
+            suspects.append(issue)
+            for match in matches:
+                candidates[match["iid"]] = match["title"]
+    return suspects, candidates
+
+
+def split_dedup_suspects(new_issues: list[dict], existing_issues: list[dict]) -> tuple[list[dict], list[dict]]:
+    """(issues with no close match on the board, issues that need the model's verdict) — no AI call."""
     if not existing_issues:
-        return new_issues
+        return new_issues, []
+    suspects, _ = _dedup_candidates(new_issues, existing_issues)
+    held = {id(issue) for issue in suspects}
+    return [issue for issue in new_issues if id(issue) not in held], suspects
+
 
+async def _judge_duplicates_async(suspects: list[dict], existing: dict, where: str) -> set[int]:
+    """ids of the ``suspects`` the model calls duplicates of ``existing`` (number → title). Empty if the call fails."""
     existing_text = "\n".join(
-        f"- #{iss['iid']}: {iss['title']}" for iss in existing_issues
+        f"- #{number}: {title}" for number, title in existing.items()
     )
     new_text = "\n".join(
-        f"- NEW {i}: {iss['title']}" for i, iss in enumerate(new_issues, 1)
+        f"- NEW {i}: {iss['title']}" for i, iss in enumerate(suspects, 1)
     )
 
-    prompt = DEDUP_PROMPT.format(existing=existing_text, new=new_text)
-    log(f"  Dedup check: {len(new_issues)} new vs {len(existing_issues)} existing issues...")
-
+    prompt = DEDUP_PROMPT.format(where=where, existing=existing_text, new=new_text)
     try:
-        response = call_anthropic(prompt, max_tokens=1024)
+        response = await _routed_call_async(
+            "dedup", prompt, lambda text: set(range(1, len(suspects) + 1)) <= _verdicts(text).keys(),
+            max_tokens=1024, tool=VERDICTS_TOOL if STRUCTURED_OUTPUT else None,
+        )
     except Exception as exc:
         log(f"  Warning: dedup AI call failed ({exc}), posting all issues to be safe.")
-        return new_issues
+        return set()
 
-    kept = []
-    for i, issue in enumerate(new_issues, 1):
-        line_pattern = rf"NEW\s+{i}\s*:\s*(KEEP|DUPLICATE)"
-        match = re.search(line_pattern, response, re.IGNORECASE)
-        if match and "duplicate" in match.group(1).lower():
+    verdicts = _verdicts(response)
+    duplicates = set()
+    for i, issue in enumerate(suspects, 1):
+        if verdicts.get(i) == "DUPLICATE":
             log(f"  SKIPPED (AI dedup): '{issue['title']}'")
-        else:
-            kept.append(issue)
+            duplicates.add(id(issue))
+    return duplicates
+
+
+async def filter_batch_repeats_async(groups: list[list[dict]]) -> list[dict]:
+    """Drop issues that repeat one from an earlier group (e.g. one idea sent twice in a micro-batch).
+
+    ``groups`` holds each source's issues, in order. Every issue is compared
+    locally with the issues of the groups before it; those with a close match
+    go to the model in one call, against only those earlier issues, so the
+    first copy is always the one kept. Returns the surviving issues, flattened.
+    """
+    issues = [issue for group in groups for issue in group]
+    suspects: list[dict] = []
+    candidates: dict = {}
+    seen: list[tuple[int, dict]] = []  # (number, issue) of earlier groups' issues that aren't suspects
+    for group in groups:
+        for issue in group:
+            earlier = [(n, other) for n, other in seen
+                       if issue_index.similarity(issue["title"], other["title"]) >= DEDUP_MIN_SCORE]
+            if earlier:
+                suspects.append(issue)
+                candidates.update((n, other["title"]) for n, other in earlier)
+        held = {id(issue) for issue in suspects}
+        for issue in group:
+            if id(issue) not in held:
+                seen.append((len(seen) + 1, issue))
+    if not suspects:
+        return issues
+
+    log(f"  Dedup check: {len(suspects)}/{len(issues)} new issue(s) close to one from another item in the batch...")
+    duplicates = await _judge_duplicates_async(suspects, dict(sorted(candidates.items())),
+                                               "from earlier items in the same batch")
+    return [issue for issue in issues if id(issue) not in duplicates]
+
+
+async def filter_duplicates_async(
+    new_issues: list[dict],
+    existing_issues: list[dict],
+) -> list[dict]:
+    """Filter duplicates: local index picks candidates, AI gives the verdict.
+
+    Each new issue is matched against the local similarity index of the board.
+    Issues with no candidate above DEDUP_MIN_SCORE are kept without an AI call;
+    the rest go to the model alongside only their top-k candidates, so the prompt
+    stays small no matter how large the board grows.
+    """
+    if not existing_issues:
+        return new_issues
+
+    suspects, candidates = _dedup_candidates(new_issues, existing_issues)
+    if not suspects:
+        log(f"  Dedup check: no close matches for {len(new_issues)} new issue(s) — keeping all.")
+        return new_issues
+
+    log(f"  Dedup check: {len(suspects)}/{len(new_issues)} new vs {len(candidates)} candidate issues...")
+    duplicates = await _judge_duplicates_async(suspects, candidates, "already on the board")
+    return [issue for issue in new_issues if id(issue) not in duplicates]
+
 
-    return kept
+def filter_duplicates(new_issues: list[dict], existing_issues: list[dict]) -> list[dict]:
+    return aio.run(filter_duplicates_async(new_issues, existing_issues))
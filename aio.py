@@ -0,0 +1,88 @@
+"""Shared asyncio event loop and long-lived, pooled API clients.
+
+All network I/O runs as coroutines on one background event loop. Sync code
+(the existing public functions, worker threads) submits work with ``run()``;
+async code awaits the ``*_async`` functions directly on the same loop. Clients
+are created once per loop and reused, so keep-alive connections and TLS
+sessions survive across calls instead of being rebuilt on every request.
+"""
+
+import asyncio
+import threading
+
+import httpx
+
+from config import ANTHROPIC_BASE_URL, anthropic_api_key
+
+# Per-host pool sizes — GitLab is the busiest (paging + posting), webhooks the lightest.
+HTTP_POOL_LIMITS = {
+    "gitlab": httpx.Limits(max_connections=10, max_keepalive_connections=10),
+    "discord": httpx.Limits(max_connections=4, max_keepalive_connections=4),
+    "webhook": httpx.Limits(max_connections=4, max_keepalive_connections=4),
+}
+DEFAULT_HTTP_TIMEOUT = 15.0
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+_http_clients: dict[tuple[int, str], httpx.AsyncClient] = {}
+_anthropic_clients: dict[int, object] = {}
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background event loop, starting it on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="intake-aio", daemon=True)
+            thread.start()
+            _loop = loop
+        return _loop
+
+
+def run(coro):
+    """Run a coroutine on the shared loop from sync code and return its result."""
+    loop = get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("aio.run() called from the shared event loop — await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def http_client(name: str) -> httpx.AsyncClient:
+    """Return the pooled HTTP client for a host group ("gitlab", "discord", "webhook")."""
+    key = (id(asyncio.get_running_loop()), name)
+    client = _http_clients.get(key)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=HTTP_POOL_LIMITS.get(name, httpx.Limits()),
+            timeout=DEFAULT_HTTP_TIMEOUT,
+        )
+        _http_clients[key] = client
+    return client
+
+
+def anthropic_client():
+    """Return the long-lived AsyncAnthropic client for the running loop."""
+    from anthropic import AsyncAnthropic
+
+    key = id(asyncio.get_running_loop())
+    client = _anthropic_clients.get(key)
+    if client is None:
+        client = AsyncAnthropic(api_key=anthropic_api_key(), base_url=ANTHROPIC_BASE_URL or None)
+        _anthropic_clients[key] = client
+    return client
+
+
+async def aclose() -> None:
+    """Close every client owned by the running loop."""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [k for k in _http_clients if k[0] == loop_id]:
+        await _http_clients.pop(key).aclose()
+    client = _anthropic_clients.pop(loop_id, None)
+    if client is not None:
+        await client.close()
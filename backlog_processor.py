@@ -1,9 +1,21 @@
 """Phase 2 backlog processor — enrich Spark issues, build prompts for Prompt-Request issues."""
 
-from config import ENRICHMENT_PROMPT_FILE, PROMPT_BUILDER_FILE, log
-from ai_client import enrich_issue, build_prompt
-from gitlab_client import fetch_issues_by_label, update_issue
-from delivery import deliver_prompt
+import asyncio
+import time
+
+import aio
+import batch_jobs
+import issue_cache
+import run_journal
+from config import (
+    ENRICHMENT_PROMPT_FILE, PROMPT_BUILDER_FILE,
+    PHASE2_ENRICH_WORKERS, PHASE2_UPDATE_WORKERS, PHASE2_PROMPT_WORKERS, log,
+)
+from ai_client import enrich_issue_async, enrichment_request, build_prompt_async
+from gitlab_client import GitLabError, fetch_issues_by_label_async, sync_issue_cache_async, update_issue_async
+from delivery import deliver_prompt_async
+
+SINKS = ("discord", "dropzone")
 
 
 def _load_prompt(path) -> str:
@@ -14,83 +26,252 @@ def _load_prompt(path) -> str:
     return path.read_text(encoding="utf-8")
 
 
-def _build_and_deliver_prompt(prompt_builder_prompt: str, iid, title: str, description: str) -> bool:
-    """Build a prompt with Sonnet and deliver to Discord + Dropzone. Returns True on success."""
+def _enrichment_source(issue: dict) -> str:
+    return run_journal.input_hash(issue["title"], issue.get("description", ""))
+
+
+async def _build_and_deliver_prompt(prompt_builder_prompt: str, iid, title: str, description: str) -> bool:
+    """Build a prompt (PROMPT_MODEL) and deliver to Discord + Dropzone. Returns True on success.
+
+    The built prompt and each sink's delivery go in the run journal, so a run
+    cut off before the Prompt-Delivered label went on neither rebuilds nor
+    re-sends the prompt.
+    """
+    delivered = [sink for sink in SINKS if run_journal.get("issue", iid, f"delivered:{sink}") is not None]
+    if delivered:
+        log(f"  Prompt for #{iid} was already delivered ({', '.join(delivered)}) — only relabelling.")
+        return True
     if not prompt_builder_prompt:
         log(f"  Warning: Prompt builder prompt not found — skipping prompt build for #{iid}")
         return False
 
-    log(f"  Building prompt for #{iid}: {title}")
+    source = run_journal.input_hash(title, description)
     try:
-        prompt_text = build_prompt(prompt_builder_prompt, title, description)
-        result = deliver_prompt(title, prompt_text)
-        discord_status = "ok" if result["discord"] else "failed"
-        dropzone_status = "ok" if result["dropzone"] else "failed"
-        log(f"  Prompt delivered — Discord: {discord_status}, Dropzone: {dropzone_status}")
+        prompt_text = run_journal.get("issue", iid, "prompt_built", source)
+        if prompt_text is None:
+            log(f"  Building prompt for #{iid}: {title}")
+            prompt_text = await build_prompt_async(prompt_builder_prompt, title, description)
+            run_journal.record("issue", iid, "prompt_built", prompt_text, source)
+        else:
+            log(f"  Reusing the prompt built for #{iid} by an earlier run: {title}")
+        result = await deliver_prompt_async(title, prompt_text)
+        for sink in SINKS:
+            if result[sink]:
+                run_journal.record("issue", iid, f"delivered:{sink}", result["filename"])
+        status = ", ".join(
+            f"{name}: {'ok' if result[sink] else 'failed'} ({result['seconds'][sink]:.1f}s)"
+            for sink, name in (("discord", "Discord"), ("dropzone", "Dropzone"))
+        )
+        log(f"  Prompt delivered — {status}")
         return result["discord"] or result["dropzone"]
     except Exception as exc:
         log(f"  ERROR: Could not build prompt for #{iid}: {exc}")
         return False
 
 
-def run_backlog_processor(pat: str) -> None:
-    """Process backlog: enrich Spark→Shaped, build prompts for any Prompt-Request issues."""
-    prompt_builder_prompt = _load_prompt(PROMPT_BUILDER_FILE)
+async def _apply_enrichment(pat: str, issue: dict, enriched: str) -> list[str] | None:
+    """Write the enriched description and relabel Spark → Shaped. Returns the new labels, or None on failure."""
+    new_labels = [l for l in issue.get("labels", []) if l != "Spark"] + ["Shaped"]
+    update_data = {
+        "description": enriched,
+        "labels": ",".join(new_labels),
+    }
+    if not await update_issue_async(pat, issue["iid"], update_data):
+        return None
+    run_journal.record("issue", issue["iid"], "updated", ",".join(new_labels))
+    return new_labels
 
-    # Step 1: Enrich Spark issues
-    enrichment_prompt = _load_prompt(ENRICHMENT_PROMPT_FILE)
-    spark_issues = fetch_issues_by_label(pat, "Spark") if enrichment_prompt else []
 
-    if spark_issues:
-        log(f"Phase 2: Enriching {len(spark_issues)} Spark issue(s)...")
-        for issue in spark_issues:
-            iid = issue["iid"]
-            title = issue["title"]
-            description = issue.get("description", "")
-            labels = issue.get("labels", [])
+async def _run_enrichment_batches(pat: str, enrichment_prompt: str, spark_issues: list[dict],
+                                  batch_mode: bool) -> list[dict]:
+    """Apply finished enrichment batches, then (in batch mode) submit the remaining Spark issues.
 
-            log(f"  Enriching #{iid}: {title}")
+    Returns the Spark issues still to be enriched live this run.
+    """
+    async def _apply_result(meta: dict, text: str | None) -> None:
+        if text is None:
+            return
+        if meta.get("source"):  # lets a live run reuse it if the update fails
+            run_journal.record("issue", meta["iid"], "enriched", text, meta["source"])
+        # The issue may have moved on since submit — apply to its current state, never the snapshot in meta.
+        await sync_issue_cache_async(pat)  # a no-op within ISSUE_CACHE_FRESH_SECONDS of the last sync
+        issue = issue_cache.get(meta["iid"])
+        if issue is None or "Spark" not in issue["labels"]:
+            log(f"  Skipping batched enrichment for #{meta['iid']}: no longer an open Spark issue.")
+            return
+        if meta.get("source") and _enrichment_source(issue) != meta["source"]:
+            log(f"  Skipping batched enrichment for #{meta['iid']}: edited since it was submitted.")
+            return
+        log(f"  Applying batched enrichment for #{issue['iid']}: {issue['title']}")
+        await _apply_enrichment(pat, issue, text)
 
-            try:
-                enriched = enrich_issue(enrichment_prompt, title, description)
-            except Exception as exc:
-                log(f"  ERROR: Could not enrich #{iid}: {exc}")
-                continue
+    if await batch_jobs.collect_async("enrich", _apply_result):
+        # Applied issues are Shaped now; re-read so they leave the Spark list
+        # and any Prompt-Request ones reach the prompt stage this run.
+        spark_issues = await fetch_issues_by_label_async(pat, "Spark") if enrichment_prompt else []
+    queued = {meta["iid"] for meta in batch_jobs.pending_items("enrich")}
+    spark_issues = [i for i in spark_issues if i["iid"] not in queued]
+    if queued:
+        log(f"Phase 2: {len(queued)} Spark issue(s) still waiting on a submitted batch.")
+    if not batch_mode or not spark_issues:
+        return spark_issues
 
-            new_labels = [l for l in labels if l != "Spark"] + ["Shaped"]
-            update_data = {
-                "description": enriched,
-                "labels": ",".join(new_labels),
-            }
+    requests = [
+        (
+            f"enrich-{issue['iid']}",
+            {"iid": issue["iid"], "title": issue["title"], "labels": issue.get("labels", []),
+             "source": _enrichment_source(issue)},
+            enrichment_request(enrichment_prompt, issue["title"], issue.get("description", "")),
+        )
+        for issue in spark_issues
+    ]
+    if await batch_jobs.submit_async("enrich", requests):
+        return []
+    return spark_issues
 
-            if not update_issue(pat, iid, update_data):
-                continue
 
-            if "Prompt-Request" in labels:
-                _build_and_deliver_prompt(prompt_builder_prompt, iid, title, enriched)
-    else:
-        log("Phase 2: No Spark issues to enrich.")
+def _new_stats(name: str, workers: int) -> dict:
+    return {"name": name, "workers": workers, "done": 0, "failed": 0, "busy": 0.0, "max_depth": 0}
+
+
+async def _put(queue: asyncio.Queue, item, stats: dict) -> None:
+    await queue.put(item)
+    stats["max_depth"] = max(stats["max_depth"], queue.qsize())
+
+
+async def _stage_worker(queue: asyncio.Queue, handler, stats: dict) -> None:
+    """Pull items off ``queue`` forever, timing each ``handler`` call into ``stats``."""
+    while True:
+        item = await queue.get()
+        started = time.monotonic()
+        try:
+            if await handler(item):
+                stats["done"] += 1
+            else:
+                stats["failed"] += 1
+        except Exception as exc:
+            stats["failed"] += 1
+            log(f"  UNEXPECTED ERROR in {stats['name']} stage for #{item['iid']}: {exc}")
+        finally:
+            stats["busy"] += time.monotonic() - started
+            queue.task_done()
+
+
+def _log_stage_stats(stages: list[dict], elapsed: float) -> None:
+    log(f"Phase 2 stage summary ({elapsed:.1f}s wall clock):")
+    for st in stages:
+        total = st["done"] + st["failed"]
+        if not total:
+            continue
+        per_min = total / elapsed * 60 if elapsed else 0.0
+        log(f"  {st['name']:<8} {st['done']} ok / {st['failed']} failed, {per_min:.1f}/min, "
+            f"{st['busy'] / total:.1f}s avg, max queue depth {st['max_depth']}, {st['workers']} worker(s)")
+
+
+async def run_backlog_processor_async(pat: str, batch_mode: bool = False) -> None:
+    """Process backlog: enrich Spark→Shaped, build prompts for any Prompt-Request issues.
 
-    # Step 2: Build prompts for any Prompt-Request issues that are already Shaped but not yet delivered
-    prompt_request_issues = fetch_issues_by_label(pat, "Prompt-Request")
-    # Filter to only Shaped issues (Spark ones were handled above)
+    Runs as a staged pipeline — enrich → GitLab update → prompt build/delivery —
+    with its own queue and worker limit per stage, so a slow prompt build never
+    holds up enrichment of the next Spark issue. Finished enrichment batches are
+    applied first; in batch mode the remaining Spark issues are submitted as a
+    Message Batch instead of enriched live.
+    """
+    prompt_builder_prompt = _load_prompt(PROMPT_BUILDER_FILE)
+    enrichment_prompt = _load_prompt(ENRICHMENT_PROMPT_FILE)
+
+    try:
+        spark_issues = await fetch_issues_by_label_async(pat, "Spark") if enrichment_prompt else []
+        spark_issues = await _run_enrichment_batches(pat, enrichment_prompt, spark_issues, batch_mode)
+        prompt_request_issues = await fetch_issues_by_label_async(pat, "Prompt-Request")
+    except GitLabError as exc:
+        log(f"Phase 2: ERROR: Could not load backlog issues: {exc}")
+        return
+
+    # Prompt-Request issues that are already Shaped but not yet delivered (Spark ones flow through enrichment)
     pending = [i for i in prompt_request_issues if "Shaped" in i.get("labels", []) and "Prompt-Delivered" not in i.get("labels", [])]
 
+    if spark_issues:
+        log(f"Phase 2: Enriching {len(spark_issues)} Spark issue(s)...")
+    else:
+        log("Phase 2: No Spark issues to enrich.")
     if pending:
         log(f"Phase 2: Building prompts for {len(pending)} Prompt-Request issue(s)...")
-        for issue in pending:
-            iid = issue["iid"]
-            title = issue["title"]
-            description = issue.get("description", "")
-            labels = issue.get("labels", [])
-
-            delivered = _build_and_deliver_prompt(prompt_builder_prompt, iid, title, description)
-
-            # Mark as delivered so we don't rebuild next run — only if it actually worked
-            if delivered:
-                new_labels = labels + ["Prompt-Delivered"]
-                update_issue(pat, iid, {"labels": ",".join(new_labels)})
     else:
         log("Phase 2: No pending Prompt-Request issues.")
+    if not spark_issues and not pending:
+        log("Phase 2 complete.")
+        return
+
+    enrich_q: asyncio.Queue = asyncio.Queue()
+    update_q: asyncio.Queue = asyncio.Queue()
+    prompt_q: asyncio.Queue = asyncio.Queue()
+    enrich_stats = _new_stats("enrich", PHASE2_ENRICH_WORKERS)
+    update_stats = _new_stats("update", PHASE2_UPDATE_WORKERS)
+    prompt_stats = _new_stats("prompt", PHASE2_PROMPT_WORKERS)
 
+    async def _enrich(issue: dict) -> bool:
+        source = _enrichment_source(issue)
+        enriched = run_journal.get("issue", issue["iid"], "enriched", source)
+        if enriched is not None:
+            log(f"  Reusing the enrichment of #{issue['iid']} from an earlier run: {issue['title']}")
+        else:
+            log(f"  Enriching #{issue['iid']}: {issue['title']}")
+            try:
+                enriched = await enrich_issue_async(enrichment_prompt, issue["title"], issue.get("description", ""))
+            except Exception as exc:
+                log(f"  ERROR: Could not enrich #{issue['iid']}: {exc}")
+                return False
+            run_journal.record("issue", issue["iid"], "enriched", enriched, source)
+        await _put(update_q, {**issue, "enriched": enriched}, update_stats)
+        return True
+
+    async def _update(issue: dict) -> bool:
+        new_labels = await _apply_enrichment(pat, issue, issue["enriched"])
+        if new_labels is None:
+            return False
+        if "Prompt-Request" in new_labels:
+            await _put(prompt_q, {**issue, "description": issue["enriched"], "labels": new_labels}, prompt_stats)
+        return True
+
+    async def _prompt(issue: dict) -> bool:
+        iid = issue["iid"]
+        delivered = await _build_and_deliver_prompt(
+            prompt_builder_prompt, iid, issue["title"], issue.get("description", ""),
+        )
+        # Mark as delivered so we don't rebuild next run — only if it actually worked
+        if delivered:
+            new_labels = issue.get("labels", []) + ["Prompt-Delivered"]
+            if await update_issue_async(pat, iid, {"labels": ",".join(new_labels)}):
+                run_journal.record("issue", iid, "labelled", ",".join(new_labels))
+                # Done — if the label is ever taken off again, that asks for a fresh prompt.
+                run_journal.forget("issue", iid, "prompt_built", *(f"delivered:{sink}" for sink in SINKS))
+        return delivered
+
+    started = time.monotonic()
+    for issue in spark_issues:
+        await _put(enrich_q, issue, enrich_stats)
+    for issue in pending:
+        await _put(prompt_q, issue, prompt_stats)
+
+    workers = [
+        *(asyncio.create_task(_stage_worker(enrich_q, _enrich, enrich_stats)) for _ in range(PHASE2_ENRICH_WORKERS)),
+        *(asyncio.create_task(_stage_worker(update_q, _update, update_stats)) for _ in range(PHASE2_UPDATE_WORKERS)),
+        *(asyncio.create_task(_stage_worker(prompt_q, _prompt, prompt_stats)) for _ in range(PHASE2_PROMPT_WORKERS)),
+    ]
+    try:
+        # Upstream stages feed downstream ones before marking items done, so joining in order drains everything.
+        await enrich_q.join()
+        await update_q.join()
+        await prompt_q.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    _log_stage_stats([enrich_stats, update_stats, prompt_stats], time.monotonic() - started)
     log("Phase 2 complete.")
+
+
+def run_backlog_processor(pat: str, batch_mode: bool = False) -> None:
+    aio.run(run_backlog_processor_async(pat, batch_mode))
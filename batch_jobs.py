@@ -0,0 +1,135 @@
+"""Message Batches mode — submit non-urgent AI work as one batch, apply results on a later run.
+
+Each submitted batch is recorded as JSON under DATA_ROOT/_batches with the
+metadata needed to apply its results (which file, which issue and its labels).
+Nothing is held open between runs: the next scheduled run checks the batch,
+and once it has ended hands each result to a caller-supplied handler.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+import aio
+from ai_client import message_text
+from config import DATA_ROOT, log
+
+BATCH_DIR = DATA_ROOT / "_batches"
+MAX_APPLY_ATTEMPTS = 3  # runs a result's handler may fail before the item falls back to the normal path
+
+
+def _state_files(kind: str) -> list:
+    if not BATCH_DIR.exists():
+        return []
+    files = []
+    for path in sorted(BATCH_DIR.glob("*.json")):
+        try:
+            state = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            log(f"  Warning: could not read batch state {path.name}: {exc}")
+            continue
+        if state.get("kind") == kind:
+            files.append((path, state))
+    return files
+
+
+def pending_items(kind: str) -> list[dict]:
+    """Metadata of every item still waiting in a submitted batch of ``kind``."""
+    return [meta for _, state in _state_files(kind) for meta in state["items"].values()]
+
+
+async def submit_async(kind: str, requests: list[tuple[str, dict, dict]]) -> str | None:
+    """Submit ``(custom_id, meta, params)`` requests as one batch. Returns the batch id."""
+    if not requests:
+        return None
+    from anthropic import APIError  # deferred, like the client itself
+
+    try:
+        batch = await aio.anthropic_client().messages.batches.create(
+            requests=[{"custom_id": custom_id, "params": params} for custom_id, _, params in requests],
+        )
+    except APIError as exc:
+        log(f"  ERROR: Could not submit {kind} batch: {exc}")
+        return None
+
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    state = {
+        "id": batch.id,
+        "kind": kind,
+        "submitted_at": datetime.now(timezone.utc).isoformat(),
+        "items": {custom_id: meta for custom_id, meta, _ in requests},
+    }
+    (BATCH_DIR / f"{batch.id}.json").write_text(json.dumps(state, indent=2), encoding="utf-8")
+    log(f"  Submitted {kind} batch {batch.id} with {len(requests)} request(s).")
+    return batch.id
+
+
+async def collect_async(kind: str, handler: Callable[[dict, str | None], Awaitable[None]]) -> int:
+    """Apply results of every ended batch of ``kind``. Returns the number of items handled.
+
+    ``handler(meta, text)`` gets ``text=None`` for items that errored, expired or
+    were canceled — those fall back to the normal path on a later run. An item
+    leaves the batch's state file only once its handler has returned, so a
+    result whose handler raised (or was never reached) is handed over again on
+    the next run, up to MAX_APPLY_ATTEMPTS times. The file is removed when no
+    items are left.
+    """
+    states = _state_files(kind)
+    if not states:
+        return 0  # the common case — don't load the SDK just to find nothing
+    from anthropic import APIError
+
+    client = aio.anthropic_client()
+    handled = 0
+    for path, state in states:
+        batch_id = state["id"]
+        try:
+            batch = await client.messages.batches.retrieve(batch_id)
+            if batch.processing_status != "ended":
+                log(f"  Batch {batch_id} ({kind}) still {batch.processing_status} — will check next run.")
+                continue
+            results = await client.messages.batches.results(batch_id)
+        except APIError as exc:
+            log(f"  Warning: could not check batch {batch_id}: {exc}")
+            continue
+
+        log(f"  Collecting {kind} batch {batch_id}...")
+        remaining = dict(state["items"])
+        try:
+            async for entry in results:
+                meta = remaining.get(entry.custom_id)
+                if meta is None:
+                    continue
+                text = None
+                if entry.result.type == "succeeded":
+                    text = message_text(entry.result.message)
+                else:
+                    log(f"  Batch item {entry.custom_id} {entry.result.type} — will retry via the normal path.")
+                try:
+                    await handler(meta, text)
+                except Exception as exc:
+                    attempts = meta.get("attempts", 0) + 1
+                    if attempts < MAX_APPLY_ATTEMPTS:
+                        log(f"  ERROR: Could not apply batch result {entry.custom_id}: {exc} — will retry next run.")
+                        remaining[entry.custom_id] = {**meta, "attempts": attempts}
+                        continue
+                    log(f"  ERROR: Could not apply batch result {entry.custom_id}: {exc} — "
+                        f"giving up after {attempts} attempts; it goes through the normal path.")
+                del remaining[entry.custom_id]
+                handled += 1
+        except APIError as exc:
+            log(f"  Warning: could not read all results of batch {batch_id}: {exc}")
+        _finish(path, state, remaining)
+    return handled
+
+
+def _finish(path, state: dict, remaining: dict) -> None:
+    """Drop a collected batch's state file, or keep just the items still to be handed over."""
+    if not remaining:
+        path.unlink(missing_ok=True)
+        return
+    log(f"  Batch {state['id']}: {len(remaining)} result(s) left to apply next run.")
+    try:
+        path.write_text(json.dumps({**state, "items": remaining}, indent=2), encoding="utf-8")
+    except OSError as exc:
+        log(f"  Warning: could not update batch state {path.name}: {exc}")
@@ -0,0 +1,110 @@
+"""Synthetic, seeded corpus for the benchmark — board issues, brain dumps and Discord one-liners.
+
+Every idea is one paragraph whose first sentence is its title, so the fake
+Anthropic server can "extract" it back out deterministically. A share of the
+ideas reuse titles already on the board, which exercises the dedup path.
+
+Run directly to write a corpus to a folder:
+
+    python bench/corpus.py OUT_DIR [--dumps 10] [--oneliners 40] [--board 1000] [--seed 1]
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+
+VERBS = [
+    "Build", "Automate", "Sketch", "Prototype", "Refactor", "Document", "Measure", "Replace",
+    "Schedule", "Track", "Summarise", "Sync", "Archive", "Visualise", "Cache", "Audit",
+]
+THINGS = [
+    "Discord bot", "Kanban board", "weekly review", "reading list", "home lab backup", "invoice export",
+    "meeting notes", "habit tracker", "podcast queue", "recipe planner", "photo library", "budget report",
+    "journal prompts", "garden log", "workout plan", "travel checklist", "NAS dashboard", "inbox triage",
+]
+QUALIFIERS = [
+    "with GitLab sync", "for the family", "on the Synology", "using webhooks", "in the morning routine",
+    "with a weekly digest", "from voice memos", "with tagging", "for quarterly planning", "behind Tailscale",
+    "with offline support", "as a CLI", "via email", "with reminders", "for the team",
+]
+FILLER = [
+    "This keeps coming up whenever the week gets busy.",
+    "It should stay small enough to finish in an evening.",
+    "Worth checking what already exists before writing anything.",
+    "The annoying part today is doing it by hand every time.",
+    "Ideally it runs unattended and only pings when something needs a decision.",
+    "There might be an existing library that covers most of this.",
+    "Start with the simplest version and see if it actually gets used.",
+    "Would be nice to see a history of changes over time.",
+]
+
+
+def _title(rng: random.Random) -> str:
+    return f"{rng.choice(VERBS)} {rng.choice(THINGS)} {rng.choice(QUALIFIERS)}"
+
+
+def board(size: int, seed: int = 1, spark: int = 0, prompt_requests: int = 0) -> list[dict]:
+    """``size`` open issues. The first ``spark`` are labelled Spark, ``prompt_requests`` of those also Prompt-Request."""
+    rng = random.Random(f"board-{seed}")
+    issues = []
+    for iid in range(1, size + 1):
+        labels = ["Shaped"]
+        if iid <= spark:
+            labels = ["Spark", "Prompt-Request"] if iid <= prompt_requests else ["Spark"]
+        issues.append({
+            "iid": iid,
+            "title": f"{_title(rng)} #{iid}",
+            "description": " ".join(rng.sample(FILLER, 2)),
+            "labels": labels,
+        })
+    return issues
+
+
+def _idea(rng: random.Random, board_titles: list[str], dup_share: float, sentences: int) -> str:
+    title = rng.choice(board_titles) if board_titles and rng.random() < dup_share else _title(rng)
+    return f"{title}. " + " ".join(rng.choice(FILLER) for _ in range(sentences))
+
+
+def brain_dumps(count: int, board_titles: list[str], seed: int = 1, dup_share: float = 0.1,
+                large_share: float = 0.2) -> dict[str, str]:
+    """``count`` brain-dump files. ``large_share`` of them are long enough to be chunked."""
+    rng = random.Random(f"dumps-{seed}")
+    dumps = {}
+    for n in range(1, count + 1):
+        large = rng.random() < large_share
+        ideas = rng.randint(12, 20) if large else rng.randint(1, 5)
+        sentences = 12 if large else 3
+        text = "\n\n".join(_idea(rng, board_titles, dup_share, sentences) for _ in range(ideas))
+        dumps[f"dump-{n:03d}.md"] = text + "\n"
+    return dumps
+
+
+def oneliners(count: int, board_titles: list[str], seed: int = 1, dup_share: float = 0.1) -> list[str]:
+    """``count`` short Discord messages, one idea each."""
+    rng = random.Random(f"oneliners-{seed}")
+    return [_idea(rng, board_titles, dup_share, 0).strip() for _ in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic intake corpus to a folder.")
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--dumps", type=int, default=10)
+    parser.add_argument("--oneliners", type=int, default=40)
+    parser.add_argument("--board", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    issues = board(args.board, args.seed)
+    titles = [issue["title"] for issue in issues]
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    for name, text in brain_dumps(args.dumps, titles, args.seed).items():
+        (args.out_dir / name).write_text(text, encoding="utf-8")
+    for n, text in enumerate(oneliners(args.oneliners, titles, args.seed), 1):
+        (args.out_dir / f"discord-{n:05d}.txt").write_text(text, encoding="utf-8")
+    (args.out_dir / "board.json").write_text(json.dumps(issues, indent=1), encoding="utf-8")
+    print(f"Wrote {args.dumps} dump(s), {args.oneliners} one-liner(s) and a {args.board}-issue board to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
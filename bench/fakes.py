@@ -0,0 +1,542 @@
+"""Local fake Anthropic, GitLab and Discord servers for the offline benchmark.
+
+Each fake is a stdlib ``ThreadingHTTPServer`` on 127.0.0.1 speaking just
+enough of the real API for intake's clients: Messages (plain, streamed and
+tool use) with rate-limit headers, the GitLab issues endpoint with offset and
+keyset pagination, and the Discord channel-messages/webhook endpoints. Each
+has knobs for latency and error injection, driven by a seeded RNG so runs
+repeat.
+
+The fake model "extracts" one issue per paragraph (or per ``=== ITEM n ===``)
+and takes the paragraph's first sentence as the title — the shape
+``corpus.py`` writes — and calls a new issue a duplicate when its title
+matches a candidate's exactly.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+DISCORD_EPOCH_MS = 1420070400000
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Shared plumbing — each fake's handler routes to methods on ``self.server.fake``."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def body(self) -> dict | list:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def send(self, code: int, payload=None, headers: dict | None = None) -> None:
+        data = payload if isinstance(payload, bytes) else (json.dumps(payload).encode() if payload is not None else b"")
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        if payload is not None and not isinstance(payload, bytes):
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        self.server.fake.handle(self, "GET")
+
+    def do_POST(self) -> None:
+        self.server.fake.handle(self, "POST")
+
+    def do_PUT(self) -> None:
+        self.server.fake.handle(self, "PUT")
+
+    def do_DELETE(self) -> None:
+        self.server.fake.handle(self, "DELETE")
+
+
+class _Fake:
+    """A server on an ephemeral port with a seeded RNG and a request log."""
+
+    def __init__(self, seed: int, latency: float):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def chance(self, probability: float) -> bool:
+        with self.lock:
+            return probability > 0 and self.rng.random() < probability
+
+    def handle(self, h: _Handler, method: str) -> None:
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        self.route(h, method, urlparse(h.path))
+
+    def route(self, h: _Handler, method: str, url) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# --- Anthropic -----------------------------------------------------------------
+
+def _paragraph_issue(paragraph: str) -> dict | None:
+    """An issue from one corpus paragraph: first sentence as title, the rest as description."""
+    text = " ".join(paragraph.split())
+    if not text or not text[0].isupper() or text.startswith("["):
+        return None  # chunk header, or a paragraph cut mid-sentence by chunk overlap
+    title, _, rest = text.partition(". ")
+    return {"title": title.rstrip(".")[:120], "labels": ["Spark"], "description": rest or "Captured from a quick note."}
+
+
+def _markdown_issues(issues: list[dict]) -> str:
+    return "\n\n".join(
+        f"### GITLAB ISSUE: [{issue.get('item', n)}]\n**Title:** {issue['title']}\n"
+        f"**Label:** {', '.join(issue['labels'])}\n**Description:**\n{issue['description']}"
+        for n, issue in enumerate(issues, 1)
+    )
+
+
+def _prose(title: str, heading: str, words: int) -> str:
+    sentence = f"This covers {title.lower()} and what a first version needs to do. "
+    body = (sentence * (words // len(sentence.split()) + 1)).strip()
+    return f"## {heading}\n\n{body}\n\n## Next steps\n\n- Scope the smallest useful version.\n- Try it for a week."
+
+
+class FakeAnthropic(_Fake):
+    """Messages API with latency, token-paced output, 429/529 injection and rate-limit headers.
+
+    ``latency`` is time to first token; output then arrives at ``tokens_per_sec``.
+    ``rpm``/``itpm`` are per-minute request and input-token limits, enforced over
+    a sliding window and reported in ``anthropic-ratelimit-*`` headers. Message
+    Batches (create, retrieve, JSONL results) end ``batch_seconds`` after
+    submission; ``batch_errors`` is the share of batch items that come back
+    errored.
+    """
+
+    def __init__(self, seed: int = 1, latency: float = 0.5, tokens_per_sec: float = 150.0,
+                 p429: float = 0.0, p529: float = 0.0, retry_after: float = 1.0,
+                 rpm: int = 4000, itpm: int = 2_000_000, enrich_words: int = 250,
+                 batch_seconds: float = 1.0, batch_errors: float = 0.0):
+        super().__init__(seed, 0.0)
+        self.ttft = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.p429 = p429
+        self.p529 = p529
+        self.retry_after = retry_after
+        self.rpm = rpm
+        self.itpm = itpm
+        self.enrich_words = enrich_words
+        self.batch_seconds = batch_seconds
+        self.batch_errors = batch_errors
+        self.window: list[tuple[float, int]] = []  # (time, input tokens) of recent accepted requests
+        self.batches: dict[str, dict] = {}  # id → {"created": time, "requests": [...], "results": [...] once ended}
+        self.stats = {"messages": 0, "429": 0, "529": 0, "input_tokens": 0, "output_tokens": 0,
+                      "batches": 0, "batch_requests": 0, "batch_results": 0}
+
+    # Replies
+
+    def reply(self, params: dict) -> tuple[str | None, dict | None]:
+        """(text, tool input) for a request — exactly one of the two is set."""
+        content = params["messages"][0]["content"]
+        if isinstance(content, list):
+            content = "\n".join(block.get("text", "") for block in content)
+        tool = (params.get("tools") or [{}])[0].get("name")
+
+        if content.startswith("You are a duplicate detector"):
+            existing = {title.strip().lower() for title in re.findall(r"^- #\d+: (.*)$", content, re.M)}
+            verdicts = [
+                {"new": int(n), "verdict": "DUPLICATE" if title.strip().lower() in existing else "KEEP"}
+                for n, title in re.findall(r"^- NEW (\d+): (.*)$", content, re.M)
+            ]
+            if tool:
+                return None, {"verdicts": verdicts}
+            return "\n".join(f"NEW {v['new']}: {v['verdict']}" for v in verdicts), None
+
+        title = re.search(r"^\*\*Title:\*\* (.*)$", content, re.M)
+        if title and "**Current Description:**" in content:
+            return _prose(title[1], "Summary", self.enrich_words), None
+        if title and "**Description:**" in content:
+            return _prose(title[1], "Prompt", self.enrich_words // 2), None
+
+        items = re.findall(r"^=== ITEM (\d+) ===\n(.*?)(?=\n\n=== ITEM |\Z)", content, re.M | re.S)
+        if items:
+            issues = [{"item": int(n), **issue} for n, body in items if (issue := _paragraph_issue(body))]
+        else:
+            issues = [issue for p in content.split("\n\n") if (issue := _paragraph_issue(p))]
+        if tool:
+            return None, {"issues": issues}
+        return _markdown_issues(issues), None
+
+    # Rate limits
+
+    def _admit(self, tokens: int) -> tuple[float | None, dict]:
+        """Reserve a request in the sliding window. Returns (retry-after if refused, rate-limit headers)."""
+        now = time.time()
+        with self.lock:
+            self.window = [(t, n) for t, n in self.window if now - t < 60]
+            used_requests = len(self.window)
+            used_tokens = sum(n for _, n in self.window)
+            oldest = self.window[0][0] if self.window else now
+            refused = used_requests + 1 > self.rpm or used_tokens + tokens > self.itpm
+            if not refused:
+                self.window.append((now, tokens))
+                used_requests += 1
+                used_tokens += tokens
+        reset = _iso(oldest + 60)
+        headers = {
+            "anthropic-ratelimit-requests-limit": self.rpm,
+            "anthropic-ratelimit-requests-remaining": max(0, self.rpm - used_requests),
+            "anthropic-ratelimit-requests-reset": reset,
+            "anthropic-ratelimit-input-tokens-limit": self.itpm,
+            "anthropic-ratelimit-input-tokens-remaining": max(0, self.itpm - used_tokens),
+            "anthropic-ratelimit-input-tokens-reset": reset,
+        }
+        return (max(0.1, oldest + 60 - now) if refused else None), headers
+
+    # HTTP
+
+    def _message(self, params: dict) -> tuple[dict, str]:
+        """(Message object, raw output text) answering ``params``."""
+        prompt = json.dumps(params.get("system", "")) + json.dumps(params["messages"])
+        input_tokens = max(1, len(prompt) // 4)
+        text, tool_input = self.reply(params)
+        output = text if text is not None else json.dumps(tool_input)
+        output_tokens = max(1, len(output) // 4)
+        with self.lock:
+            self.stats["input_tokens"] += input_tokens
+            self.stats["output_tokens"] += output_tokens
+            n = self.stats["messages"] + self.stats["batch_results"]
+        if text is not None:
+            block = {"type": "text", "text": text}
+        else:
+            tool = (params.get("tools") or [{}])[0].get("name")
+            block = {"type": "tool_use", "id": f"toolu_{n}", "name": tool, "input": tool_input}
+        message = {
+            "id": f"msg_{n}", "type": "message", "role": "assistant", "model": params["model"],
+            "content": [block], "stop_reason": "tool_use" if tool_input is not None else "end_turn",
+            "stop_sequence": None, "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        }
+        return message, output
+
+    def route(self, h: _Handler, method: str, url) -> None:
+        if url.path.startswith("/v1/messages/batches"):
+            return self._batches(h, method, url)
+        if method != "POST" or url.path != "/v1/messages":
+            return h.send(404, {"type": "error", "error": {"type": "not_found_error", "message": url.path}})
+        params = h.body()
+        prompt = json.dumps(params.get("system", "")) + json.dumps(params["messages"])
+        input_tokens = max(1, len(prompt) // 4)
+
+        refused, headers = self._admit(input_tokens)
+        if refused is None and self.chance(self.p429):
+            refused = self.retry_after
+        if refused is not None:
+            with self.lock:
+                self.stats["429"] += 1
+            error = {"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited"}}
+            return h.send(429, error, {**headers, "retry-after": f"{refused:.2f}"})
+        if self.chance(self.p529):
+            with self.lock:
+                self.stats["529"] += 1
+            return h.send(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+
+        with self.lock:
+            self.stats["messages"] += 1
+        message, output = self._message(params)
+        time.sleep(self.ttft)
+        if params.get("stream"):
+            return self._stream(h, message, output, headers)
+        time.sleep(message["usage"]["output_tokens"] / self.tokens_per_sec)
+        h.send(200, message, headers)
+
+    # Message Batches
+
+    def _batch_object(self, h: _Handler, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        created = batch["created"]
+        ended = time.time() >= created + self.batch_seconds
+        if ended and "results" not in batch:
+            results = []
+            for request in batch["requests"]:
+                if self.chance(self.batch_errors):
+                    result = {"type": "errored", "error": {"type": "error", "error": {
+                        "type": "api_error", "message": "Injected batch item error"}}}
+                else:
+                    with self.lock:
+                        self.stats["batch_results"] += 1
+                    result = {"type": "succeeded", "message": self._message(request["params"])[0]}
+                results.append({"custom_id": request["custom_id"], "result": result})
+            batch["results"] = results
+        results = batch.get("results", [])
+        succeeded = sum(r["result"]["type"] == "succeeded" for r in results)
+        return {
+            "id": batch_id, "type": "message_batch", "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else len(batch["requests"]), "succeeded": succeeded,
+                               "errored": len(results) - succeeded, "canceled": 0, "expired": 0},
+            "created_at": _iso(created), "expires_at": _iso(created + 86400),
+            "ended_at": _iso(created + self.batch_seconds) if ended else None,
+            "archived_at": None, "cancel_initiated_at": None,
+            "results_url": f"http://{h.headers['Host']}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def _batches(self, h: _Handler, method: str, url) -> None:
+        parts = url.path.rstrip("/").split("/")[4:]  # after /v1/messages/batches
+        if method == "POST" and not parts:
+            requests = h.body()["requests"]
+            with self.lock:
+                self.stats["batches"] += 1
+                self.stats["batch_requests"] += len(requests)
+                batch_id = f"msgbatch_{self.stats['batches']:04d}"
+                self.batches[batch_id] = {"created": time.time(), "requests": requests}
+            return h.send(200, self._batch_object(h, batch_id))
+        if method == "GET" and parts and parts[0] in self.batches:
+            batch = self._batch_object(h, parts[0])
+            if parts[1:] == ["results"]:
+                if batch["processing_status"] != "ended":
+                    return h.send(400, {"type": "error", "error": {
+                        "type": "invalid_request_error", "message": "Batch has not ended"}})
+                lines = "".join(json.dumps(r) + "\n" for r in self.batches[parts[0]]["results"])
+                return h.send(200, lines.encode(), {"Content-Type": "application/binary"})
+            if not parts[1:]:
+                return h.send(200, batch)
+        h.send(404, {"type": "error", "error": {"type": "not_found_error", "message": url.path}})
+
+    def _stream(self, h: _Handler, message: dict, output: str, headers: dict) -> None:
+        block = message["content"][0]
+        if block["type"] == "tool_use":
+            start = {**block, "input": {}}
+            delta = lambda piece: {"type": "input_json_delta", "partial_json": piece}
+        else:
+            start = {"type": "text", "text": ""}
+            delta = lambda piece: {"type": "text_delta", "text": piece}
+
+        h.send_response(200)
+        for key, value in headers.items():
+            h.send_header(key, str(value))
+        h.send_header("Content-Type", "text/event-stream")
+        h.send_header("Connection", "close")
+        h.end_headers()
+        h.close_connection = True
+
+        def event(name: str, data: dict) -> None:
+            h.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode())
+            h.wfile.flush()
+
+        usage = message["usage"]
+        event("message_start", {"type": "message_start",
+                                "message": {**message, "content": [], "usage": {**usage, "output_tokens": 0}}})
+        event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": start})
+        step = 80  # characters per delta, about 20 tokens
+        for i in range(0, len(output), step):
+            piece = output[i:i + step]
+            time.sleep(len(piece) / 4 / self.tokens_per_sec)
+            event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta(piece)})
+        event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        event("message_delta", {"type": "message_delta",
+                                "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                                "usage": {"output_tokens": usage["output_tokens"]}})
+        event("message_stop", {"type": "message_stop"})
+
+
+# --- GitLab --------------------------------------------------------------------
+
+class FakeGitLab(_Fake):
+    """Project issues endpoint: list (offset or keyset pages), create, update.
+
+    ``page_size`` caps per_page the way an instance's max-per-page setting does,
+    so a board needs more pages to read. ``p429`` injects rate limiting.
+    Offset pages carry an ETag and answer a matching If-None-Match with 304.
+    """
+
+    def __init__(self, issues: list[dict], seed: int = 1, latency: float = 0.02, page_size: int = 100,
+                 p429: float = 0.0, retry_after: float = 0.5):
+        super().__init__(seed, latency)
+        self.page_size = page_size
+        self.p429 = p429
+        self.retry_after = retry_after
+        created = time.time() - 86400
+        self.issues = {
+            issue["iid"]: {**issue, "id": issue["iid"], "state": "opened",
+                           "created_at": _iso(created), "updated_at": _iso(created)}
+            for issue in issues
+        }
+        self.created: list[dict] = []  # POSTed issues, in order, with their arrival time
+        self.updates: list[tuple[float, int, dict]] = []  # (time, iid, body) per PUT
+        self.stats = {"get": 0, "post": 0, "put": 0, "429": 0, "304": 0}
+
+    def _select(self, q: dict) -> list[dict]:
+        state = q.get("state", ["opened"])[0]
+        labels = [l for l in q.get("labels", [""])[0].split(",") if l]
+        updated_after = q.get("updated_after", [""])[0]
+        order_by = q.get("order_by", ["id"])[0]
+        with self.lock:
+            issues = sorted(self.issues.values(), key=lambda i: i["updated_at" if order_by == "updated_at" else "id"],
+                            reverse=q.get("sort", ["asc"])[0] == "desc")
+        return [
+            i for i in issues
+            if (state == "all" or i["state"] == state)
+            and all(l in i["labels"] for l in labels)
+            and (not updated_after or i["updated_at"] >= updated_after)  # inclusive, as on GitLab
+        ]
+
+    def route(self, h: _Handler, method: str, url) -> None:
+        parts = url.path.rstrip("/").split("/")
+        if "issues" not in parts:
+            return h.send(404, {"message": "404 Not Found"})
+        with self.lock:
+            self.stats[method.lower()] = self.stats.get(method.lower(), 0) + 1
+        if self.chance(self.p429):
+            with self.lock:
+                self.stats["429"] += 1
+            return h.send(429, {"message": "Retry later"}, {"Retry-After": self.retry_after})
+        if method == "GET":
+            return self._list(h, url)
+        if method == "POST":
+            return self._create(h)
+        if method == "PUT":
+            return self._update(h, int(parts[-1]))
+        h.send(405, {"message": "405 Method Not Allowed"})
+
+    def _list(self, h: _Handler, url) -> None:
+        q = parse_qs(url.query)
+        per_page = min(int(q.get("per_page", ["20"])[0]), self.page_size)
+        issues = self._select(q)
+        if q.get("pagination", [""])[0] == "keyset":
+            after = int(q.get("id_after", ["0"])[0])
+            page = [i for i in issues if i["id"] > after][:per_page]
+            headers = {}
+            if page and page[-1]["id"] < issues[-1]["id"]:
+                next_q = {k: v[0] for k, v in q.items()}
+                next_q["id_after"] = page[-1]["id"]
+                headers["Link"] = f'<http://{h.headers["Host"]}{url.path}?{urlencode(next_q)}>; rel="next"'
+            return h.send(200, page, headers)
+        number = int(q.get("page", ["1"])[0])
+        pages = max(1, -(-len(issues) // per_page))
+        page = issues[(number - 1) * per_page:number * per_page]
+        etag = f'W/"{hashlib.sha256(json.dumps(page).encode()).hexdigest()[:32]}"'
+        if h.headers.get("If-None-Match") == etag:
+            with self.lock:
+                self.stats["304"] += 1
+            return h.send(304, None, {"ETag": etag})
+        headers = {"X-Page": number, "X-Per-Page": per_page, "X-Next-Page": number + 1 if number < pages else "",
+                   "ETag": etag}
+        if len(issues) <= 10_000:  # like GitLab, totals are omitted for very large result sets
+            headers.update({"X-Total": len(issues), "X-Total-Pages": pages})
+        h.send(200, page, headers)
+
+    def _create(self, h: _Handler) -> None:
+        body = h.body()
+        now = time.time()
+        with self.lock:
+            iid = max(self.issues, default=0) + 1
+            issue = {
+                "iid": iid, "id": iid, "title": body.get("title", ""), "description": body.get("description", ""),
+                "labels": [l for l in body.get("labels", "").split(",") if l], "state": "opened",
+                "created_at": _iso(now), "updated_at": _iso(now),
+            }
+            self.issues[iid] = issue
+            self.created.append({**issue, "at": now})
+        h.send(201, issue)
+
+    def _update(self, h: _Handler, iid: int) -> None:
+        body = h.body()
+        now = time.time()
+        with self.lock:
+            issue = self.issues.get(iid)
+            if issue is None:
+                return h.send(404, {"message": "404 Issue Not Found"})
+            if "labels" in body:
+                issue["labels"] = [l for l in body["labels"].split(",") if l]
+            if "description" in body:
+                issue["description"] = body["description"]
+            issue["updated_at"] = _iso(now)
+            self.updates.append((now, iid, body))
+            snapshot = dict(issue)
+        h.send(200, snapshot)
+
+
+# --- Discord -------------------------------------------------------------------
+
+class FakeDiscord(_Fake):
+    """Channel messages (cursor pages, bulk/single delete) and webhooks, with bucket headers."""
+
+    def __init__(self, messages: list[str], seed: int = 1, latency: float = 0.03, bucket: int = 5,
+                 bucket_reset: float = 0.2):
+        super().__init__(seed, latency)
+        now_ms = int(time.time() * 1000)
+        self.messages = {
+            ((now_ms - DISCORD_EPOCH_MS) << 22) + n: {"content": text, "author": {"id": "1", "bot": False}}
+            for n, text in enumerate(messages)
+        }
+        for mid, message in self.messages.items():
+            message["id"] = str(mid)
+        self.bucket = bucket
+        self.bucket_reset = bucket_reset
+        self.remaining = bucket
+        self.webhooks: list[dict] = []
+        self.stats = {"pages": 0, "deleted": 0, "webhooks": 0}
+
+    def _rate_headers(self) -> dict:
+        with self.lock:
+            self.remaining -= 1
+            remaining = max(0, self.remaining)
+            if self.remaining <= 0:
+                self.remaining = self.bucket
+        return {"X-RateLimit-Remaining": remaining, "X-RateLimit-Reset-After": self.bucket_reset}
+
+    def route(self, h: _Handler, method: str, url) -> None:
+        parts = url.path.rstrip("/").split("/")
+        if "webhooks" in parts:
+            body = h.body()
+            with self.lock:
+                self.webhooks.append(body)
+                self.stats["webhooks"] += 1
+            return h.send(204, headers=self._rate_headers())
+        if "messages" not in parts:
+            return h.send(404, {"message": "404: Not Found", "code": 0})
+        if method == "GET":
+            q = parse_qs(url.query)
+            after = int(q.get("after", ["0"])[0])
+            limit = min(100, int(q.get("limit", ["50"])[0]))
+            with self.lock:
+                ids = sorted(mid for mid in self.messages if mid > after)[:limit]
+                page = [self.messages[mid] for mid in reversed(ids)]  # newest first, like Discord
+                self.stats["pages"] += 1
+            return h.send(200, page, self._rate_headers())
+        if method == "POST" and parts[-1] == "bulk-delete":
+            ids = [int(mid) for mid in h.body().get("messages", [])]
+        elif method == "DELETE":
+            ids = [int(parts[-1])]
+        else:
+            return h.send(405, {"message": "405: Method Not Allowed", "code": 0})
+        with self.lock:
+            for mid in ids:
+                if self.messages.pop(mid, None) is not None:
+                    self.stats["deleted"] += 1
+        h.send(204, headers=self._rate_headers())
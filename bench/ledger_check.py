@@ -0,0 +1,90 @@
+"""Offline check of the input ledger's near-copy rule against the synthetic corpus.
+
+Records every brain dump in a throwaway ledger, along with its first
+SHORT_WORDS words as a separate input, then looks up edited copies of both:
+a one-word typo fix (and the exact re-drop) must be recognised as a repeat;
+an appended sentence, an inserted sentence or a rewritten phrase must not.
+Exits 1 on any wrong verdict.
+
+    python bench/ledger_check.py [--dumps 40] [--seed 1]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+import corpus
+
+APP_DIR = Path(__file__).resolve().parent.parent
+SHORT_WORDS = 22
+APPENDED = ["Brand new idea here about something.", "Also add dark mode.", "Plus a weekly export to CSV files."]
+
+
+def _edit_word(text: str, rng: random.Random, typo: bool) -> str:
+    words = text.split(" ")
+    i = rng.randrange(1, len(words) - 1)
+    words[i] = words[i][:-1] + "x" if typo and len(words[i]) > 2 else "zebra"
+    return " ".join(words)
+
+
+def _insert_sentence(text: str, rng: random.Random) -> str:
+    words = text.split(" ")
+    i = rng.randrange(1, len(words) - 1)
+    return " ".join(words[:i] + rng.choice(APPENDED).split(" ") + words[i:])
+
+
+def _rewrite_phrase(text: str, rng: random.Random) -> str:
+    words = text.split(" ")
+    i = rng.randrange(1, len(words) - 4)
+    return " ".join(words[:i] + ["completely", "different", "wording"] + words[i + 3:])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check the input ledger's near-copy verdicts.")
+    parser.add_argument("--dumps", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ["INTAKE_DATA_ROOT"] = tempfile.mkdtemp(prefix="ledger-check-")
+    os.environ["INTAKE_ENV_FILE"] = os.devnull
+    os.environ.pop("INTAKE_LEDGER_NEAR_EDITS", None)
+    sys.path.insert(0, str(APP_DIR))
+    import input_ledger
+
+    rng = random.Random(f"ledger-{args.seed}")
+    dumps = {}
+    for name, text in corpus.brain_dumps(args.dumps, [], args.seed).items():
+        dumps[name] = text.strip()
+        dumps[f"{name} (first {SHORT_WORDS} words)"] = " ".join(text.split()[:SHORT_WORDS])
+    for name, text in dumps.items():
+        input_ledger.record(name, text, [])
+
+    cases = []
+    for name, text in dumps.items():
+        if len(text.split(" ")) < SHORT_WORDS:
+            continue
+        cases += [
+            (name, "re-drop", text, True),
+            (name, "typo fixed", _edit_word(text, rng, typo=True), True),
+            (name, "word changed", _edit_word(text, rng, typo=False), True),
+            (name, "sentence appended", f"{text} {rng.choice(APPENDED)}", False),
+            (name, "sentence inserted", _insert_sentence(text, rng), False),
+            (name, "phrase rewritten", _rewrite_phrase(text, rng), False),
+        ]
+
+    wrong = 0
+    for name, case, text, repeat in cases:
+        match = input_ledger.lookup(text)
+        if (match is not None) != repeat:
+            wrong += 1
+            found = f"matched {match['file']} ({match['match']}, {match['similarity']})" if match else "no match"
+            print(f"WRONG  {name} {case}: expected {'a repeat' if repeat else 'new input'}, got {found}")
+    print(f"{len(cases) - wrong}/{len(cases)} verdicts correct across {args.dumps} dumps.")
+    return 1 if wrong else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""Offline benchmark — run the real pipeline against local fakes and report throughput and latency.
+
+Each scenario starts fresh fake Anthropic, GitLab and Discord servers
+(``fakes.py``), seeds them with a synthetic board and corpus (``corpus.py``),
+and runs ``intake.py`` unmodified in a subprocess pointed at them, with its
+own temporary data root. Nothing leaves the machine.
+
+  Phase 1 — brain dumps in the intake folder plus one-liners in Discord
+            #intake, run with --skip-backlog. Latency per file is the time
+            from launch until it lands in _processed/_failed.
+  Phase 2 — an empty intake folder and ``--spark`` Spark issues on the board.
+            Latency per issue is the time from launch until its enrichment PUT.
+  Batch   — Phase 1's files plus Phase 2's Spark issues, run twice with
+            --batch: the first run submits Message Batches, the second (after
+            ``--batch-seconds``) collects them. Latency runs from the first
+            launch until a file lands / an issue is enriched.
+
+The work per scenario is fixed; only the board size varies across
+``--board-sizes``, so the rows form a scaling curve. Same seed, same corpus,
+same injected errors — runs repeat. ``--repeat`` takes the median of several
+runs, and ``--baseline`` compares against an earlier ``--output`` file and
+exits 1 when throughput or p95 latency regress past ``--tolerance``.
+
+    python bench/run.py
+    python bench/run.py --board-sizes 100,2000 --repeat 3 --output bench-results.json
+    python bench/run.py --baseline bench-results.json --set INTAKE_WORKERS=8
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import corpus
+from fakes import FakeAnthropic, FakeDiscord, FakeGitLab
+
+APP_DIR = Path(__file__).resolve().parent.parent
+POLL_SECONDS = 0.02
+FAILURE_PREFIX = "Intake parse failure:"
+
+# Compared against --baseline: (metric, True if higher is better)
+REGRESSION_METRICS = [
+    ("files_per_min", True),
+    ("issues_per_min", True),
+    ("p95_seconds", False),
+]
+
+
+def _percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile, or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return round(ordered[int(rank) - 1], 3)
+
+
+def _child_env(root: Path, ai: FakeAnthropic, gitlab: FakeGitLab, discord: FakeDiscord, overrides: dict) -> dict:
+    """Environment for the intake subprocess — every endpoint and folder points at this scenario."""
+    env = {key: value for key, value in os.environ.items() if not key.startswith("INTAKE_")}
+    env.update({
+        "HOME": str(root),  # no ~/.git-credentials or ssh keys from the real user
+        "INTAKE_ENV_FILE": str(root / "no.env"),
+        "INTAKE_DATA_ROOT": str(root / "data"),
+        "INTAKE_ANTHROPIC_API_KEY": "bench",
+        "INTAKE_ANTHROPIC_BASE_URL": ai.url,
+        "INTAKE_AI_CACHE": "0",
+        "INTAKE_GITLAB_URL": gitlab.url,
+        "INTAKE_GITLAB_PAT": "bench",
+        "INTAKE_DISCORD_API_URL": f"{discord.url}/api/v10",
+        "INTAKE_DISCORD_BOT_TOKEN": "bench",
+        "INTAKE_DISCORD_CHANNEL_ID": "1",
+        "INTAKE_DISCORD_BACKLOG_WEBHOOK": f"{discord.url}/api/webhooks/1/backlog",
+        "INTAKE_COS_DISCORD_WEBHOOK": f"{discord.url}/api/webhooks/2/cos",
+        "INTAKE_DROPZONE_SCP_TARGET": str(root / "dropzone") + os.sep,
+    })
+    env.update(overrides)
+    return env
+
+
+def _run_intake(root: Path, env: dict, argv: list[str], watch: list[Path]) -> tuple[float, float, int, dict[str, float]]:
+    """Run intake.py once. Returns (start, wall seconds, exit code, first-seen time per file in ``watch``)."""
+    seen: dict[str, float] = {}
+
+    def scan() -> None:
+        now = time.time()
+        for folder in watch:
+            if folder.exists():
+                for path in folder.iterdir():
+                    if path.suffix in (".txt", ".md"):  # not the input ledger's .seen.json pointers
+                        seen.setdefault(path.name, now)
+
+    with open(root / "intake.log", "w", encoding="utf-8") as out:
+        start = time.time()
+        proc = subprocess.Popen(
+            [sys.executable, str(APP_DIR / "intake.py"), *argv],
+            cwd=APP_DIR, env=env, stdout=out, stderr=subprocess.STDOUT,
+        )
+        while proc.poll() is None:
+            scan()
+            time.sleep(POLL_SECONDS)
+        wall = time.time() - start
+        scan()
+    return start, wall, proc.returncode, seen
+
+
+def _run_report(root: Path) -> dict:
+    """Token totals from the child's metrics run report, if it wrote one."""
+    reports = sorted((root / "data" / "_logs").glob("run-*.json"))
+    if not reports:
+        return {}
+    return json.loads(reports[-1].read_text(encoding="utf-8")).get("totals", {})
+
+
+def _fakes(args: argparse.Namespace, board: list[dict], messages: list[str]):
+    ai = FakeAnthropic(
+        seed=args.seed, latency=args.ai_latency, tokens_per_sec=args.ai_tokens_per_sec,
+        p429=args.ai_429, p529=args.ai_529, rpm=args.ai_rpm, itpm=args.ai_itpm,
+        batch_seconds=args.batch_seconds, batch_errors=args.batch_errors,
+    )
+    gitlab = FakeGitLab(board, seed=args.seed, latency=args.gitlab_latency, page_size=args.page_size,
+                        p429=args.gitlab_429)
+    discord = FakeDiscord(messages, seed=args.seed, latency=args.discord_latency)
+    return ai, gitlab, discord
+
+
+def run_phase1(args: argparse.Namespace, board_size: int) -> dict:
+    board = corpus.board(board_size, args.seed)
+    titles = [issue["title"] for issue in board]
+    dumps = corpus.brain_dumps(args.dumps, titles, args.seed, args.dup_share)
+    oneliners = corpus.oneliners(args.oneliners, titles, args.seed, args.dup_share)
+    ai, gitlab, discord = _fakes(args, board, oneliners)
+    try:
+        with tempfile.TemporaryDirectory(prefix="intake-bench-") as tmp:
+            root = Path(tmp)
+            intake_dir = root / "data" / "_intake"
+            intake_dir.mkdir(parents=True)
+            for name, text in dumps.items():
+                (intake_dir / name).write_text(text, encoding="utf-8")
+            env = _child_env(root, ai, gitlab, discord, args.overrides)
+            start, wall, code, seen = _run_intake(
+                root, env, ["--skip-backlog"], [root / "data" / "_processed", root / "data" / "_failed"],
+            )
+            failed = len(list((root / "data" / "_failed").glob("*"))) if (root / "data" / "_failed").exists() else 0
+            totals = _run_report(root)
+            _keep_log(args, root, f"phase1-{board_size}")
+    finally:
+        for fake in (ai, gitlab, discord):
+            fake.stop()
+
+    issues = [c for c in gitlab.created if not c["title"].startswith(FAILURE_PREFIX)]
+    latencies = [t - start for t in seen.values()]
+    return _result(1, board_size, code, wall, latencies, ai, gitlab, totals,
+                   files=len(seen), failed=failed, issues=len(issues),
+                   files_per_min=round(len(seen) / wall * 60, 2))
+
+
+def run_phase2(args: argparse.Namespace, board_size: int) -> dict:
+    spark = min(args.spark, board_size)
+    board = corpus.board(board_size, args.seed, spark=spark, prompt_requests=min(args.prompt_requests, spark))
+    ai, gitlab, discord = _fakes(args, board, [])
+    try:
+        with tempfile.TemporaryDirectory(prefix="intake-bench-") as tmp:
+            root = Path(tmp)
+            (root / "data" / "_intake").mkdir(parents=True)
+            env = _child_env(root, ai, gitlab, discord, args.overrides)
+            start, wall, code, _ = _run_intake(root, env, [], [])
+            prompts = len(list((root / "dropzone").glob("*"))) if (root / "dropzone").exists() else 0
+            totals = _run_report(root)
+            _keep_log(args, root, f"phase2-{board_size}")
+    finally:
+        for fake in (ai, gitlab, discord):
+            fake.stop()
+
+    enriched: dict[int, float] = {}
+    for at, iid, body in gitlab.updates:
+        if "description" in body:
+            enriched.setdefault(iid, at)
+    latencies = [at - start for at in enriched.values()]
+    return _result(2, board_size, code, wall, latencies, ai, gitlab, totals,
+                   issues=len(enriched), prompts=prompts)
+
+
+def run_batch(args: argparse.Namespace, board_size: int) -> dict:
+    spark = min(args.spark, board_size)
+    board = corpus.board(board_size, args.seed, spark=spark, prompt_requests=min(args.prompt_requests, spark))
+    titles = [issue["title"] for issue in board]
+    dumps = corpus.brain_dumps(args.dumps, titles, args.seed, args.dup_share)
+    oneliners = corpus.oneliners(args.oneliners, titles, args.seed, args.dup_share)
+    ai, gitlab, discord = _fakes(args, board, oneliners)
+    try:
+        with tempfile.TemporaryDirectory(prefix="intake-bench-") as tmp:
+            root = Path(tmp)
+            intake_dir = root / "data" / "_intake"
+            intake_dir.mkdir(parents=True)
+            for name, text in dumps.items():
+                (intake_dir / name).write_text(text, encoding="utf-8")
+            env = _child_env(root, ai, gitlab, discord, args.overrides)
+            watch = [root / "data" / "_processed", root / "data" / "_failed"]
+            start, submit_wall, code, seen = _run_intake(root, env, ["--batch"], watch)
+            _keep_log(args, root, f"batch-submit-{board_size}")
+            submitted = ai.stats["batch_requests"]
+            time.sleep(max(0.0, start + args.batch_seconds - time.time()))
+            _, collect_wall, collect_code, collected = _run_intake(root, env, ["--batch"], watch)
+            _keep_log(args, root, f"batch-collect-{board_size}")
+            wall = time.time() - start
+            for name, at in collected.items():
+                seen.setdefault(name, at)
+            failed = len(list((root / "data" / "_failed").glob("*"))) if (root / "data" / "_failed").exists() else 0
+            totals = _run_report(root)
+    finally:
+        for fake in (ai, gitlab, discord):
+            fake.stop()
+
+    enriched: dict[int, float] = {}
+    for at, iid, body in gitlab.updates:
+        if "description" in body:
+            enriched.setdefault(iid, at)
+    latencies = [t - start for t in seen.values()] + [at - start for at in enriched.values()]
+    return _result("batch", board_size, code or collect_code, wall, latencies, ai, gitlab, totals,
+                   files=len(seen), failed=failed, issues=len(enriched),
+                   files_per_min=round(len(seen) / wall * 60, 2),
+                   batch_requests=submitted, batch_results=ai.stats["batch_results"],
+                   submit_seconds=round(submit_wall, 3), collect_seconds=round(collect_wall, 3))
+
+
+def _result(phase: int | str, board_size: int, code: int, wall: float, latencies: list[float],
+            ai: FakeAnthropic, gitlab: FakeGitLab, totals: dict, **counts) -> dict:
+    return {
+        "phase": phase,
+        "board_size": board_size,
+        "exit_code": code,
+        "wall_seconds": round(wall, 3),
+        **counts,
+        "issues_per_min": round(counts["issues"] / wall * 60, 2),
+        "p50_seconds": _percentile(latencies, 50),
+        "p95_seconds": _percentile(latencies, 95),
+        "ai_messages": ai.stats["messages"],
+        "ai_429": ai.stats["429"],
+        "ai_529": ai.stats["529"],
+        "gitlab_requests": gitlab.requests,
+        "input_tokens": totals.get("input_tokens"),
+        "output_tokens": totals.get("output_tokens"),
+        "cost_usd": totals.get("cost_usd"),
+    }
+
+
+def _keep_log(args: argparse.Namespace, root: Path, name: str) -> None:
+    """Copy the child's log next to the results when --logs is given."""
+    if args.logs:
+        args.logs.mkdir(parents=True, exist_ok=True)
+        (args.logs / f"{name}.log").write_text((root / "intake.log").read_text(encoding="utf-8"), encoding="utf-8")
+
+
+def _median(runs: list[dict]) -> dict:
+    """One row from repeated runs: the median of every numeric field (worst exit code)."""
+    row = dict(runs[0])
+    for key, value in runs[0].items():
+        if key in ("phase", "board_size"):
+            continue
+        values = [run[key] for run in runs if isinstance(run.get(key), (int, float))]
+        if key == "exit_code":
+            row[key] = max(values)
+        elif values and len(values) == len(runs):
+            row[key] = round(statistics.median(values), 3)
+    row["runs"] = len(runs)
+    return row
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Regressions of ``results`` against ``baseline`` beyond ``tolerance`` (a fraction)."""
+    previous = {(row["phase"], row["board_size"]): row for row in baseline}
+    problems = []
+    for row in results:
+        old = previous.get((row["phase"], row["board_size"]))
+        if old is None:
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS:
+            new_value, old_value = row.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if (-change if higher_is_better else change) > tolerance:
+                problems.append(
+                    f"Phase {row['phase']} board {row['board_size']}: {metric} {old_value:g} → {new_value:g} "
+                    f"({change:+.0%})"
+                )
+    return problems
+
+
+def _table(results: list[dict]) -> str:
+    columns = [
+        ("phase", "phase"), ("board", "board_size"), ("files", "files"), ("issues", "issues"),
+        ("wall s", "wall_seconds"), ("files/min", "files_per_min"), ("issues/min", "issues_per_min"),
+        ("p50 s", "p50_seconds"), ("p95 s", "p95_seconds"), ("AI calls", "ai_messages"),
+        ("429s", "ai_429"), ("batch reqs", "batch_requests"), ("GitLab reqs", "gitlab_requests"),
+        ("exit", "exit_code"),
+    ]
+    rows = [[title for title, _ in columns]]
+    for row in results:
+        rows.append(["-" if row.get(key) is None else f"{row[key]:g}" if not isinstance(row[key], str) else row[key]
+                     for _, key in columns])
+    widths = [max(len(r[i]) for r in rows) for i in range(len(columns))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(r, widths)) for r in rows)
+
+
+def _overrides(pairs: list[str]) -> dict:
+    overrides = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep or not key.startswith("INTAKE_"):
+            raise SystemExit(f"--set expects INTAKE_NAME=value, got {pair!r}")
+        overrides[key] = value
+    return overrides
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline intake benchmark against local fake servers.")
+    parser.add_argument("--phase", choices=["1", "2", "both", "batch"], default="both",
+                        help="Scenario to run; 'batch' runs Message Batches mode (submit, then collect).")
+    parser.add_argument("--board-sizes", default="100,1000,5000", help="Comma-separated board sizes (default: %(default)s).")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario; the median is reported.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dumps", type=int, default=10, help="Brain-dump files for Phase 1.")
+    parser.add_argument("--oneliners", type=int, default=40, help="Discord #intake messages for Phase 1.")
+    parser.add_argument("--dup-share", type=float, default=0.1, help="Share of ideas already on the board.")
+    parser.add_argument("--spark", type=int, default=20, help="Spark issues for Phase 2.")
+    parser.add_argument("--prompt-requests", type=int, default=5, help="How many Spark issues are also Prompt-Request.")
+    parser.add_argument("--ai-latency", type=float, default=0.5, help="Seconds to first token.")
+    parser.add_argument("--ai-tokens-per-sec", type=float, default=150.0)
+    parser.add_argument("--ai-429", type=float, default=0.02, help="Probability a message call gets a 429.")
+    parser.add_argument("--ai-529", type=float, default=0.0, help="Probability a message call gets a 529.")
+    parser.add_argument("--ai-rpm", type=int, default=4000, help="Requests-per-minute limit.")
+    parser.add_argument("--ai-itpm", type=int, default=2_000_000, help="Input-tokens-per-minute limit.")
+    parser.add_argument("--batch-seconds", type=float, default=1.0, help="Time until a submitted batch ends.")
+    parser.add_argument("--batch-errors", type=float, default=0.0, help="Share of batch items that come back errored.")
+    parser.add_argument("--gitlab-latency", type=float, default=0.02)
+    parser.add_argument("--gitlab-429", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=100, help="GitLab's max issues per page.")
+    parser.add_argument("--discord-latency", type=float, default=0.03)
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="INTAKE_NAME=value",
+                        help="Extra config for the intake run (repeatable).")
+    parser.add_argument("--output", type=Path, help="Write results JSON here.")
+    parser.add_argument("--baseline", type=Path, help="Earlier --output file to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed regression (default: %(default)s).")
+    parser.add_argument("--logs", type=Path, help="Keep each intake run's log in this folder.")
+    args = parser.parse_args()
+    args.overrides = _overrides(args.overrides)
+
+    sizes = [int(s) for s in args.board_sizes.split(",") if s.strip()]
+    phases = {"1": [run_phase1], "2": [run_phase2], "both": [run_phase1, run_phase2], "batch": [run_batch]}[args.phase]
+    results = []
+    for run in phases:
+        for size in sizes:
+            runs = []
+            for n in range(args.repeat):
+                print(f"{run.__name__} board={size} run {n + 1}/{args.repeat}...", flush=True)
+                runs.append(run(args, size))
+            results.append(_median(runs))
+
+    print()
+    print(_table(results))
+    if args.output:
+        settings = {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()}
+        args.output.write_text(json.dumps({"settings": settings, "results": results}, indent=2), encoding="utf-8")
+        print(f"\nResults written to {args.output}")
+
+    failed = [r for r in results if r["exit_code"]]
+    for row in failed:
+        print(f"Phase {row['phase']} board {row['board_size']}: intake exited {row['exit_code']}")
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        print()
+        print("\n".join(f"REGRESSION: {line}" for line in regressions) or f"No regressions against {args.baseline}.")
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Front gate for runs with nothing new — notice it cheaply and skip the work.
+
+Most scheduled runs find nothing to do. Each source is compared with a change
+token persisted in DATA_ROOT/change_tokens.json:
+
+- Intake folder: its mtime, saved when a listing found no files. While the
+  folder's mtime is unchanged it isn't listed again.
+- Discord #intake: the scrape already asks only for messages after the saved
+  cursor, so an idle channel costs one request that returns an empty page.
+- GitLab board: one ``per_page=1`` probe for the newest issue updated after
+  the issue cache's ``updated_after`` mark, sent with the ETag of the last
+  unchanged answer. If something changed — often just the last run's own
+  updates — the cache is delta-synced, as Phase 2 would do first anyway.
+  Phase 2 is skipped when the cache then holds no pending work.
+
+An idle run makes those two small requests, plus one delta sync after a run
+that changed the board. A probe that fails counts as a change, so the gate
+only ever skips work that isn't there.
+"""
+
+import json
+import time
+
+import batch_jobs
+import issue_cache
+from config import DATA_ROOT, INTAKE_DIR, log
+from gitlab_client import GitLabError, probe_board_async, sync_issue_cache_async
+
+TOKENS_FILE = DATA_ROOT / "change_tokens.json"
+MTIME_SETTLE_SECONDS = 2.0  # a folder changed this recently may change again within the same mtime tick
+
+
+def _load() -> dict:
+    try:
+        return json.loads(TOKENS_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(tokens: dict) -> None:
+    try:
+        TOKENS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = TOKENS_FILE.with_suffix(".tmp")
+        tmp.write_text(json.dumps(tokens), encoding="utf-8")
+        tmp.replace(TOKENS_FILE)
+    except OSError as exc:
+        log(f"  Warning: Could not save change tokens: {exc}")
+
+
+def _intake_mtime() -> int | None:
+    try:
+        return INTAKE_DIR.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def intake_unchanged() -> bool:
+    """True if the intake folder hasn't changed since a listing last found it empty."""
+    mtime = _intake_mtime()
+    return mtime is not None and _load().get("intake_mtime") == mtime
+
+
+def mark_intake_empty() -> None:
+    """Remember the intake folder's mtime after a listing found nothing to process."""
+    mtime = _intake_mtime()
+    if mtime is None or time.time() - mtime / 1e9 < MTIME_SETTLE_SECONDS:
+        return
+    tokens = _load()
+    if tokens.get("intake_mtime") != mtime:
+        _save({**tokens, "intake_mtime": mtime})
+
+
+def _backlog_pending() -> bool:
+    """Whether the cached board has work Phase 2 would pick up (same selection as backlog_processor)."""
+    for issue in issue_cache.open_issues():
+        labels = issue["labels"]
+        if "Spark" in labels:
+            return True
+        if "Prompt-Request" in labels and "Shaped" in labels and "Prompt-Delivered" not in labels:
+            return True
+    return False
+
+
+async def backlog_idle_async(pat: str) -> bool:
+    """True if Phase 2 has nothing to do: no batch waiting and no pending issue on the (synced) board."""
+    if batch_jobs.pending_items("enrich") or _backlog_pending():
+        return False
+    since = issue_cache.get_meta("updated_after")
+    if not since:
+        return False  # no board loaded yet
+
+    tokens = _load()
+    board = tokens.get("board", {})
+    try:
+        changed, etag = await probe_board_async(pat, since, board.get("etag", "") if board.get("since") == since else "")
+    except GitLabError as exc:
+        log(f"  Warning: {exc} — running Phase 2 anyway.")
+        return False
+    # Only an unchanged answer's ETag is kept: reusing a changed one would get a 304 for a change not yet synced.
+    if not changed:
+        if board != {"since": since, "etag": etag}:
+            _save({**tokens, "board": {"since": since, "etag": etag}})
+        return True
+    try:
+        if not await sync_issue_cache_async(pat):
+            return False
+    except GitLabError:
+        return False  # Phase 2 reports it
+    return not _backlog_pending()
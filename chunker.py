@@ -0,0 +1,104 @@
+"""Split large intake files into token-budgeted chunks and merge per-chunk extractions."""
+
+import re
+from difflib import SequenceMatcher
+from typing import Iterator
+
+# Rough English average for Claude tokenization — good enough for budgeting, no tokenizer needed.
+CHARS_PER_TOKEN = 4
+TITLE_MATCH_RATIO = 0.85
+
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _iter_blocks(text: str) -> Iterator[str]:
+    """Yield paragraphs, starting a new block at every markdown heading."""
+    block: list[str] = []
+    for line in text.splitlines():
+        if not line.strip() or _HEADING.match(line):
+            if block:
+                yield "\n".join(block)
+                block = []
+            if not line.strip():
+                continue
+        block.append(line)
+    if block:
+        yield "\n".join(block)
+
+
+def _split_oversized(block: str, max_chars: int) -> Iterator[str]:
+    """Break a single block that exceeds the budget — on lines first, then hard at max_chars."""
+    piece = ""
+    for line in block.splitlines():
+        while len(line) > max_chars:
+            if piece:
+                yield piece
+                piece = ""
+            yield line[:max_chars]
+            line = line[max_chars:]
+        if piece and len(piece) + 1 + len(line) > max_chars:
+            yield piece
+            piece = ""
+        piece = f"{piece}\n{line}" if piece else line
+    if piece:
+        yield piece
+
+
+def iter_chunks(text: str, max_tokens: int, overlap_tokens: int = 0) -> Iterator[str]:
+    """Yield chunks of ``text`` that fit ``max_tokens``, split on paragraph/heading boundaries.
+
+    Each chunk after the first repeats trailing blocks of the previous one, up to
+    ``overlap_tokens``, so an idea straddling a boundary is seen whole at least once.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = min(overlap_tokens * CHARS_PER_TOKEN, max_chars // 2)
+    current: list[str] = []
+    size = 0
+    fresh = False  # current holds blocks not yet emitted in an earlier chunk
+
+    for block in _iter_blocks(text):
+        for piece in _split_oversized(block, max_chars) if len(block) > max_chars else [block]:
+            if current and fresh and size + 2 + len(piece) > max_chars:
+                yield "\n\n".join(current)
+                tail: list[str] = []
+                tail_size = 0
+                for prev in reversed(current):
+                    if tail_size + len(prev) + 2 > overlap_chars:
+                        break
+                    tail.insert(0, prev)
+                    tail_size += len(prev) + 2
+                current, size, fresh = tail, tail_size, False
+            while current and not fresh and size + 2 + len(piece) > max_chars:
+                size -= len(current.pop(0)) + 2  # trim overlap rather than blow the budget
+            current.append(piece)
+            size += len(piece) + 2
+            fresh = True
+
+    if current and fresh:
+        yield "\n\n".join(current)
+
+
+def _normalize_title(title: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", title.lower()).split())
+
+
+def merge_issues(issue_lists: list[list[dict]]) -> list[dict]:
+    """Collapse issues repeated across chunk boundaries, keeping the fuller description."""
+    merged: list[dict] = []
+    keys: list[str] = []
+    for issues in issue_lists:
+        for issue in issues:
+            key = _normalize_title(issue["title"])
+            for idx, seen in enumerate(keys):
+                if key == seen or SequenceMatcher(None, key, seen).ratio() >= TITLE_MATCH_RATIO:
+                    if len(issue["description"]) > len(merged[idx]["description"]):
+                        merged[idx] = issue
+                    break
+            else:
+                merged.append(issue)
+                keys.append(key)
+    return merged
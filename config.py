@@ -2,17 +2,18 @@
 
 import os
 import sys
+import threading
 from pathlib import Path
 
 # Resolve .env file: INTAKE_ENV_FILE env var → APP_DIR/.env fallback
 APP_DIR = Path(__file__).parent
 _env_file = Path(os.environ.get("INTAKE_ENV_FILE", str(APP_DIR / ".env")))
 
-try:
-    from dotenv import load_dotenv
-    load_dotenv(_env_file)
-except ImportError:
-    if _env_file.exists():
+if _env_file.exists():
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_env_file)
+    except ImportError:
         for line in _env_file.read_text().splitlines():
             line = line.strip()
             if line and not line.startswith("#") and "=" in line:
@@ -23,10 +24,15 @@ except ImportError:
 DATA_ROOT = Path(os.environ.get("INTAKE_DATA_ROOT", str(APP_DIR / "data")))
 
 
+_log_lock = threading.Lock()
+
+
 def log(msg: str) -> None:
     from datetime import datetime
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{ts}] {msg}", flush=True)
+    # Locked so lines from parallel workers never interleave mid-line.
+    with _log_lock:
+        print(f"[{ts}] {msg}", flush=True)
 
 
 def _require(name: str) -> str:
@@ -38,13 +44,84 @@ def _require(name: str) -> str:
     return value
 
 
-# Required
-ANTHROPIC_API_KEY = _require("INTAKE_ANTHROPIC_API_KEY")
+# Required — but only checked once a stage is about to call the model, so idle runs start without it
+def anthropic_api_key() -> str:
+    return _require("INTAKE_ANTHROPIC_API_KEY")
+
+
+def __getattr__(name: str):
+    # Keeps ``config.ANTHROPIC_API_KEY`` working, read on first use instead of at import
+    if name == "ANTHROPIC_API_KEY":
+        return anthropic_api_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Optional with defaults
 MODEL = os.environ.get("INTAKE_MODEL", "claude-sonnet-4-6")
+ANTHROPIC_BASE_URL = os.environ.get("INTAKE_ANTHROPIC_BASE_URL", "")  # e.g. a local fake for testing
+BATCH_MODE = os.environ.get("INTAKE_BATCH_MODE", "").lower() in ("1", "true", "yes")
 GITLAB_URL = os.environ.get("INTAKE_GITLAB_URL", "https://gitlab.czechito.com").rstrip("/")
 GITLAB_PROJECT = os.environ.get("INTAKE_GITLAB_PROJECT", "tcdz/workbench")
+GITLAB_PAGE_CONCURRENCY = max(1, int(os.environ.get("INTAKE_GITLAB_PAGE_CONCURRENCY", "4")))
+GITLAB_POST_CONCURRENCY = max(1, int(os.environ.get("INTAKE_GITLAB_POST_CONCURRENCY", "4")))
+GITLAB_KEYSET_PAGINATION = os.environ.get("INTAKE_GITLAB_KEYSET_PAGINATION", "").lower() in ("1", "true", "yes")
+
+# Model tiers — short extractions and dedup verdicts go to the fast model (empty = use MODEL for everything)
+FAST_MODEL = os.environ.get("INTAKE_FAST_MODEL", "claude-haiku-4-5")
+FAST_MAX_INPUT_TOKENS = int(os.environ.get("INTAKE_FAST_MAX_INPUT_TOKENS", "1500"))
+PROMPT_MODEL = os.environ.get("INTAKE_PROMPT_MODEL", "") or MODEL
+
+# Concurrency — number of intake files extracted in parallel during Phase 1
+INTAKE_WORKERS = max(1, int(os.environ.get("INTAKE_WORKERS", "4")))
+
+# Post issues while extraction is still streaming (single-call files only)
+STREAM_POSTING = os.environ.get("INTAKE_STREAM_POSTING", "1").lower() not in ("0", "false", "no")
+
+# Extraction and dedup answer through a tool-use JSON schema; 0 falls back to markdown blocks
+STRUCTURED_OUTPUT = os.environ.get("INTAKE_STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+
+# Quick ideas (Discord messages) packed into one extraction call; 1 disables micro-batching
+QUICK_BATCH_SIZE = max(1, int(os.environ.get("INTAKE_QUICK_BATCH_SIZE", "20")))
+
+# Daemon mode (--daemon) — folder poll interval and how often Discord / Phase 2 run
+DAEMON_POLL_SECONDS = float(os.environ.get("INTAKE_DAEMON_POLL_SECONDS", "5"))
+DAEMON_DISCORD_SECONDS = float(os.environ.get("INTAKE_DAEMON_DISCORD_SECONDS", "60"))
+DAEMON_BACKLOG_SECONDS = float(os.environ.get("INTAKE_DAEMON_BACKLOG_SECONDS", "300"))
+DAEMON_RETRY_SECONDS = float(os.environ.get("INTAKE_DAEMON_RETRY_SECONDS", "300"))
+
+# Phase 2 pipeline — worker limits per stage
+PHASE2_ENRICH_WORKERS = max(1, int(os.environ.get("INTAKE_PHASE2_ENRICH_WORKERS", "4")))
+PHASE2_UPDATE_WORKERS = max(1, int(os.environ.get("INTAKE_PHASE2_UPDATE_WORKERS", "4")))
+PHASE2_PROMPT_WORKERS = max(1, int(os.environ.get("INTAKE_PHASE2_PROMPT_WORKERS", "2")))
+
+# Anthropic rate governor — concurrent calls per model start here and adapt between 1 and the max
+AI_INITIAL_CONCURRENCY = max(1, int(os.environ.get("INTAKE_AI_CONCURRENCY", "4")))
+AI_MAX_CONCURRENCY = max(AI_INITIAL_CONCURRENCY, int(os.environ.get("INTAKE_AI_MAX_CONCURRENCY", "16")))
+
+# AI response cache — content-addressed, under DATA_ROOT/_cache/ai
+AI_CACHE_ENABLED = os.environ.get("INTAKE_AI_CACHE", "1").lower() not in ("0", "false", "no")
+AI_CACHE_MAX_AGE_DAYS = float(os.environ.get("INTAKE_AI_CACHE_MAX_AGE_DAYS", "14"))
+AI_CACHE_MAX_MB = float(os.environ.get("INTAKE_AI_CACHE_MAX_MB", "100"))
+
+# Chunking — files over CHUNK_TOKENS (~4 chars/token) are split and extracted in parallel
+CHUNK_TOKENS = int(os.environ.get("INTAKE_CHUNK_TOKENS", "2500"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("INTAKE_CHUNK_OVERLAP_TOKENS", "125"))
+CHUNK_CONCURRENCY = max(1, int(os.environ.get("INTAKE_CHUNK_CONCURRENCY", "4")))
+
+# Dedup — candidates from the local issue index sent to the AI for a verdict
+DEDUP_TOP_K = int(os.environ.get("INTAKE_DEDUP_TOP_K", "5"))
+DEDUP_MIN_SCORE = float(os.environ.get("INTAKE_DEDUP_MIN_SCORE", "0.3"))
+
+# Input ledger — inputs already processed (exact or near-duplicate) skip extraction, under DATA_ROOT/ledger.sqlite
+LEDGER_ENABLED = os.environ.get("INTAKE_LEDGER", "1").lower() not in ("0", "false", "no")
+LEDGER_NEAR_EDITS = int(os.environ.get("INTAKE_LEDGER_NEAR_EDITS", "2"))  # 0 = exact repeats only
+
+# Issue cache — local SQLite copy of the board, delta-synced with updated_after
+ISSUE_CACHE_FRESH_SECONDS = float(os.environ.get("INTAKE_ISSUE_CACHE_FRESH_SECONDS", "30"))
+ISSUE_CACHE_FULL_SYNC_HOURS = float(os.environ.get("INTAKE_ISSUE_CACHE_FULL_SYNC_HOURS", "24"))
+
+# Change gate — runs with nothing new skip the work, judged by change tokens in DATA_ROOT/change_tokens.json
+CHANGE_GATE = os.environ.get("INTAKE_CHANGE_GATE", "1").lower() not in ("0", "false", "no")
 
 # Paths — all default relative to DATA_ROOT (set above from INTAKE_DATA_ROOT or APP_DIR/data)
 INTAKE_DIR = Path(os.environ.get("INTAKE_FOLDER", str(DATA_ROOT / "_intake")))
@@ -54,10 +131,20 @@ FAILED_DIR = Path(os.environ.get("INTAKE_FAILED_FOLDER", str(DATA_ROOT / "_faile
 PROMPT_FILE = Path(os.environ.get("INTAKE_PROMPT_FILE", str(APP_DIR / "prompts" / "extraction.md")))
 QUICK_PROMPT_FILE = Path(os.environ.get("INTAKE_QUICK_PROMPT_FILE", str(APP_DIR / "prompts" / "quick-idea.md")))
 
+# --profile-startup fails when importing intake takes longer than this
+STARTUP_BUDGET_MS = float(os.environ.get("INTAKE_STARTUP_BUDGET_MS", "250"))
+
+# Run metrics — a JSON report per run is always written to LOG_DIR; this adds LOG_DIR/intake.prom
+METRICS_PROMETHEUS = os.environ.get("INTAKE_METRICS_PROMETHEUS", "").lower() in ("1", "true", "yes")
+
 # Discord — all optional (disabled if token not set)
 DISCORD_BOT_TOKEN = os.environ.get("INTAKE_DISCORD_BOT_TOKEN", "")
 DISCORD_CHANNEL_ID = os.environ.get("INTAKE_DISCORD_CHANNEL_ID", "")
 DISCORD_BACKLOG_WEBHOOK = os.environ.get("INTAKE_DISCORD_BACKLOG_WEBHOOK", "")
+DISCORD_API_URL = os.environ.get("INTAKE_DISCORD_API_URL", "https://discord.com/api/v10").rstrip("/")  # e.g. a local fake
+# --daemon live mode: long-poll #intake and hand new messages straight to extraction
+DISCORD_STREAM = os.environ.get("INTAKE_DISCORD_STREAM", "").lower() in ("1", "true", "yes")
+DISCORD_STREAM_SECONDS = float(os.environ.get("INTAKE_DISCORD_STREAM_SECONDS", "3"))
 
 # Delivery — Discord webhook + Dropzone SCP
 COS_DISCORD_WEBHOOK = os.environ.get(
@@ -69,6 +156,7 @@ DROPZONE_SCP_TARGET = os.environ.get(
     "ccagent@192.168.1.13:/volume1/public/dropzone/",
 )
 DROPZONE_SSH_KEY = os.environ.get("INTAKE_DROPZONE_SSH_KEY", str(Path.home() / ".ssh" / "cc-to-ds923"))
+DROPZONE_SSH_CONTROL_PERSIST = int(os.environ.get("INTAKE_DROPZONE_SSH_CONTROL_PERSIST", "120"))  # seconds
 
 # Prompt files — Phase 2
 ENRICHMENT_PROMPT_FILE = Path(os.environ.get(
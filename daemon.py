@@ -0,0 +1,242 @@
+"""Daemon mode — stay running and process intake files within seconds of arrival.
+
+Replaces the cold start on every scheduler tick: the event loop, pooled
+clients, prompts, PAT and issue cache stay warm between files. The intake
+folder is watched with filesystem notifications when ``watchdog`` is
+installed, backed by a periodic rescan (notifications don't cross the
+Windows/WSL boundary on /mnt drives); without it the folder is polled.
+Discord is scraped and Phase 2 runs on their own intervals; with
+INTAKE_DISCORD_STREAM, #intake is long-polled and new messages go straight
+to extraction without waiting for a folder scan. Every trigger just sets a
+wake flag, so a burst of events coalesces into one cycle.
+"""
+
+import asyncio
+import signal
+import time
+from pathlib import Path
+
+import aio
+import change_gate
+import metrics
+import rate_governor
+import response_cache
+import run_journal
+from config import (
+    INTAKE_DIR, PROMPT_FILE, QUICK_PROMPT_FILE,
+    DAEMON_POLL_SECONDS, DAEMON_DISCORD_SECONDS, DAEMON_BACKLOG_SECONDS, DAEMON_RETRY_SECONDS,
+    DISCORD_STREAM, DISCORD_STREAM_SECONDS, CHANGE_GATE, log,
+)
+from ai_client import routing_summary, usage_summary
+from discord_client import discord_enabled, ingest_intake_channel_async
+from gitlab_client import GitLabError, fetch_existing_issues_async, flush_backlog_notifications_async
+
+SETTLE_SECONDS = 1.0  # a file must be unchanged this long before it is picked up
+WATCHDOG_RESCAN_SECONDS = 60.0
+
+
+def _start_observer(wake: asyncio.Event):
+    """Start a watchdog observer on the intake folder, or return None if watchdog isn't installed."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    loop = asyncio.get_running_loop()
+
+    class _Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            loop.call_soon_threadsafe(wake.set)
+
+    observer = Observer()
+    observer.schedule(_Handler(), str(INTAKE_DIR), recursive=False)
+    observer.daemon = True
+    try:
+        observer.start()
+    except OSError as exc:
+        log(f"  Warning: could not watch {INTAKE_DIR}: {exc} — falling back to polling.")
+        return None
+    return observer
+
+
+class _Prompts:
+    """Extraction prompts, re-read only when the files change on disk."""
+
+    def __init__(self, prompt_text: str, quick_prompt_text: str):
+        self.prompt_text = prompt_text
+        self.quick_prompt_text = quick_prompt_text
+        self._mtimes = self._current_mtimes()
+
+    @staticmethod
+    def _current_mtimes() -> tuple:
+        return tuple(p.stat().st_mtime if p.exists() else None for p in (PROMPT_FILE, QUICK_PROMPT_FILE))
+
+    def refresh(self) -> None:
+        mtimes = self._current_mtimes()
+        if mtimes == self._mtimes:
+            return
+        self._mtimes = mtimes
+        if PROMPT_FILE.exists():
+            self.prompt_text = PROMPT_FILE.read_text(encoding="utf-8")
+        self.quick_prompt_text = QUICK_PROMPT_FILE.read_text(encoding="utf-8") if QUICK_PROMPT_FILE.exists() else ""
+        log("Reloaded extraction prompts.")
+
+
+def _ready_files(attempts: dict[str, tuple], now: float) -> tuple[list[Path], float | None]:
+    """Files to process now, plus the delay until the next one becomes ready (or None).
+
+    A file is ready once it has stopped changing for SETTLE_SECONDS. A file left
+    in the folder by a failed attempt is retried after DAEMON_RETRY_SECONDS,
+    or immediately if it has been modified since.
+    """
+    from intake import collect_intake_files
+
+    ready: list[Path] = []
+    next_in: float | None = None
+    try:
+        files = collect_intake_files()
+    except OSError as exc:
+        log(f"  Warning: could not list {INTAKE_DIR}: {exc}")
+        return [], None
+
+    for path in files:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        signature = (st.st_mtime, st.st_size)
+        age = time.time() - st.st_mtime
+        if age < SETTLE_SECONDS:
+            wait = SETTLE_SECONDS - age
+        else:
+            previous = attempts.get(path.name)
+            if previous is None or previous[0] != signature:
+                ready.append(path)
+                attempts[path.name] = (signature, now)
+                continue
+            wait = previous[1] + DAEMON_RETRY_SECONDS - now
+            if wait <= 0:
+                ready.append(path)
+                attempts[path.name] = (signature, now)
+                continue
+        next_in = wait if next_in is None else min(next_in, wait)
+
+    present = {p.name for p in files}
+    for name in [n for n in attempts if n not in present]:
+        del attempts[name]
+    return ready, next_in
+
+
+def _mark_attempted(attempts: dict[str, tuple], paths: list[Path], now: float) -> None:
+    """Record files handed to extraction directly, so a folder scan doesn't pick them up again."""
+    for path in paths:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        attempts[path.name] = ((st.st_mtime, st.st_size), now)
+
+
+async def _process_files(files: list[Path], pat: str, prompts: _Prompts, dry_run: bool,
+                         workers: int, batch_mode: bool) -> None:
+    from intake import run_files_async
+
+    log(f"Daemon: {len(files)} file(s) ready.")
+    existing_issues: list[dict] = []
+    if not dry_run:
+        try:
+            existing_issues = await fetch_existing_issues_async(pat)
+        except GitLabError as exc:
+            log(f"ERROR: Could not load existing issues for dedup: {exc} — will retry.")
+            return
+    with metrics.span("phase", "extraction"):
+        await run_files_async(
+            files, prompts.prompt_text, prompts.quick_prompt_text, pat, dry_run,
+            existing_issues, max(1, min(workers, len(files))), batch_mode,
+        )
+        await flush_backlog_notifications_async()
+
+
+async def run_daemon_async(pat: str, prompts: _Prompts, dry_run: bool, skip_backlog: bool,
+                           workers: int, batch_mode: bool) -> None:
+    from backlog_processor import run_backlog_processor_async
+
+    wake = asyncio.Event()
+    observer = _start_observer(wake)
+    poll_seconds = max(DAEMON_POLL_SECONDS, WATCHDOG_RESCAN_SECONDS) if observer else DAEMON_POLL_SECONDS
+    if observer:
+        log(f"Daemon: watching {INTAKE_DIR} (rescan every {poll_seconds:g}s).")
+    else:
+        log(f"Daemon: polling {INTAKE_DIR} every {poll_seconds:g}s (install watchdog for instant pickup).")
+
+    attempts: dict[str, tuple] = {}
+    next_discord = 0.0
+    next_backlog = 0.0
+    try:
+        while True:
+            wake.clear()  # anything arriving from here on triggers another cycle
+            now = time.monotonic()
+            next_ready = None
+            try:
+                prompts.refresh()
+
+                if discord_enabled() and now >= next_discord:
+                    next_discord = now + (DISCORD_STREAM_SECONDS if DISCORD_STREAM else DAEMON_DISCORD_SECONDS)
+                    scraped = await ingest_intake_channel_async()
+                    if scraped:
+                        log(f"Scraped {len(scraped)} message(s) from Discord #intake.")
+                        if DISCORD_STREAM:
+                            _mark_attempted(attempts, scraped, now)
+                            await _process_files(scraped, pat, prompts, dry_run, workers, batch_mode)
+                            continue
+
+                files, next_ready = _ready_files(attempts, now)
+                if files:
+                    await _process_files(files, pat, prompts, dry_run, workers, batch_mode)
+                    # Re-scan straight away: files may have landed while this cycle ran.
+                    continue
+
+                if now >= next_backlog:
+                    next_backlog = now + DAEMON_BACKLOG_SECONDS
+                    if not dry_run and not skip_backlog and pat:
+                        # Between intervals the board usually hasn't moved — one probe instead of a Phase 2 pass.
+                        if not (CHANGE_GATE and await change_gate.backlog_idle_async(pat)):
+                            with metrics.span("phase", "backlog"):
+                                await run_backlog_processor_async(pat, batch_mode)
+                    response_cache.evict()
+                    run_journal.prune()
+                    metrics.write_report()
+            except Exception as exc:
+                log(f"UNEXPECTED ERROR in daemon cycle: {exc}")
+
+            now = time.monotonic()
+            timeout = min(poll_seconds, next_backlog - now)
+            if discord_enabled():
+                timeout = min(timeout, next_discord - now)
+            if next_ready is not None:
+                timeout = min(timeout, next_ready)
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=max(timeout, 0.1))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if observer:
+            observer.stop()
+
+
+def run_daemon(pat: str, prompt_text: str, quick_prompt_text: str, dry_run: bool, skip_backlog: bool,
+               workers: int, batch_mode: bool) -> None:
+    """Run until interrupted (Ctrl-C or SIGTERM)."""
+    prompts = _Prompts(prompt_text, quick_prompt_text)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    log("Daemon started.")
+    try:
+        aio.run(run_daemon_async(pat, prompts, dry_run, skip_backlog, workers, batch_mode))
+    except KeyboardInterrupt:
+        log("Daemon stopping.")
+    log(usage_summary())
+    log(routing_summary())
+    log(rate_governor.summary())
+    log(metrics.summary())
+    metrics.write_report()
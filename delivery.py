@@ -1,15 +1,27 @@
-"""Delivery module — Discord webhook + Dropzone SCP for prompt delivery."""
+"""Delivery module — Discord webhook + Dropzone upload for prompt delivery."""
 
-import subprocess
-import tempfile
+import asyncio
+import re
+import shlex
+import time
 from pathlib import Path
 
-import requests
+import httpx
 
-from config import COS_DISCORD_WEBHOOK, DROPZONE_SCP_TARGET, DROPZONE_SSH_KEY, log
+import aio
+import metrics
+from config import (
+    COS_DISCORD_WEBHOOK, DROPZONE_SCP_TARGET, DROPZONE_SSH_KEY, DROPZONE_SSH_CONTROL_PERSIST, log,
+)
 
+# Unix sockets don't work on Windows drives mounted in WSL, so keep the control socket under ~/.ssh.
+SSH_CONTROL_PATH = str(Path.home() / ".ssh" / "intake-cm-%C")
 
-def deliver_to_discord(title: str, content: str) -> bool:
+_ssh_master_lock = asyncio.Lock()
+_ssh_master_ready = False
+
+
+async def deliver_to_discord_async(title: str, content: str) -> bool:
     """POST a message to #chief-of-staff webhook. Truncates to Discord's 2000-char limit."""
     if not COS_DISCORD_WEBHOOK:
         log("  Warning: COS_DISCORD_WEBHOOK not configured — skipping Discord delivery")
@@ -25,18 +37,22 @@ def deliver_to_discord(title: str, content: str) -> bool:
         payload["content"] = payload["content"][:1997] + "..."
 
     try:
-        resp = requests.post(COS_DISCORD_WEBHOOK, json=payload, timeout=10)
+        resp = await aio.http_client("webhook").post(COS_DISCORD_WEBHOOK, json=payload, timeout=10)
         if resp.status_code in (200, 204):
             log(f"  Delivered to Discord: {title}")
             return True
         else:
             log(f"  Warning: Discord webhook returned {resp.status_code}")
             return False
-    except requests.RequestException as exc:
+    except httpx.HTTPError as exc:
         log(f"  Warning: Could not deliver to Discord: {exc}")
         return False
 
 
+def deliver_to_discord(title: str, content: str) -> bool:
+    return aio.run(deliver_to_discord_async(title, content))
+
+
 def wrap_prompt_html(title: str, prompt_text: str) -> str:
     """Generate an HTML page with the prompt in a styled pre block + copy button."""
     escaped_title = title.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
@@ -86,53 +102,121 @@ function copyPrompt() {{
 </html>"""
 
 
-def deliver_to_dropzone(filename: str, content: str) -> bool:
-    """Write content to a temp file and SCP to the Dropzone server."""
+def _split_target(target: str) -> tuple[str | None, str]:
+    """Split a Dropzone target into (ssh host or None for a local directory, directory)."""
+    if re.match(r"^[^/\\]+:", target) and not re.match(r"^[A-Za-z]:[/\\]", target):
+        host, _, directory = target.partition(":")
+        return host, directory
+    return None, target
+
+
+async def _upload_ssh(host: str, remote_path: str, content: bytes) -> tuple[bool, str]:
+    """Stream ``content`` to ``remote_path`` over a multiplexed ssh connection."""
+    tmp_path = f"{remote_path}.part"
+    remote_cmd = f"cat > {shlex.quote(tmp_path)} && mv -f {shlex.quote(tmp_path)} {shlex.quote(remote_path)}"
+    cmd = [
+        "ssh",
+        "-i", DROPZONE_SSH_KEY,
+        "-o", "StrictHostKeyChecking=no",
+        "-o", "BatchMode=yes",
+        "-o", "ControlMaster=auto",
+        "-o", f"ControlPath={SSH_CONTROL_PATH}",
+        "-o", f"ControlPersist={DROPZONE_SSH_CONTROL_PERSIST}",
+        host, remote_cmd,
+    ]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
     try:
-        with tempfile.NamedTemporaryFile(mode="w", suffix=f"_{filename}", delete=False,
-                                         encoding="utf-8") as f:
-            f.write(content)
-            tmp_path = f.name
-
-        cmd = [
-            "scp", "-O",
-            "-i", DROPZONE_SSH_KEY,
-            "-o", "StrictHostKeyChecking=no",
-            tmp_path,
-            f"{DROPZONE_SCP_TARGET}{filename}",
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-
-        # Clean up temp file
-        Path(tmp_path).unlink(missing_ok=True)
-
-        if result.returncode == 0:
-            log(f"  Delivered to Dropzone: {filename}")
-            return True
-        else:
-            log(f"  Warning: SCP failed: {result.stderr.strip()}")
+        _, stderr = await asyncio.wait_for(proc.communicate(content), timeout=30)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return False, "timed out"
+    return proc.returncode == 0, stderr.decode("utf-8", "replace").strip()
+
+
+def _write_local(directory: str, filename: str, content: bytes) -> None:
+    dest = Path(directory) / filename
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    tmp.write_bytes(content)
+    tmp.replace(dest)
+
+
+async def deliver_to_dropzone_async(filename: str, content: str) -> bool:
+    """Upload content to the Dropzone without a temp file.
+
+    An ``user@host:/dir/`` target streams over ssh, reusing one multiplexed
+    connection (ControlMaster) for every upload in the run; the first upload
+    opens it before any others start. A plain directory target is written
+    locally — handy as a stand-in for testing.
+    """
+    global _ssh_master_ready
+    host, directory = _split_target(DROPZONE_SCP_TARGET)
+    data = content.encode("utf-8")
+    with metrics.span("dropzone", "ssh" if host else "local") as span:
+        span.add(bytes=len(data))
+        try:
+            if host is None:
+                await asyncio.to_thread(_write_local, directory, filename, data)
+                ok, error = True, ""
+            elif _ssh_master_ready:
+                ok, error = await _upload_ssh(host, f"{directory}{filename}", data)
+            else:
+                async with _ssh_master_lock:
+                    ok, error = await _upload_ssh(host, f"{directory}{filename}", data)
+                    _ssh_master_ready = _ssh_master_ready or ok
+        except OSError as exc:
+            log(f"  Warning: Could not deliver to Dropzone: {exc}")
+            span.fail()
             return False
-    except Exception as exc:
-        log(f"  Warning: Could not deliver to Dropzone: {exc}")
-        return False
+        if not ok:
+            span.fail()
 
+    if ok:
+        log(f"  Delivered to Dropzone: {filename}")
+    else:
+        log(f"  Warning: Dropzone upload failed: {error}")
+    return ok
 
-def deliver_prompt(title: str, prompt_text: str) -> dict:
-    """Build HTML, push to Discord + Dropzone. Returns status dict."""
+
+def deliver_to_dropzone(filename: str, content: str) -> bool:
+    return aio.run(deliver_to_dropzone_async(filename, content))
+
+
+async def _timed(coro) -> tuple[bool, float]:
+    started = time.monotonic()
+    ok = await coro
+    return ok, time.monotonic() - started
+
+
+async def deliver_prompt_async(title: str, prompt_text: str) -> dict:
+    """Build HTML, push to Discord and Dropzone concurrently.
+
+    Returns a status dict with a result and elapsed seconds per sink.
+    """
     safe_name = "".join(c if c.isalnum() or c in "-_" else "-" for c in title.lower())
     filename = f"prompt-{safe_name}.html"
 
     html = wrap_prompt_html(title, prompt_text)
 
-    discord_ok = deliver_to_discord(
-        f"Prompt Ready: {title}",
-        f"```\n{prompt_text[:1500]}\n```\n\nFull prompt on Dropzone: `{filename}`"
+    (discord_ok, discord_secs), (dropzone_ok, dropzone_secs) = await asyncio.gather(
+        _timed(deliver_to_discord_async(
+            f"Prompt Ready: {title}",
+            f"```\n{prompt_text[:1500]}\n```\n\nFull prompt on Dropzone: `{filename}`"
+        )),
+        _timed(deliver_to_dropzone_async(filename, html)),
     )
-    dropzone_ok = deliver_to_dropzone(filename, html)
 
     return {
         "title": title,
         "filename": filename,
         "discord": discord_ok,
         "dropzone": dropzone_ok,
+        "seconds": {"discord": discord_secs, "dropzone": dropzone_secs},
     }
+
+
+def deliver_prompt(title: str, prompt_text: str) -> dict:
+    return aio.run(deliver_prompt_async(title, prompt_text))
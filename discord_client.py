@@ -1,75 +1,199 @@
-"""Discord integration — scrape #intake messages, notify #backlog."""
+"""Discord integration — scrape #intake messages, notify #backlog.
 
-import requests
+Messages are paged oldest-first with an ``after`` cursor persisted under
+DATA_ROOT, so nothing is dropped on a busy channel and nothing is scraped
+twice even if a delete fails. Scraped messages are bulk-deleted where
+Discord allows it (2-100 messages, under 14 days old) and every request
+honours the X-RateLimit-* headers.
+"""
 
-from config import DISCORD_BOT_TOKEN, DISCORD_CHANNEL_ID, INTAKE_DIR, log
+import asyncio
+import json
+import time
+from pathlib import Path
 
+import httpx
 
-DISCORD_API = "https://discord.com/api/v10"
+import aio
+import metrics
+from config import DATA_ROOT, DISCORD_API_URL, DISCORD_BOT_TOKEN, DISCORD_CHANNEL_ID, INTAKE_DIR, log
+
+
+DISCORD_API = DISCORD_API_URL
+CURSOR_FILE = DATA_ROOT / "_discord" / "cursor.json"
+PAGE_SIZE = 100
+BULK_DELETE_MAX = 100
+BULK_DELETE_MAX_AGE = 14 * 86400 - 3600  # Discord rejects bulk deletes of messages older than 14 days
+DISCORD_EPOCH_MS = 1420070400000
+MAX_RATE_LIMIT_RETRIES = 3
+
+_route_resume: dict[str, float] = {}  # route → monotonic time its rate-limit bucket resets
 
 
 def discord_enabled() -> bool:
     return bool(DISCORD_BOT_TOKEN and DISCORD_CHANNEL_ID)
 
 
-def scrape_intake_channel() -> int:
-    """Fetch messages from #intake, save as .txt files, delete from Discord.
+def _load_cursor() -> str:
+    try:
+        state = json.loads(CURSOR_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return "0"
+    if state.get("channel_id") != DISCORD_CHANNEL_ID:
+        return "0"
+    return str(state.get("after", "0"))
 
-    Returns the number of messages scraped.
-    """
-    if not discord_enabled():
-        return 0
 
+def _save_cursor(after: str) -> None:
+    try:
+        CURSOR_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CURSOR_FILE.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"channel_id": DISCORD_CHANNEL_ID, "after": after}), encoding="utf-8")
+        tmp.replace(CURSOR_FILE)
+    except OSError as exc:
+        log(f"  Warning: Could not save Discord cursor: {exc}")
+
+
+def _message_age(msg_id: str) -> float:
+    """Seconds since a message was posted, from its snowflake id."""
+    created_ms = (int(msg_id) >> 22) + DISCORD_EPOCH_MS
+    return time.time() - created_ms / 1000
+
+
+async def _request(route: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a Discord API request, waiting out the route's rate limit and retrying 429s."""
+    client = aio.http_client("discord")
     headers = {"Authorization": f"Bot {DISCORD_BOT_TOKEN}"}
-    url = f"{DISCORD_API}/channels/{DISCORD_CHANNEL_ID}/messages"
-    params = {"limit": 50}
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        wait = _route_resume.get(route, 0.0) - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
 
-    try:
-        resp = requests.get(url, headers=headers, params=params, timeout=15)
-        if resp.status_code != 200:
-            log(f"  Warning: Discord API returned {resp.status_code} fetching messages")
-            return 0
-        messages = resp.json()
-    except requests.RequestException as exc:
-        log(f"  Warning: Could not fetch Discord messages: {exc}")
-        return 0
-
-    if not messages:
-        return 0
-
-    INTAKE_DIR.mkdir(parents=True, exist_ok=True)
-    scraped = 0
-
-    for msg in messages:
-        content = msg.get("content", "").strip()
-        msg_id = msg.get("id", "unknown")
-
-        if not content:
-            continue
+        resp = await client.request(method, url, headers=headers, **kwargs)
+
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset_after = resp.headers.get("X-RateLimit-Reset-After")
+        if remaining == "0" and reset_after:
+            _route_resume[route] = time.monotonic() + float(reset_after)
 
-        # Save message as a text file
-        filepath = INTAKE_DIR / f"discord-{msg_id}.txt"
+        if resp.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+            return resp
         try:
-            filepath.write_text(content, encoding="utf-8")
-        except Exception as exc:
-            log(f"  Warning: Could not write {filepath.name}: {exc}")
+            retry_after = float(resp.json().get("retry_after", 0))
+        except ValueError:
+            retry_after = 0.0
+        retry_after = retry_after or float(resp.headers.get("Retry-After", "1"))
+        log(f"  Discord rate limited on {route} — retrying in {retry_after:.1f}s")
+        metrics.add(retries=1)
+        _route_resume[route] = time.monotonic() + retry_after
+    return resp
+
+
+async def _delete_messages(msg_ids: list[str]) -> int:
+    """Delete scraped messages — bulk where allowed, one by one otherwise. Returns the number deleted."""
+    channel_url = f"{DISCORD_API}/channels/{DISCORD_CHANNEL_ID}/messages"
+    bulk = [m for m in msg_ids if _message_age(m) < BULK_DELETE_MAX_AGE]
+    single = [m for m in msg_ids if _message_age(m) >= BULK_DELETE_MAX_AGE]
+    if len(bulk) == 1:
+        single, bulk = bulk + single, []
+
+    deleted = 0
+    for i in range(0, len(bulk), BULK_DELETE_MAX):
+        ids = bulk[i:i + BULK_DELETE_MAX]
+        if len(ids) == 1:
+            single.extend(ids)
             continue
+        try:
+            resp = await _request("bulk-delete", "POST", f"{channel_url}/bulk-delete", json={"messages": ids})
+        except httpx.HTTPError as exc:
+            log(f"  Warning: Could not bulk-delete {len(ids)} Discord message(s): {exc}")
+            continue
+        if resp.status_code == 204:
+            deleted += len(ids)
+        else:
+            log(f"  Warning: Discord bulk-delete returned {resp.status_code} — deleting one by one")
+            single.extend(ids)
 
-        # Delete message from Discord
-        delete_url = f"{DISCORD_API}/channels/{DISCORD_CHANNEL_ID}/messages/{msg_id}"
+    for msg_id in single:
         try:
-            del_resp = requests.delete(delete_url, headers=headers, timeout=15)
-            if del_resp.status_code == 204:
-                log(f"  Scraped and deleted Discord message {msg_id}")
-                scraped += 1
-            else:
-                log(f"  Warning: Could not delete Discord message {msg_id} (HTTP {del_resp.status_code})")
-                # File was saved — it'll be processed. Message stays in Discord (dupe next run, but harmless).
-                scraped += 1
-        except requests.RequestException as exc:
+            resp = await _request("delete", "DELETE", f"{channel_url}/{msg_id}")
+        except httpx.HTTPError as exc:
             log(f"  Warning: Could not delete Discord message {msg_id}: {exc}")
-            scraped += 1
+            continue
+        if resp.status_code == 204:
+            deleted += 1
+        else:
+            log(f"  Warning: Could not delete Discord message {msg_id} (HTTP {resp.status_code})")
+    return deleted
 
-    return scraped
 
+async def ingest_intake_channel_async() -> list[Path]:
+    """Fetch every new message from #intake, save each as a .txt file, delete them from Discord.
+
+    Returns the paths of the files written. The cursor is saved after each page
+    is on disk, so a message is never scraped twice even if deleting it fails.
+    """
+    if not discord_enabled():
+        return []
+    with metrics.span("discord", "scrape") as span:
+        written = await _ingest_async()
+        span.add(messages=len(written))
+    return written
+
+
+async def _ingest_async() -> list[Path]:
+    url = f"{DISCORD_API}/channels/{DISCORD_CHANNEL_ID}/messages"
+    after = _load_cursor()
+    written: list[Path] = []
+    to_delete: list[str] = []
 
+    while True:
+        try:
+            resp = await _request("messages", "GET", url, params={"after": after, "limit": PAGE_SIZE})
+            if resp.status_code != 200:
+                log(f"  Warning: Discord API returned {resp.status_code} fetching messages")
+                break
+            messages = resp.json()
+            metrics.add(bytes=len(resp.content))
+        except (httpx.HTTPError, ValueError) as exc:
+            log(f"  Warning: Could not fetch Discord messages: {exc}")
+            break
+        if not messages:
+            break
+
+        INTAKE_DIR.mkdir(parents=True, exist_ok=True)
+        page_ok = True
+        for msg in sorted(messages, key=lambda m: int(m["id"])):
+            msg_id = msg["id"]
+            content = msg.get("content", "").strip()
+            if content:
+                filepath = INTAKE_DIR / f"discord-{msg_id}.txt"
+                try:
+                    filepath.write_text(content, encoding="utf-8")
+                except OSError as exc:
+                    log(f"  Warning: Could not write {filepath.name}: {exc}")
+                    page_ok = False
+                    break
+                written.append(filepath)
+                to_delete.append(msg_id)
+            after = msg_id
+        _save_cursor(after)
+        if not page_ok or len(messages) < PAGE_SIZE:
+            break
+
+    if to_delete:
+        deleted = await _delete_messages(to_delete)
+        log(f"  Scraped {len(to_delete)} Discord message(s), deleted {deleted}.")
+    return written
+
+
+async def scrape_intake_channel_async() -> int:
+    """Fetch messages from #intake, save as .txt files, delete from Discord.
+
+    Returns the number of messages scraped.
+    """
+    return len(await ingest_intake_channel_async())
+
+
+def scrape_intake_channel() -> int:
+    return aio.run(scrape_intake_channel_async())
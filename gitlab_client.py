@@ -1,12 +1,33 @@
 """GitLab API client — fetch issues, post issues, PAT resolution."""
 
+import asyncio
+import email.utils
+import math
 import os
+import time
 import urllib.parse
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import AsyncIterator
 
-import requests
+import httpx
 
-from config import GITLAB_URL, GITLAB_PROJECT, DISCORD_BACKLOG_WEBHOOK, log
+import aio
+import issue_cache
+import issue_index
+import metrics
+from config import (
+    GITLAB_URL, GITLAB_PROJECT, DISCORD_BACKLOG_WEBHOOK, GITLAB_PAGE_CONCURRENCY, GITLAB_KEYSET_PAGINATION,
+    ISSUE_CACHE_FRESH_SECONDS, ISSUE_CACHE_FULL_SYNC_HOURS, log,
+)
+
+PAGE_RETRY_DELAYS = [1, 3, 10]  # seconds — per-page retries for transient errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+DISCORD_MESSAGE_LIMIT = 2000
+
+_last_cache_sync = 0.0  # monotonic time of the last successful cache sync in this process
+_created_since_flush: list[str] = []  # "#backlog" lines for issues created since the last notification
 
 
 def load_pat_from_credentials(gitlab_url: str) -> str | None:
@@ -47,94 +68,247 @@ def resolve_pat() -> str:
     )
 
 
-def fetch_existing_issues(pat: str) -> list[dict]:
-    """Fetch all open issues from the GitLab project for dedup comparison."""
+def _issues_url() -> str:
     encoded_project = urllib.parse.quote(GITLAB_PROJECT, safe="")
-    url = f"{GITLAB_URL}/api/v4/projects/{encoded_project}/issues"
+    return f"{GITLAB_URL}/api/v4/projects/{encoded_project}/issues"
+
+
+class GitLabError(RuntimeError):
+    """A GitLab read failed even after retries."""
+
+
+def _retry_delay(resp: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retry ``attempt``: GitLab's Retry-After (seconds or an HTTP date), else the default."""
+    value = (resp.headers.get("Retry-After") or "").strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        return max(0.0, seconds) if math.isfinite(seconds) else PAGE_RETRY_DELAYS[attempt]
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return PAGE_RETRY_DELAYS[attempt]
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+async def _get_page_async(client: httpx.AsyncClient, url: str, headers: dict, params: dict,
+                          what: str) -> httpx.Response:
+    """GET one page, retrying transient failures. Raises GitLabError when retries run out."""
+    with metrics.span("gitlab", "get_page") as span:
+        for attempt in range(len(PAGE_RETRY_DELAYS) + 1):
+            try:
+                resp = await client.get(url, headers=headers, params=params)
+                if resp.status_code == 200:
+                    span.add(bytes=len(resp.content))
+                    return resp
+                if resp.status_code not in RETRYABLE_STATUS_CODES or attempt >= len(PAGE_RETRY_DELAYS):
+                    raise GitLabError(f"GitLab returned {resp.status_code} fetching {what}")
+                delay = _retry_delay(resp, attempt)
+                log(f"  GitLab returned {resp.status_code} fetching {what} — retrying in {delay:g}s...")
+            except httpx.HTTPError as exc:
+                if attempt >= len(PAGE_RETRY_DELAYS):
+                    raise GitLabError(f"could not fetch {what}: {exc}") from exc
+                delay = PAGE_RETRY_DELAYS[attempt]
+                log(f"  Could not fetch {what} ({type(exc).__name__}) — retrying in {delay:g}s...")
+            span.add(retries=1)
+            await asyncio.sleep(delay)
+        raise GitLabError(f"could not fetch {what}")  # unreachable, but satisfies type checker
+
+
+async def iter_issue_pages_async(pat: str, params: dict, what: str = "issues") -> AsyncIterator[list[dict]]:
+    """Yield pages of raw issue JSON from the project issues endpoint as they arrive.
+
+    Offset mode reads X-Total-Pages from page 1 and fetches the remaining pages
+    concurrently (GITLAB_PAGE_CONCURRENCY), yielding in completion order. When
+    GitLab omits the total (over 10,000 results) it follows X-Next-Page instead.
+    Keyset mode (GITLAB_KEYSET_PAGINATION) follows the ``Link: rel="next"`` cursor,
+    which stays fast on very large projects. Any page that still fails after
+    retries raises GitLabError — callers never get a silently partial result.
+    """
+    client = aio.http_client("gitlab")
+    url = _issues_url()
     headers = {"PRIVATE-TOKEN": pat}
-    all_issues = []
-    page = 1
 
-    while True:
-        params = {"state": "opened", "per_page": 100, "page": page}
-        try:
-            resp = requests.get(url, headers=headers, params=params, timeout=15)
-            if resp.status_code != 200:
-                log(f"  Warning: GitLab returned {resp.status_code} fetching issues page {page}")
-                break
-            batch = resp.json()
-            if not batch:
-                break
-            for issue in batch:
-                all_issues.append({
-                    "iid": issue.get("iid"),
-                    "title": issue.get("title", ""),
-                    "labels": issue.get("labels", []),
-                })
+    if GITLAB_KEYSET_PAGINATION:
+        page_params = {**params, "pagination": "keyset", "order_by": "id", "sort": "asc", "per_page": 100}
+        page = 1
+        while url:
+            resp = await _get_page_async(client, url, headers, page_params, f"{what} page {page}")
+            yield resp.json()
+            url = resp.links.get("next", {}).get("url")
+            page_params = None  # the next link already carries every parameter
             page += 1
-        except requests.RequestException as exc:
-            log(f"  Warning: could not fetch issues page {page}: {exc}")
-            break
+        return
 
-    return all_issues
+    first = await _get_page_async(client, url, headers, {**params, "per_page": 100, "page": 1}, f"{what} page 1")
+    yield first.json()
 
+    total_pages = first.headers.get("X-Total-Pages")
+    if not total_pages:
+        next_page = first.headers.get("X-Next-Page")
+        while next_page:
+            resp = await _get_page_async(
+                client, url, headers, {**params, "per_page": 100, "page": next_page}, f"{what} page {next_page}",
+            )
+            yield resp.json()
+            next_page = resp.headers.get("X-Next-Page")
+        return
 
-def fetch_issues_by_label(pat: str, label: str) -> list[dict]:
-    """Fetch all open issues with a specific label."""
-    encoded_project = urllib.parse.quote(GITLAB_PROJECT, safe="")
-    url = f"{GITLAB_URL}/api/v4/projects/{encoded_project}/issues"
-    headers = {"PRIVATE-TOKEN": pat}
-    all_issues = []
-    page = 1
+    slots = asyncio.Semaphore(GITLAB_PAGE_CONCURRENCY)
 
-    while True:
-        params = {"state": "opened", "labels": label, "per_page": 100, "page": page}
+    async def _fetch(page: int) -> list[dict]:
+        async with slots:
+            resp = await _get_page_async(
+                client, url, headers, {**params, "per_page": 100, "page": page}, f"{what} page {page}",
+            )
+            return resp.json()
+
+    tasks = [asyncio.ensure_future(_fetch(page)) for page in range(2, int(total_pages) + 1)]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def sync_issue_cache_async(pat: str, force_full: bool = False) -> bool:
+    """Bring the local issue cache up to date. Returns False if GitLab couldn't be reached.
+
+    Raises GitLabError if the sync fails before any full load has succeeded.
+
+    After the first full load only issues changed since the last sync are
+    pulled (``updated_after``, all states, so closures drop out). A full reload
+    every ISSUE_CACHE_FULL_SYNC_HOURS catches deletions and moves, which never
+    show up in a delta. Calls within ISSUE_CACHE_FRESH_SECONDS are no-ops.
+    """
+    global _last_cache_sync
+    now = time.monotonic()
+    if not force_full and _last_cache_sync and now - _last_cache_sync < ISSUE_CACHE_FRESH_SECONDS:
+        return True
+
+    since = issue_cache.get_meta("updated_after")
+    last_full = issue_cache.get_meta("last_full_sync")
+    full = force_full or not since or time.time() - float(last_full or 0) > ISSUE_CACHE_FULL_SYNC_HOURS * 3600
+
+    if full:
+        params, what = {"state": "opened"}, "issues"
+    else:
+        params, what = {"state": "all", "updated_after": since}, "updated issues"
+
+    # Pages are applied as they stream in; a full reload prunes what it didn't see at the end.
+    upserted = removed = 0
+    seen: set[int] = set()
+    newest = ""
+    try:
+        async for batch in iter_issue_pages_async(pat, params, what):
+            counts = issue_cache.apply(batch)
+            upserted += counts[0]
+            removed += counts[1]
+            seen.update(iss["iid"] for iss in batch if "iid" in iss)
+            newest = max([newest, *(iss.get("updated_at", "") for iss in batch)])
+    except GitLabError as exc:
+        if not last_full:
+            raise  # nothing trustworthy cached yet — dedup against a partial board would be wrong
+        log(f"  Warning: issue cache sync failed ({exc}) — using cached issues.")
+        return False
+
+    if full:
+        removed += issue_cache.prune(seen)
+    if newest and (not since or newest > since):
+        issue_cache.set_meta("updated_after", newest)
+    if full:
+        issue_cache.set_meta("last_full_sync", str(time.time()))
+    log(f"  Issue cache {'reloaded' if full else 'synced'}: {upserted} updated, {removed} removed.")
+    _last_cache_sync = now
+    return True
+
+
+async def probe_board_async(pat: str, since: str, etag: str = "") -> tuple[bool, str]:
+    """Has any issue changed after ``since``? Returns (changed, ETag of the answer).
+
+    One ``per_page=1`` request for the most recently updated issue, sent with
+    If-None-Match so a server that tracks ETags can answer 304 with no body.
+    GitLab's ``updated_after`` is inclusive, so the answer comes from that
+    issue's ``updated_at`` rather than from whether the page is empty.
+    Raises GitLabError if GitLab can't be reached.
+    """
+    headers = {"PRIVATE-TOKEN": pat}
+    if etag:
+        headers["If-None-Match"] = etag
+    params = {"state": "all", "updated_after": since, "order_by": "updated_at", "sort": "desc", "per_page": 1}
+    with metrics.span("gitlab", "probe") as span:
         try:
-            resp = requests.get(url, headers=headers, params=params, timeout=15)
-            if resp.status_code != 200:
-                log(f"  Warning: GitLab returned {resp.status_code} fetching {label} issues page {page}")
-                break
-            batch = resp.json()
-            if not batch:
-                break
-            for issue in batch:
-                all_issues.append({
-                    "iid": issue.get("iid"),
-                    "title": issue.get("title", ""),
-                    "description": issue.get("description", ""),
-                    "labels": issue.get("labels", []),
-                })
-            page += 1
-        except requests.RequestException as exc:
-            log(f"  Warning: could not fetch {label} issues page {page}: {exc}")
-            break
+            resp = await aio.http_client("gitlab").get(_issues_url(), headers=headers, params=params)
+        except httpx.HTTPError as exc:
+            span.fail()
+            raise GitLabError(f"could not probe the board: {exc}") from exc
+        span.add(bytes=len(resp.content))
+        if resp.status_code == 304:
+            return False, etag
+        if resp.status_code != 200:
+            span.fail()
+            raise GitLabError(f"GitLab returned {resp.status_code} probing the board")
+        newest = resp.json()
+        return bool(newest) and newest[0].get("updated_at", "") > since, resp.headers.get("ETag", "")
+
 
-    return all_issues
+async def fetch_existing_issues_async(pat: str) -> list[dict]:
+    """Fetch all open issues from the GitLab project for dedup comparison."""
+    await sync_issue_cache_async(pat)
+    return [
+        {"iid": iss["iid"], "title": iss["title"], "labels": iss["labels"]}
+        for iss in issue_cache.open_issues()
+    ]
 
 
-def update_issue(pat: str, iid: int | str, data: dict) -> bool:
+def fetch_existing_issues(pat: str) -> list[dict]:
+    return aio.run(fetch_existing_issues_async(pat))
+
+
+async def fetch_issues_by_label_async(pat: str, label: str) -> list[dict]:
+    """Fetch all open issues with a specific label."""
+    await sync_issue_cache_async(pat)
+    return issue_cache.open_issues(label)
+
+
+def fetch_issues_by_label(pat: str, label: str) -> list[dict]:
+    return aio.run(fetch_issues_by_label_async(pat, label))
+
+
+async def update_issue_async(pat: str, iid: int | str, data: dict) -> bool:
     """Update an existing GitLab issue (description, labels, etc.)."""
-    encoded_project = urllib.parse.quote(GITLAB_PROJECT, safe="")
-    url = f"{GITLAB_URL}/api/v4/projects/{encoded_project}/issues/{iid}"
+    url = f"{_issues_url()}/{iid}"
     headers = {"PRIVATE-TOKEN": pat, "Content-Type": "application/json"}
 
-    try:
-        resp = requests.put(url, headers=headers, json=data, timeout=15)
-        if resp.status_code == 200:
-            log(f"  Updated GitLab issue #{iid}")
-            return True
-        else:
-            log(f"  ERROR: Could not update issue #{iid} (HTTP {resp.status_code}): {resp.text[:200]}")
+    with metrics.span("gitlab", "update_issue") as span:
+        try:
+            resp = await aio.http_client("gitlab").put(url, headers=headers, json=data)
+            span.add(bytes=len(resp.request.content) + len(resp.content))
+            if resp.status_code == 200:
+                log(f"  Updated GitLab issue #{iid}")
+                issue_cache.apply([resp.json()])
+                return True
+            else:
+                log(f"  ERROR: Could not update issue #{iid} (HTTP {resp.status_code}): {resp.text[:200]}")
+                span.fail()
+                return False
+        except httpx.HTTPError as exc:
+            log(f"  ERROR: Could not update issue #{iid}: {exc}")
+            span.fail()
             return False
-    except requests.RequestException as exc:
-        log(f"  ERROR: Could not update issue #{iid}: {exc}")
-        return False
 
 
-def post_failure_notice(pat: str, filename: str, preview: str) -> bool:
+def update_issue(pat: str, iid: int | str, data: dict) -> bool:
+    return aio.run(update_issue_async(pat, iid, data))
+
+
+async def post_failure_notice_async(pat: str, filename: str, preview: str) -> bool:
     """POST a failure notice issue to GitLab so parse failures are visible on the board."""
-    encoded_project = urllib.parse.quote(GITLAB_PROJECT, safe="")
-    url = f"{GITLAB_URL}/api/v4/projects/{encoded_project}/issues"
     headers = {"PRIVATE-TOKEN": pat, "Content-Type": "application/json"}
     payload = {
         "title": f"Intake parse failure: {filename}",
@@ -146,37 +320,64 @@ def post_failure_notice(pat: str, filename: str, preview: str) -> bool:
         "labels": "Intake-Failed",
     }
 
-    try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=15)
-        if resp.status_code == 201:
-            issue_data = resp.json()
-            log(f"  Posted failure notice: GitLab issue #{issue_data.get('iid', '?')}")
-            return True
-        else:
-            log(f"  ERROR: Could not post failure notice (HTTP {resp.status_code})")
+    with metrics.span("gitlab", "failure_notice") as span:
+        try:
+            resp = await aio.http_client("gitlab").post(_issues_url(), headers=headers, json=payload)
+            span.add(bytes=len(resp.request.content) + len(resp.content))
+            if resp.status_code == 201:
+                issue_data = resp.json()
+                log(f"  Posted failure notice: GitLab issue #{issue_data.get('iid', '?')}")
+                return True
+            else:
+                log(f"  ERROR: Could not post failure notice (HTTP {resp.status_code})")
+                span.fail()
+                return False
+        except httpx.HTTPError as exc:
+            log(f"  ERROR: Could not post failure notice: {exc}")
+            span.fail()
             return False
-    except requests.RequestException as exc:
-        log(f"  ERROR: Could not post failure notice: {exc}")
-        return False
 
 
-def _notify_backlog(title: str, iid: int | str, prefix: str = "") -> None:
-    """Post a notification to Discord #backlog after a GitLab issue is created."""
-    if not DISCORD_BACKLOG_WEBHOOK:
+def post_failure_notice(pat: str, filename: str, preview: str) -> bool:
+    return aio.run(post_failure_notice_async(pat, filename, preview))
+
+
+async def flush_backlog_notifications_async() -> None:
+    """Post every issue created since the last flush to Discord #backlog as one message.
+
+    Messages over Discord's 2000-character limit are split on line boundaries.
+    """
+    global _created_since_flush
+    created, _created_since_flush = _created_since_flush, []
+    if not DISCORD_BACKLOG_WEBHOOK or not created:
         return
-    payload = {"content": f"{prefix}New issue created: **{title}** (#{iid})"}
-    try:
-        resp = requests.post(DISCORD_BACKLOG_WEBHOOK, json=payload, timeout=10)
-        if resp.status_code not in (200, 204):
-            log(f"  Warning: Backlog webhook returned {resp.status_code}")
-    except requests.RequestException as exc:
-        log(f"  Warning: Could not notify backlog: {exc}")
+    header = f"{len(created)} new issue(s) created:" if len(created) > 1 else "New issue created:"
+    messages = [header]
+    for line in created:
+        if len(messages[-1]) + len(line) + 1 > DISCORD_MESSAGE_LIMIT:
+            messages.append(line)
+        else:
+            messages[-1] += "\n" + line
+    for content in messages:
+        try:
+            resp = await aio.http_client("webhook").post(DISCORD_BACKLOG_WEBHOOK, json={"content": content}, timeout=10)
+            if resp.status_code not in (200, 204):
+                log(f"  Warning: Backlog webhook returned {resp.status_code}")
+        except httpx.HTTPError as exc:
+            log(f"  Warning: Could not notify backlog: {exc}")
 
 
-def post_issue(pat: str, issue: dict, dry_run: bool, prefix: str = "") -> bool:
-    """POST one issue to GitLab. Returns True on success (or dry_run)."""
-    encoded_project = urllib.parse.quote(GITLAB_PROJECT, safe="")
-    url = f"{GITLAB_URL}/api/v4/projects/{encoded_project}/issues"
+def flush_backlog_notifications() -> None:
+    aio.run(flush_backlog_notifications_async())
+
+
+async def post_issue_async(pat: str, issue: dict, dry_run: bool, prefix: str = "") -> bool:
+    """POST one issue to GitLab. Returns True on success (or dry_run).
+
+    On success the new issue's iid is stored on ``issue["iid"]`` and the issue is
+    queued for the next coalesced #backlog notification. A 429 is retried after
+    GitLab's Retry-After; other failures are not, since the issue may exist.
+    """
     headers = {"PRIVATE-TOKEN": pat, "Content-Type": "application/json"}
     payload = {
         "title": issue["title"],
@@ -188,17 +389,37 @@ def post_issue(pat: str, issue: dict, dry_run: bool, prefix: str = "") -> bool:
         log(f"  [DRY RUN] Would POST: {issue['title']}")
         return True
 
-    try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=15)
-        if resp.status_code == 201:
+    with metrics.span("gitlab", "post_issue") as span:
+        for attempt in range(len(PAGE_RETRY_DELAYS) + 1):
+            try:
+                resp = await aio.http_client("gitlab").post(_issues_url(), headers=headers, json=payload)
+            except httpx.HTTPError as exc:
+                log(f"  ERROR: Request failed for '{issue['title']}': {exc}")
+                span.fail()
+                return False
+            if resp.status_code == 429 and attempt < len(PAGE_RETRY_DELAYS):
+                delay = _retry_delay(resp, attempt)
+                log(f"  GitLab rate limited posting '{issue['title']}' — retrying in {delay:g}s...")
+                span.add(retries=1)
+                await asyncio.sleep(delay)
+                continue
+            span.add(bytes=len(resp.request.content) + len(resp.content))
+            if resp.status_code != 201:
+                log(f"  ERROR: GitLab returned HTTP {resp.status_code} for '{issue['title']}': {resp.text[:200]}")
+                span.fail()
+                return False
+
             issue_data = resp.json()
             iid = issue_data.get("iid", "?")
+            issue["iid"] = iid
             log(f"  Created GitLab issue #{iid}: {issue['title']}")
-            _notify_backlog(issue["title"], iid, prefix=prefix)
+            issue_cache.apply([issue_data])
+            issue_index.add_issue(iid, issue["title"])
+            issue_index.save()
+            _created_since_flush.append(f"- {prefix}**{issue['title']}** (#{iid})")
             return True
-        else:
-            log(f"  ERROR: GitLab returned HTTP {resp.status_code} for '{issue['title']}': {resp.text[:200]}")
-            return False
-    except requests.RequestException as exc:
-        log(f"  ERROR: Request failed for '{issue['title']}': {exc}")
         return False
+
+
+def post_issue(pat: str, issue: dict, dry_run: bool, prefix: str = "") -> bool:
+    return aio.run(post_issue_async(pat, issue, dry_run, prefix=prefix))
@@ -0,0 +1,159 @@
+"""Ledger of intake inputs already processed, so a repeat skips extraction entirely.
+
+Every file that makes it to _processed is fingerprinted here with the GitLab
+iids it produced. Text is normalised first (lower case, punctuation and
+whitespace dropped), so a re-drop that only differs in formatting has the same
+exact hash. Near-duplicates are found by shingling: each input is stored as
+the hashes of its overlapping SHINGLE_WORDS-word runs, padded at both ends so
+every word sits in exactly SHINGLE_WORDS of them. A word changed in place
+alters those runs on both sides, so a new input counts as a repeat of a stored
+one when each side differs by at most that much per tolerated edit
+(INTAKE_LEDGER_NEAR_EDITS), no stretch of new runs is longer than one word's
+window, and the word counts differ by no more than the tolerated edits. A
+fixed typo or a changed word qualifies; an appended or inserted sentence, a
+rewritten phrase or a trimmed copy doesn't. Inputs under NEAR_MIN_WORDS words
+only ever match exactly — one word changed in a short message is a new idea.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+from config import DATA_ROOT, LEDGER_NEAR_EDITS, log
+
+LEDGER_FILE = DATA_ROOT / "ledger.sqlite"
+SHINGLE_WORDS = 5
+NEAR_MIN_WORDS = 3 * SHINGLE_WORDS
+NEAR_CANDIDATES = 5  # stored inputs sharing the most shingles that are checked as near-copies
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inputs (
+    id INTEGER PRIMARY KEY,
+    exact TEXT NOT NULL UNIQUE,
+    file TEXT NOT NULL,
+    iids TEXT NOT NULL,
+    seen_at TEXT NOT NULL,
+    words INTEGER
+);
+CREATE TABLE IF NOT EXISTS shingles (
+    hash INTEGER NOT NULL,
+    input_id INTEGER NOT NULL,
+    PRIMARY KEY (hash, input_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS shingles_input ON shingles (input_id);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    LEDGER_FILE.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(LEDGER_FILE)
+    conn.executescript(_SCHEMA)
+    if "words" not in {col[1] for col in conn.execute("PRAGMA table_info(inputs)")}:
+        # Rows from before word counts were kept still match exactly, never as near-copies.
+        conn.execute("ALTER TABLE inputs ADD COLUMN words INTEGER")
+    return conn
+
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _exact(words: list[str]) -> str:
+    return hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest()
+
+
+def _shingles(words: list[str]) -> list[int]:
+    """Signed 64-bit hashes of every SHINGLE_WORDS-word run, in text order, padded at both ends."""
+    pad = SHINGLE_WORDS - 1
+    padded = ["^"] * pad + words + ["$"] * pad
+    return [
+        int.from_bytes(hashlib.blake2b(" ".join(padded[i:i + SHINGLE_WORDS]).encode("utf-8"), digest_size=8).digest(),
+                       "big", signed=True)
+        for i in range(len(padded) - SHINGLE_WORDS + 1)
+    ]
+
+
+def _near_copy(shingles: list[int], words: int, stored: set[int], stored_words: int) -> bool:
+    """Whether ``shingles`` (in text order) are ``stored`` with at most LEDGER_NEAR_EDITS words changed."""
+    new = set(shingles)
+    novel = new - stored
+    budget = LEDGER_NEAR_EDITS * SHINGLE_WORDS
+    if len(novel) > budget or len(stored - new) > budget or abs(words - stored_words) > LEDGER_NEAR_EDITS:
+        return False
+    run = 0
+    for h in shingles:
+        run = run + 1 if h in novel else 0
+        if run > SHINGLE_WORDS:  # more than one word's window in a row is new text, not an edit
+            return False
+    return True
+
+
+def _match(row: tuple, kind: str, similarity: float) -> dict:
+    file, iids, seen_at = row
+    return {"file": file, "iids": json.loads(iids), "seen_at": seen_at, "match": kind,
+            "similarity": round(similarity, 3)}
+
+
+def lookup(text: str) -> dict | None:
+    """The earlier input ``text`` repeats, or None.
+
+    Returns the earlier file name, its iids, when it was seen, whether the match
+    was "exact" or "near", and the Jaccard similarity of the two shingle sets.
+    """
+    words = _words(text)
+    if not words:
+        return None
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute("SELECT file, iids, seen_at FROM inputs WHERE exact = ?", (_exact(words),)).fetchone()
+            if row:
+                return _match(row, "exact", 1.0)
+            if LEDGER_NEAR_EDITS <= 0 or len(words) < NEAR_MIN_WORDS:
+                return None
+
+            shingles = _shingles(words)
+            conn.execute("CREATE TEMP TABLE probe (hash INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO probe (hash) VALUES (?)", ((h,) for h in shingles))
+            # The most overlap isn't always the copy: a short input shares most with a longer one it starts.
+            candidates = conn.execute(
+                "SELECT s.input_id, COUNT(*) AS shared, i.words FROM shingles s JOIN probe p ON p.hash = s.hash"
+                " JOIN inputs i ON i.id = s.input_id WHERE i.words BETWEEN ? AND ?"
+                " GROUP BY s.input_id ORDER BY shared DESC LIMIT ?",
+                (len(words) - LEDGER_NEAR_EDITS, len(words) + LEDGER_NEAR_EDITS, NEAR_CANDIDATES),
+            ).fetchall()
+            for input_id, shared, stored_words in candidates:
+                stored = {h for (h,) in conn.execute("SELECT hash FROM shingles WHERE input_id = ?", (input_id,))}
+                if _near_copy(shingles, len(words), stored, stored_words):
+                    row = conn.execute("SELECT file, iids, seen_at FROM inputs WHERE id = ?", (input_id,)).fetchone()
+                    return _match(row, "near", shared / len(set(shingles) | stored))
+    except sqlite3.Error as exc:
+        log(f"  Warning: could not read the input ledger: {exc}")
+    return None
+
+
+def record(file: str, text: str, iids: list) -> None:
+    """Remember that ``text`` (from ``file``) has been processed into ``iids``."""
+    words = _words(text)
+    if not words:
+        return
+    exact = _exact(words)
+    try:
+        with closing(_connect()) as conn, conn:
+            old = conn.execute("SELECT id FROM inputs WHERE exact = ?", (exact,)).fetchone()
+            if old:
+                conn.execute("DELETE FROM shingles WHERE input_id = ?", old)
+                conn.execute("DELETE FROM inputs WHERE id = ?", old)
+            input_id = conn.execute(
+                "INSERT INTO inputs (exact, file, iids, seen_at, words) VALUES (?, ?, ?, ?, ?)",
+                (exact, file, json.dumps([i for i in iids if i is not None]),
+                 datetime.now().isoformat(timespec="seconds"), len(words)),
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO shingles (hash, input_id) VALUES (?, ?)",
+                ((h, input_id) for h in _shingles(words)),
+            )
+    except sqlite3.Error as exc:
+        log(f"  Warning: could not record {file} in the input ledger: {exc}")
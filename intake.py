@@ -5,18 +5,42 @@ issues via AI, deduplicates against a GitLab board, and posts new ones.
 """
 
 import argparse
+import asyncio
+import json
 import sys
 from datetime import datetime
 from pathlib import Path
 
-from config import INTAKE_DIR, PROCESSED_DIR, FAILED_DIR, PROMPT_FILE, QUICK_PROMPT_FILE, log
-from ai_client import extract_ideas, filter_duplicates
-from gitlab_client import resolve_pat, fetch_existing_issues, post_issue, post_failure_notice
+import aio
+import batch_jobs
+import change_gate
+import input_ledger
+import metrics
+import outbox
+import rate_governor
+import response_cache
+import run_journal
+import run_lock
+from config import (
+    INTAKE_DIR, PROCESSED_DIR, FAILED_DIR, PROMPT_FILE, QUICK_PROMPT_FILE, INTAKE_WORKERS, BATCH_MODE,
+    QUICK_BATCH_SIZE, CHUNK_TOKENS, STREAM_POSTING, LEDGER_ENABLED, CHANGE_GATE, anthropic_api_key, log,
+)
+from ai_client import (
+    extract_ideas_async, extract_quick_batch_async, extraction_request, filter_batch_repeats_async,
+    filter_duplicates_async, routing_summary, split_dedup_suspects, usage_summary,
+)
+from chunker import estimate_tokens
+from gitlab_client import (
+    GitLabError, resolve_pat, fetch_existing_issues, post_issue_async, post_failure_notice_async,
+    flush_backlog_notifications,
+)
 from discord_client import scrape_intake_channel
-from parser import parse_issues, is_prompt_request
+from parser import IssueStreamParser, format_issues, parse_issues, parse_numbered_issues
 
 
-def _move_file(filepath: Path, target_dir: Path) -> None:
+def _move_file(filepath: Path, target_dir: Path) -> Path:
+    # No awaits in here, so concurrent workers on the event loop can't interleave
+    # between picking a collision-free destination and the rename.
     target_dir.mkdir(parents=True, exist_ok=True)
     dest = target_dir / filepath.name
     if dest.exists():
@@ -24,17 +48,33 @@ def _move_file(filepath: Path, target_dir: Path) -> None:
         dest = target_dir / f"{filepath.stem}_{ts}{filepath.suffix}"
     filepath.rename(dest)
     log(f"  Moved to {dest}")
+    return dest
 
 
-def process_file(
+async def process_file_async(
     filepath: Path,
     prompt_text: str,
     pat: str,
     dry_run: bool,
     existing_issues: list[dict],
+    post_lock: asyncio.Lock,
 ) -> None:
+    """Extract, dedup and post one intake file.
+
+    Extraction runs unlocked so workers overlap on the slow AI call. Dedup and
+    posting hold ``post_lock`` and append what they post to ``existing_issues``,
+    so a later file sees ideas posted by an earlier one in the same run.
+    """
     log(f"Processing {filepath.name}...")
 
+    entry = None if dry_run else outbox.load(filepath)
+    if entry is not None:
+        log(f"  Resuming {len(outbox.pending(entry))} unconfirmed issue(s) from the outbox — skipping extraction.")
+        async with post_lock:
+            complete = await _send_planned_async(filepath, entry, pat, existing_issues)
+        _finish_file(filepath, complete)
+        return
+
     try:
         file_contents = filepath.read_text(encoding="utf-8")
     except Exception as exc:
@@ -45,50 +85,528 @@ def process_file(
         log(f"  Skipping empty file: {filepath.name}")
         return
 
+    stored = None if dry_run else _journaled_extraction(filepath, file_contents)
+    if stored is not None:
+        log("  Extraction already in the run journal — skipping the Anthropic call.")
+        await _apply_extraction_async(filepath, stored, pat, dry_run, existing_issues, post_lock)
+        return
+
     # Extract ideas via AI
-    from config import MODEL
-    log(f"  Calling Anthropic ({MODEL})...")
+    log("  Calling Anthropic...")
+    if STREAM_POSTING and estimate_tokens(file_contents) <= CHUNK_TOKENS:
+        await _extract_streaming_async(filepath, prompt_text, file_contents, pat, dry_run, existing_issues, post_lock)
+        return
     try:
-        response_text = extract_ideas(prompt_text, file_contents)
+        response_text = await extract_ideas_async(prompt_text, file_contents)
     except Exception as exc:
         log(f"  ERROR: Anthropic API call failed for {filepath.name}: {exc}")
         return
+    if not dry_run:
+        run_journal.record("file", filepath.name, "extracted", response_text, run_journal.input_hash(file_contents))
 
+    await _apply_extraction_async(filepath, response_text, pat, dry_run, existing_issues, post_lock)
+
+
+def _journaled_extraction(filepath: Path, file_contents: str) -> str | None:
+    """The extraction response recorded for this exact file content by an earlier run, if any."""
+    return run_journal.get("file", filepath.name, "extracted", run_journal.input_hash(file_contents))
+
+
+async def _apply_extraction_async(
+    filepath: Path,
+    response_text: str,
+    pat: str,
+    dry_run: bool,
+    existing_issues: list[dict],
+    post_lock: asyncio.Lock,
+) -> None:
+    """Parse, dedup and post an extraction response, then move the source file."""
     # Parse structured issues from response
     issues = parse_issues(response_text)
     if not issues:
-        log(f"  WARNING: No GITLAB ISSUE blocks found in response for {filepath.name}")
-        preview = response_text[:200].replace('\n', ' ').strip()
-        log(f"  Response preview: {preview}...")
-        if not dry_run and pat and post_failure_notice(pat, filepath.name, preview):
-            _move_file(filepath, FAILED_DIR)
-        else:
-            log(f"  Could not post failure notice — leaving {filepath.name} in _intake for retry.")
+        await _handle_no_issues_async(filepath, response_text, pat, dry_run)
         return
 
-    log(f"  Found {len(issues)} issue(s).")
+    log(f"  Found {len(issues)} issue(s) in {filepath.name}.")
+    await _dedup_and_post_async([(filepath, issues)], pat, dry_run, existing_issues, post_lock)
+
+
+async def _handle_no_issues_async(filepath: Path, response_text: str, pat: str, dry_run: bool) -> None:
+    log(f"  WARNING: No GITLAB ISSUE blocks found in response for {filepath.name}")
+    preview = response_text[:200].replace('\n', ' ').strip()
+    log(f"  Response preview: {preview}...")
+    if not dry_run and pat and await post_failure_notice_async(pat, filepath.name, preview):
+        _move_file(filepath, FAILED_DIR)
+    else:
+        log(f"  Could not post failure notice — leaving {filepath.name} in _intake for retry.")
+
+
+async def _extract_streaming_async(
+    filepath: Path,
+    prompt_text: str,
+    file_contents: str,
+    pat: str,
+    dry_run: bool,
+    existing_issues: list[dict],
+    post_lock: asyncio.Lock,
+) -> None:
+    """Extract one file with the response fed through IssueStreamParser.
 
-    # AI-powered semantic dedup
-    if not dry_run and existing_issues:
-        issues = filter_duplicates(issues, existing_issues)
-        if not issues:
-            log(f"  All issues were duplicates — nothing to post.")
-            _move_file(filepath, PROCESSED_DIR)
+    Each issue block is handed on as soon as it completes, and a consumer posts
+    whatever has accumulated while the model is still writing the rest. Issues
+    with no close match on the board go out straight away; those that need the
+    model's dedup verdict are held and judged together in one call per file
+    once the stream ends. If the consumer fails, the stream is stopped rather
+    than paid for to the end. The outbox entry stays incomplete until the stream
+    ends, so a run cut off mid-stream re-extracts the file and dedup catches
+    what already went out.
+    """
+    stream_parser = IssueStreamParser()
+    ready: asyncio.Queue = asyncio.Queue()
+    streamed: list[dict] = []  # every issue handed to the consumer, in order
+    entry: dict | None = None
+    found = 0
+
+    def _on_text(text: str) -> None:
+        if consumer.done():  # it only returns after the stream, so it failed — nothing would post the rest
+            raise RuntimeError(f"posting for {filepath.name} failed — stopping the stream")
+        for issue in stream_parser.feed(text):
+            streamed.append(issue)
+            ready.put_nowait(issue)
+
+    async def _post(kept: list[dict]) -> None:
+        """Post ``kept`` through the file's outbox entry. Call with ``post_lock`` held."""
+        nonlocal entry
+        if dry_run:
+            for issue in kept:
+                log(f"  Posting: {issue['title']}")
+                await post_issue_async(pat, issue, dry_run)
             return
-        log(f"  {len(issues)} issue(s) after dedup.")
+        if entry is None:
+            entry = outbox.plan(filepath, kept, complete=False)
+        else:
+            outbox.extend(entry, kept)
+        for item in await outbox.send_async(entry, pat):
+            existing_issues.append({"iid": item["iid"], "title": item["title"], "labels": [item["label"]]})
+
+    async def _consume() -> None:
+        nonlocal found
+        held: list[dict] = []  # close to something on the board — judged in one dedup call at the end
+        finished = False
+        while not finished:
+            batch = []
+            item = await ready.get()
+            while True:  # take everything that has queued up since the last round
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+                if ready.empty():
+                    break
+                item = ready.get_nowait()
+            if not batch:
+                continue
+            found += len(batch)
+            log(f"  {len(batch)} issue(s) ready from the stream in {filepath.name}.")
+            async with post_lock:
+                clean, suspects = (batch, []) if dry_run else split_dedup_suspects(batch, existing_issues)
+                held += suspects
+                if clean:
+                    await _post(clean)
+        if held:
+            async with post_lock:
+                kept = await _dedup_async(held, dry_run, existing_issues)
+                if kept:
+                    await _post(kept)
+
+    consumer = asyncio.create_task(_consume())
+    try:
+        response_text = await extract_ideas_async(
+            prompt_text, file_contents, on_text=_on_text, on_restart=stream_parser.close,
+            emitted=lambda: len(streamed),
+        )
+    except Exception as exc:
+        if not consumer.done():
+            log(f"  ERROR: Anthropic API call failed for {filepath.name}: {exc}")
+            ready.put_nowait(None)
+        await consumer  # re-raises the consumer's error if that is what stopped the stream
+        return
+    for issue in stream_parser.close():
+        streamed.append(issue)
+        ready.put_nowait(issue)
+    ready.put_nowait(None)
+    await consumer
+    if streamed and not parse_issues(response_text):
+        # Cut off or malformed after some issues were already handed on — keep those rather than re-extract.
+        log(f"  WARNING: Response for {filepath.name} broke off after {len(streamed)} issue(s) — keeping those.")
+        response_text = format_issues(streamed)
+    if not dry_run:
+        run_journal.record("file", filepath.name, "extracted", response_text, run_journal.input_hash(file_contents))
+        kept = [item["title"] for item in entry["items"]] if entry else []
+        run_journal.record("file", filepath.name, "deduped", json.dumps(kept))
+
+    if not found:
+        await _handle_no_issues_async(filepath, response_text, pat, dry_run)
+        return
+    log(f"  Found {found} issue(s) in {filepath.name}.")
+    if entry is None:
+        if not dry_run:
+            log(f"  All issues in {filepath.name} were duplicates — nothing to post.")
+            _remember(filepath, [])
+        _move_file(filepath, PROCESSED_DIR)
+        return
+
+    outbox.mark_complete(entry)
+    if outbox.pending(entry):
+        # One more pass for anything that failed while the stream was still running.
+        async with post_lock:
+            complete = await _send_planned_async(filepath, entry, pat, existing_issues)
+    else:
+        _remember(filepath, [item["iid"] for item in entry["items"]])
+        outbox.done(filepath)
+        complete = True
+    _finish_file(filepath, complete)
+
+
+async def _dedup_and_post_async(
+    results: list[tuple[Path, list[dict]]],
+    pat: str,
+    dry_run: bool,
+    existing_issues: list[dict],
+    post_lock: asyncio.Lock,
+) -> None:
+    """Dedup and post extracted issues, then move each source file.
+
+    ``results`` pairs each source file with its parsed issues. Dedup against the
+    board runs once across all of them, so a micro-batch of quick ideas costs a
+    single dedup call; with several files, the survivors are then checked
+    against each other, so one idea sent twice in a batch is posted once.
+    """
+    outcomes = []
+    async with post_lock:
+        kept = await _dedup_async([issue for _, issues in results for issue in issues], dry_run, existing_issues)
+        kept_ids = {id(issue) for issue in kept}
+        if not dry_run and len(results) > 1:
+            kept = await filter_batch_repeats_async(
+                [[issue for issue in issues if id(issue) in kept_ids] for _, issues in results]
+            )
+            kept_ids = {id(issue) for issue in kept}
+
+        for filepath, issues in results:
+            issues = [issue for issue in issues if id(issue) in kept_ids]
+            if not issues:
+                log(f"  All issues in {filepath.name} were duplicates — nothing to post.")
+                if not dry_run:
+                    run_journal.record("file", filepath.name, "deduped", "[]")
+                    _remember(filepath, [])
+                _move_file(filepath, PROCESSED_DIR)
+                continue
+            if not dry_run and existing_issues:
+                log(f"  {len(issues)} issue(s) in {filepath.name} after dedup.")
+            if not dry_run:
+                run_journal.record("file", filepath.name, "deduped", json.dumps([issue["title"] for issue in issues]))
+
+            if dry_run:
+                for i, issue in enumerate(issues, start=1):
+                    log(f"  Posting {i}/{len(issues)}: {issue['title']}")
+                    await post_issue_async(pat, issue, dry_run)
+                outcomes.append((filepath, True))
+                continue
+
+            # Post to GitLab via the outbox, so a retry resends only what didn't go through
+            entry = outbox.plan(filepath, issues)
+            outcomes.append((filepath, await _send_planned_async(filepath, entry, pat, existing_issues)))
+
+    for filepath, all_success in outcomes:
+        _finish_file(filepath, all_success)
+
+
+async def _dedup_async(issues: list[dict], dry_run: bool, existing_issues: list[dict]) -> list[dict]:
+    """AI-powered semantic dedup against the board. Call with ``post_lock`` held."""
+    if dry_run or not existing_issues:
+        return issues
+    return await filter_duplicates_async(issues, existing_issues)
+
+
+async def _send_planned_async(filepath: Path, entry: dict, pat: str, existing_issues: list[dict]) -> bool:
+    """Send a file's unconfirmed outbox items. Returns True once every item is confirmed."""
+    for item in await outbox.send_async(entry, pat):
+        existing_issues.append({"iid": item["iid"], "title": item["title"], "labels": [item["label"]]})
+    if outbox.pending(entry):
+        return False
+    _remember(filepath, [item["iid"] for item in entry["items"]])
+    outbox.done(filepath)
+    return True
+
+
+def _remember(filepath: Path, iids: list) -> None:
+    """Journal the iids a file produced and fingerprint it in the input ledger, on its way to _processed."""
+    run_journal.record("file", filepath.name, "posted", json.dumps(iids))
+    if not LEDGER_ENABLED:
+        return
+    try:
+        text = filepath.read_text(encoding="utf-8")
+    except OSError:
+        return
+    input_ledger.record(filepath.name, text, iids)
+
+
+def _skip_seen_inputs(files: list[Path]) -> list[Path]:
+    """Move files the input ledger has already seen to _processed. Returns the rest.
+
+    A skipped file gets a ``<name>.seen.json`` pointer beside it in _processed,
+    naming the earlier file and the issues it produced.
+    """
+    fresh = []
+    for filepath in files:
+        if outbox.has_entry(filepath):
+            fresh.append(filepath)  # mid-post — the outbox owns it
+            continue
+        try:
+            seen = input_ledger.lookup(filepath.read_text(encoding="utf-8"))
+        except OSError:
+            seen = None
+        if seen is None:
+            fresh.append(filepath)
+            continue
+        how = "identical to" if seen["match"] == "exact" else f"a near-copy ({seen['similarity']:.0%}) of"
+        issues = ", ".join(f"#{iid}" for iid in seen["iids"]) or "no new issues"
+        log(f"Skipping {filepath.name}: {how} {seen['file']}, processed {seen['seen_at']} ({issues}).")
+        dest = _move_file(filepath, PROCESSED_DIR)
+        try:
+            dest.with_name(f"{dest.name}.seen.json").write_text(json.dumps(seen, indent=2), encoding="utf-8")
+        except OSError as exc:
+            log(f"  Warning: could not write a pointer for {dest.name}: {exc}")
+    return fresh
 
-    # Post to GitLab
-    all_success = True
-    for i, issue in enumerate(issues, start=1):
-        prefix = "Prompt: " if is_prompt_request(issue) else ""
-        log(f"  Posting {i}/{len(issues)}: {issue['title']}")
-        if not post_issue(pat, issue, dry_run, prefix=prefix):
-            all_success = False
 
+def _finish_file(filepath: Path, all_success: bool) -> None:
     if all_success:
         _move_file(filepath, PROCESSED_DIR)
     else:
-        log(f"  One or more GitLab POSTs failed — leaving {filepath.name} in _intake for retry.")
+        log(f"  One or more GitLab POSTs failed — leaving {filepath.name} in _intake; "
+            f"the next run resends only the unconfirmed issues.")
+
+
+def _is_quick_idea(filepath: Path) -> bool:
+    return filepath.name.startswith("discord-")
+
+
+async def process_quick_batch_async(
+    files: list[Path],
+    quick_prompt_text: str,
+    pat: str,
+    dry_run: bool,
+    existing_issues: list[dict],
+    post_lock: asyncio.Lock,
+) -> list[Path]:
+    """Extract a micro-batch of quick-idea files in one call and dedup them in one pass.
+
+    Issue blocks are mapped back to their file by item number, so each file is
+    still moved on its own. Returns the files the batch couldn't account for,
+    plus any an earlier run already extracted (they resume from the run
+    journal) — the caller processes those individually.
+    """
+    items: list[tuple[Path, str]] = []
+    journaled: list[Path] = []
+    for filepath in files:
+        try:
+            contents = filepath.read_text(encoding="utf-8")
+        except Exception as exc:
+            log(f"  ERROR: Could not read {filepath.name}: {exc}")
+            continue
+        if not contents.strip():
+            log(f"  Skipping empty file: {filepath.name}")
+            continue
+        if not dry_run and _journaled_extraction(filepath, contents) is not None:
+            journaled.append(filepath)  # extracted by an earlier run — resumes on its own
+            continue
+        items.append((filepath, contents))
+    if len(items) < 2:
+        return journaled + [filepath for filepath, _ in items]
+
+    log(f"Processing {len(items)} quick idea(s) as one batch: {', '.join(f.name for f, _ in items)}")
+    log("  Calling Anthropic...")
+    try:
+        response_text = await extract_quick_batch_async(quick_prompt_text, [contents for _, contents in items])
+    except Exception as exc:
+        log(f"  ERROR: Anthropic API call failed for quick-idea batch: {exc}")
+        return journaled
+
+    grouped = parse_numbered_issues(response_text)
+    results = []
+    leftover = []
+    for n, (filepath, contents) in enumerate(items, 1):
+        issues = grouped.get(n)
+        if issues:
+            results.append((filepath, issues))
+            if not dry_run:
+                run_journal.record("file", filepath.name, "extracted", format_issues(issues),
+                                   run_journal.input_hash(contents))
+        else:
+            leftover.append(filepath)
+    log(f"  Found {sum(len(i) for _, i in results)} issue(s) for {len(results)}/{len(items)} quick idea(s).")
+    if leftover:
+        log(f"  No issue block for {len(leftover)} item(s) — extracting those individually.")
+    if results:
+        await _dedup_and_post_async(results, pat, dry_run, existing_issues, post_lock)
+    return journaled + leftover
+
+
+def _quick_batches(files: list[Path]) -> list[list[Path]]:
+    """Group quick-idea files into micro-batches of at most QUICK_BATCH_SIZE / CHUNK_TOKENS."""
+    batches: list[list[Path]] = []
+    current: list[Path] = []
+    tokens = 0
+    for filepath in files:
+        try:
+            size = estimate_tokens(filepath.read_text(encoding="utf-8"))
+        except Exception:
+            size = 0
+        if current and (len(current) >= QUICK_BATCH_SIZE or tokens + size > CHUNK_TOKENS):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(filepath)
+        tokens += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _run_extraction_batches_async(
+    files: list[Path],
+    prompt_for,
+    pat: str,
+    existing_issues: list[dict],
+    post_lock: asyncio.Lock,
+    batch_mode: bool,
+) -> list[Path]:
+    """Apply finished extraction batches, then (in batch mode) submit eligible files.
+
+    Returns the files still to be processed live this run.
+    """
+    async def _apply_result(meta: dict, text: str | None) -> None:
+        filepath = INTAKE_DIR / meta["file"]
+        if text is None or not filepath.exists():
+            return
+        source = run_journal.input_hash(filepath.read_text(encoding="utf-8"))
+        if meta.get("source", source) != source:
+            log(f"  Skipping batched extraction for {filepath.name}: edited since it was submitted.")
+            return
+        # Journaled first, so a crash while posting resumes from here instead of losing the paid result.
+        run_journal.record("file", filepath.name, "extracted", text, source)
+        log(f"Applying batched extraction for {filepath.name}...")
+        await _apply_extraction_async(filepath, text, pat, False, existing_issues, post_lock)
+
+    await batch_jobs.collect_async("extract", _apply_result)
+    queued = {meta["file"] for meta in batch_jobs.pending_items("extract")}
+    files = [f for f in files if f.exists() and f.name not in queued]
+    if queued:
+        log(f"{len(queued)} file(s) still waiting on a submitted batch.")
+    if not batch_mode:
+        return files
+
+    live: list[Path] = []
+    requests = []
+    for i, filepath in enumerate(files):
+        if outbox.has_entry(filepath):
+            live.append(filepath)  # already extracted — only posting is left
+            continue
+        try:
+            contents = filepath.read_text(encoding="utf-8")
+        except Exception:
+            contents = ""
+        params = extraction_request(prompt_for(filepath), contents) if contents.strip() else None
+        if params is None:
+            live.append(filepath)  # unreadable, empty or large enough to need chunking
+        else:
+            requests.append((f"extract-{i}", {"file": filepath.name, "source": run_journal.input_hash(contents)}, params))
+    if requests and not await batch_jobs.submit_async("extract", requests):
+        return files
+    return live
+
+
+async def run_files_async(
+    files: list[Path],
+    prompt_text: str,
+    quick_prompt_text: str,
+    pat: str,
+    dry_run: bool,
+    existing_issues: list[dict],
+    workers: int,
+    batch_mode: bool = False,
+) -> None:
+    """Phase 1: process intake files concurrently, at most ``workers`` at a time.
+
+    Finished extraction batches are applied first. In batch mode, files that fit
+    a single call are submitted as a Message Batch instead of extracted live.
+    Quick-idea files (Discord messages) are packed into micro-batches, one
+    extraction call and one dedup pass per batch. Files whose content has been
+    processed before (input_ledger) are moved straight to _processed.
+    """
+    post_lock = asyncio.Lock()
+    slots = asyncio.Semaphore(workers)
+
+    if not dry_run and LEDGER_ENABLED:
+        files = _skip_seen_inputs(files)
+
+    def _prompt_for(filepath: Path) -> str:
+        return quick_prompt_text if (_is_quick_idea(filepath) and quick_prompt_text) else prompt_text
+
+    if not dry_run:
+        files = await _run_extraction_batches_async(
+            files, _prompt_for, pat, existing_issues, post_lock, batch_mode,
+        )
+
+    async def _worker(filepath: Path) -> None:
+        async with slots:
+            try:
+                await process_file_async(filepath, _prompt_for(filepath), pat, dry_run, existing_issues, post_lock)
+            except Exception as exc:
+                log(f"UNEXPECTED ERROR processing {filepath.name}: {exc}")
+
+    async def _batch_worker(batch: list[Path]) -> None:
+        async with slots:
+            try:
+                leftover = await process_quick_batch_async(
+                    batch, quick_prompt_text, pat, dry_run, existing_issues, post_lock,
+                )
+            except Exception as exc:
+                log(f"UNEXPECTED ERROR processing quick-idea batch: {exc}")
+                return
+        await asyncio.gather(*(_worker(f) for f in leftover))
+
+    quick = [
+        f for f in files if _is_quick_idea(f) and not outbox.has_entry(f)
+    ] if quick_prompt_text and QUICK_BATCH_SIZE > 1 else []
+    others = [f for f in files if f not in quick]
+    await asyncio.gather(
+        *(_batch_worker(batch) for batch in _quick_batches(quick)),
+        *(_worker(f) for f in others),
+    )
+
+
+def load_prompts() -> tuple[str, str]:
+    """Load the extraction prompt (required) and quick-idea prompt (optional)."""
+    if not PROMPT_FILE.exists():
+        log(f"ERROR: Prompt file not found: {PROMPT_FILE}")
+        sys.exit(1)
+    prompt_text = PROMPT_FILE.read_text(encoding="utf-8")
+    log(f"Loaded extraction prompt ({len(prompt_text)} chars)")
+
+    quick_prompt_text = ""
+    if QUICK_PROMPT_FILE.exists():
+        quick_prompt_text = QUICK_PROMPT_FILE.read_text(encoding="utf-8")
+        log(f"Loaded quick-idea prompt ({len(quick_prompt_text)} chars)")
+    return prompt_text, quick_prompt_text
+
+
+def collect_intake_files() -> list[Path]:
+    """Every .txt/.md file waiting in the intake folder, sorted by name."""
+    return sorted(
+        f for f in INTAKE_DIR.iterdir()
+        if f.is_file() and f.suffix.lower() in {".txt", ".md"}
+    )
 
 
 def main() -> None:
@@ -103,7 +621,43 @@ def main() -> None:
         action="store_true",
         help="Skip Phase 2 backlog processing (Spark → Shaped enrichment).",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=INTAKE_WORKERS,
+        help=f"Number of files to extract in parallel (default: {INTAKE_WORKERS}).",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        default=BATCH_MODE,
+        help="Submit extraction and enrichment as Message Batches; a later run applies the results.",
+    )
+    parser.add_argument(
+        "--no-ai-cache",
+        action="store_true",
+        help="Bypass the on-disk AI response cache (always call the API).",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running: watch the intake folder and process files as they arrive.",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report import time per module and exit (non-zero if over INTAKE_STARTUP_BUDGET_MS).",
+    )
     args = parser.parse_args()
+    if args.profile_startup:
+        from startup_profile import profile_startup
+        sys.exit(0 if profile_startup() else 1)
+    if args.no_ai_cache:
+        response_cache.enabled = False
+
+    if not run_lock.acquire():
+        log("Another intake run holds the lock — skipping this run.")
+        return
 
     # Validate intake folder
     if not INTAKE_DIR.exists():
@@ -111,17 +665,7 @@ def main() -> None:
         log("Create the folder (or set up a junction) and add files to process.")
         sys.exit(1)
 
-    # Load prompts
-    if not PROMPT_FILE.exists():
-        log(f"ERROR: Prompt file not found: {PROMPT_FILE}")
-        sys.exit(1)
-    prompt_text = PROMPT_FILE.read_text(encoding="utf-8")
-    log(f"Loaded extraction prompt ({len(prompt_text)} chars)")
-
-    quick_prompt_text = ""
-    if QUICK_PROMPT_FILE.exists():
-        quick_prompt_text = QUICK_PROMPT_FILE.read_text(encoding="utf-8")
-        log(f"Loaded quick-idea prompt ({len(quick_prompt_text)} chars)")
+    prompt_text, quick_prompt_text = load_prompts()
 
     # Resolve GitLab PAT
     pat = ""
@@ -132,43 +676,67 @@ def main() -> None:
             log(f"ERROR: {exc}")
             sys.exit(1)
 
+    if args.daemon:
+        anthropic_api_key()
+        from daemon import run_daemon
+        run_daemon(pat, prompt_text, quick_prompt_text, args.dry_run, args.skip_backlog, args.workers, args.batch)
+        return
+
     # Scrape Discord #intake channel (if configured)
     scraped = scrape_intake_channel()
     if scraped:
         log(f"Scraped {scraped} message(s) from Discord #intake.")
 
-    # Collect files
-    files = sorted(
-        f for f in INTAKE_DIR.iterdir()
-        if f.is_file() and f.suffix.lower() in {".txt", ".md"}
-    )
+    files = [] if CHANGE_GATE and change_gate.intake_unchanged() else collect_intake_files()
 
     if not files:
+        if CHANGE_GATE:
+            change_gate.mark_intake_empty()
         log(f"No .txt or .md files found in {INTAKE_DIR}. Nothing to do.")
     else:
         log(f"Found {len(files)} file(s) to process in {INTAKE_DIR}")
+        anthropic_api_key()  # checked per stage, so runs with nothing to extract start without it
         if args.dry_run:
             log("DRY RUN mode — GitLab POSTs will be skipped.")
 
         # Fetch existing issues once for dedup
         existing_issues = []
         if not args.dry_run:
-            existing_issues = fetch_existing_issues(pat)
+            try:
+                existing_issues = fetch_existing_issues(pat)
+            except GitLabError as exc:
+                log(f"ERROR: Could not load existing issues for dedup: {exc}")
+                log("Leaving files in _intake for retry.")
+                sys.exit(1)
             log(f"Loaded {len(existing_issues)} existing open issue(s) for dedup.")
 
-        for filepath in files:
-            try:
-                is_discord = filepath.name.startswith("discord-")
-                prompt = quick_prompt_text if (is_discord and quick_prompt_text) else prompt_text
-                process_file(filepath, prompt, pat, args.dry_run, existing_issues)
-            except Exception as exc:
-                log(f"UNEXPECTED ERROR processing {filepath.name}: {exc}")
+        workers = max(1, min(args.workers, len(files)))
+        log(f"Processing with {workers} worker(s).")
+        with metrics.span("phase", "extraction"):
+            aio.run(run_files_async(
+                files, prompt_text, quick_prompt_text, pat, args.dry_run, existing_issues, workers, args.batch,
+            ))
+            flush_backlog_notifications()
 
     # Phase 2: Backlog processing
     if not args.dry_run and not args.skip_backlog and pat:
-        from backlog_processor import run_backlog_processor
-        run_backlog_processor(pat)
+        if CHANGE_GATE and aio.run(change_gate.backlog_idle_async(pat)):
+            log("Phase 2: Nothing new on the board and nothing pending — skipping.")
+        else:
+            anthropic_api_key()
+            from backlog_processor import run_backlog_processor
+            with metrics.span("phase", "backlog"):
+                run_backlog_processor(pat, batch_mode=args.batch)
 
+    response_cache.evict()
+    run_journal.prune()
+    log(usage_summary())
+    log(routing_summary())
+    log(rate_governor.summary())
+    log(metrics.summary())
+    report = metrics.write_report()
+    if report:
+        log(f"Run report: {report}")
     log("Done.")
 
 
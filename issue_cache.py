@@ -0,0 +1,107 @@
+"""On-disk SQLite cache of open GitLab issues, kept current by delta syncs.
+
+Storage only — the HTTP side lives in gitlab_client.sync_issue_cache_async.
+"""
+
+import json
+import sqlite3
+from contextlib import closing
+
+from config import DATA_ROOT
+
+CACHE_FILE = DATA_ROOT / "issues.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    iid INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    description TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(CACHE_FILE)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def get_meta(key: str) -> str | None:
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_meta(key: str, value: str) -> None:
+    with closing(_connect()) as conn, conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def apply(issues: list[dict]) -> tuple[int, int]:
+    """Upsert open issues and drop closed ones from raw GitLab issue JSON.
+
+    Returns (upserted, removed).
+    """
+    upserts = []
+    closed = []
+    for issue in issues:
+        if "iid" not in issue:
+            continue
+        if issue.get("state", "opened") == "opened":
+            upserts.append((
+                issue["iid"],
+                issue.get("title", ""),
+                json.dumps(issue.get("labels", [])),
+                issue.get("description") or "",
+                issue.get("updated_at", ""),
+            ))
+        else:
+            closed.append((issue["iid"],))
+
+    with closing(_connect()) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO issues (iid, title, labels, description, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            upserts,
+        )
+        removed = conn.executemany("DELETE FROM issues WHERE iid = ?", closed).rowcount
+    return len(upserts), removed
+
+
+def prune(keep_iids: set[int]) -> int:
+    """Remove every cached issue not in ``keep_iids`` (the complete open set). Returns the count."""
+    with closing(_connect()) as conn, conn:
+        cached = {row[0] for row in conn.execute("SELECT iid FROM issues")}
+        stale = [(iid,) for iid in cached - keep_iids]
+        conn.executemany("DELETE FROM issues WHERE iid = ?", stale)
+    return len(stale)
+
+
+def get(iid: int) -> dict | None:
+    """The cached open issue ``iid``, or None if it isn't open (closed, moved or deleted)."""
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT iid, title, labels, description FROM issues WHERE iid = ?", (iid,)).fetchone()
+    if row is None:
+        return None
+    return {"iid": row[0], "title": row[1], "labels": json.loads(row[2]), "description": row[3]}
+
+
+def open_issues(label: str | None = None) -> list[dict]:
+    """Return cached open issues, optionally only those carrying ``label``."""
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT iid, title, labels, description FROM issues ORDER BY iid DESC"
+        ).fetchall()
+    issues = []
+    for iid, title, labels_json, description in rows:
+        labels = json.loads(labels_json)
+        if label is None or label in labels:
+            issues.append({"iid": iid, "title": title, "description": description, "labels": labels})
+    return issues
@@ -0,0 +1,158 @@
+"""Local TF-IDF index of existing issue titles for fast duplicate-candidate lookup.
+
+Persisted as JSON under DATA_ROOT so it survives between runs. Only titles are
+stored; term vectors are rebuilt in memory on load, which takes milliseconds
+even for a few thousand issues.
+"""
+
+import json
+import math
+import re
+from collections import Counter
+
+from config import DATA_ROOT, log
+
+INDEX_FILE = DATA_ROOT / "_index" / "issues.json"
+
+_STOPWORDS = {
+    "a", "an", "and", "the", "to", "for", "of", "in", "on", "with", "into", "from",
+    "by", "or", "is", "as", "at", "be", "it", "this", "that", "add", "new",
+}
+
+_titles: dict[str, str] = {}
+_vectors: dict[str, dict[str, float]] = {}
+_postings: dict[str, set[str]] = {}
+_norms: dict[str, float] = {}  # cached document norms — cleared whenever idf shifts
+_loaded = False
+_dirty = False
+
+
+def _terms(text: str) -> Counter:
+    """Word unigrams plus per-word character trigrams, so inflections still overlap."""
+    terms: Counter = Counter()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        terms[word] += 1
+        padded = f"^{word}$"
+        for i in range(len(padded) - 2):
+            terms["#" + padded[i:i + 3]] += 1
+    return terms
+
+
+def _idf(term: str) -> float:
+    return math.log((len(_titles) + 1) / (len(_postings.get(term, ())) + 1)) + 1.0
+
+
+def _index(iid: str, title: str) -> None:
+    _norms.clear()
+    terms = _terms(title)
+    _titles[iid] = title
+    _vectors[iid] = dict(terms)
+    for term in terms:
+        _postings.setdefault(term, set()).add(iid)
+
+
+def _unindex(iid: str) -> None:
+    _norms.clear()
+    _titles.pop(iid, None)
+    for term in _vectors.pop(iid, {}):
+        ids = _postings.get(term)
+        if ids:
+            ids.discard(iid)
+            if not ids:
+                del _postings[term]
+
+
+def _ensure_loaded() -> None:
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    if not INDEX_FILE.exists():
+        return
+    try:
+        data = json.loads(INDEX_FILE.read_text(encoding="utf-8"))
+        for iid, title in data.get("issues", {}).items():
+            _index(iid, title)
+    except (OSError, ValueError) as exc:
+        log(f"  Warning: could not load issue index ({exc}) — rebuilding")
+
+
+def save() -> None:
+    """Write the index to disk if it changed since the last save."""
+    global _dirty
+    if not _dirty:
+        return
+    INDEX_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = INDEX_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": 1, "issues": _titles}), encoding="utf-8")
+    tmp.replace(INDEX_FILE)
+    _dirty = False
+
+
+def add_issue(iid: int | str, title: str) -> None:
+    """Add or retitle one issue — called as issues are created."""
+    global _dirty
+    _ensure_loaded()
+    key = str(iid)
+    if _titles.get(key) == title:
+        return
+    _unindex(key)
+    _index(key, title)
+    _dirty = True
+
+
+def sync(issues: list[dict]) -> None:
+    """Make the index match ``issues`` (the open board), touching only what changed."""
+    global _dirty
+    _ensure_loaded()
+    current = {str(iss["iid"]): iss["title"] for iss in issues if iss.get("iid") is not None}
+    stale = [iid for iid in _titles if iid not in current]
+    changed = [iid for iid, title in current.items() if _titles.get(iid) != title]
+    for iid in stale:
+        _unindex(iid)
+    for iid in changed:
+        _unindex(iid)
+        _index(iid, current[iid])
+    if stale or changed:
+        _dirty = True
+        log(f"  Issue index: +{len(changed)} / -{len(stale)} ({len(_titles)} indexed)")
+    save()
+
+
+def similarity(a: str, b: str) -> float:
+    """TF-IDF cosine of two texts, weighted like the index — for titles not on the board yet."""
+    _ensure_loaded()
+    va = {t: n * _idf(t) for t, n in _terms(a).items()}
+    vb = {t: n * _idf(t) for t, n in _terms(b).items()}
+    norm = math.sqrt(sum(w * w for w in va.values())) * math.sqrt(sum(w * w for w in vb.values()))
+    if not norm:
+        return 0.0
+    return sum(w * vb.get(t, 0.0) for t, w in va.items()) / norm
+
+
+def find_candidates(text: str, k: int = 5, min_score: float = 0.3) -> list[dict]:
+    """Return up to ``k`` indexed issues most similar to ``text`` by TF-IDF cosine."""
+    _ensure_loaded()
+    terms = _terms(text)
+    query = {t: n * _idf(t) for t, n in terms.items()}
+    if not any(t in _postings for t in query):
+        return []
+    query_norm = math.sqrt(sum(w * w for w in query.values()))
+
+    scores: Counter = Counter()
+    for term, weight in query.items():
+        for iid in _postings.get(term, ()):
+            scores[iid] += weight * _vectors[iid][term] * _idf(term)
+
+    results = []
+    for iid, dot in scores.items():
+        doc_norm = _norms.get(iid)
+        if doc_norm is None:
+            doc_norm = _norms[iid] = math.sqrt(sum((n * _idf(t)) ** 2 for t, n in _vectors[iid].items()))
+        score = dot / (query_norm * doc_norm)
+        if score >= min_score:
+            results.append({"iid": int(iid) if iid.isdigit() else iid, "title": _titles[iid], "score": score})
+    results.sort(key=lambda r: r["score"], reverse=True)
+    return results[:k]
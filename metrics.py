@@ -0,0 +1,189 @@
+"""Lightweight run metrics — timed spans, a JSON run report and an optional Prometheus textfile.
+
+Wrap a unit of work in ``with metrics.span(name, label) as s:`` and attach
+counts with ``s.add(bytes=..., output_tokens=...)``. Code further down the
+call stack can add to whichever span is open with ``metrics.add(retries=1)``,
+so retry loops needn't know who is timing them. Spans are aggregated per
+(name, label) — count, errors, total and max seconds, and every count added.
+
+``write_report`` writes the aggregate to ``LOG_DIR/run-<start>.json`` (the
+daemon rewrites one file as it goes) and, with INTAKE_METRICS_PROMETHEUS on,
+``LOG_DIR/intake.prom`` for node_exporter's textfile collector.
+"""
+
+import contextvars
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from config import LOG_DIR, METRICS_PROMETHEUS, log
+
+REPORT_KEEP = 200  # newest run reports kept in LOG_DIR
+PROM_FILE = "intake.prom"
+
+# USD per million tokens: input, output, cache read, cache write. First substring match wins.
+MODEL_PRICES = [
+    ("haiku", (1.00, 5.00, 0.10, 1.25)),
+    ("sonnet", (3.00, 15.00, 0.30, 3.75)),
+    ("opus-4-5", (5.00, 25.00, 0.50, 6.25)),
+    ("opus-4-6", (5.00, 25.00, 0.50, 6.25)),
+    ("opus", (15.00, 75.00, 1.50, 18.75)),
+]
+TOKEN_COUNTS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+_started = time.time()
+_stats: dict[tuple[str, str], dict] = {}
+_stats_lock = threading.Lock()
+_current: contextvars.ContextVar = contextvars.ContextVar("intake_span", default=None)
+
+
+class Span:
+    """One timed unit of work. An exception leaving the block, or ``fail()``, counts it as an error."""
+
+    def __init__(self, name: str, label: str = ""):
+        self.name = name
+        self.label = label
+        self.counts: dict[str, float] = {}
+        self.failed = False
+
+    def add(self, **counts: float) -> None:
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def fail(self) -> None:
+        self.failed = True
+
+    def __enter__(self) -> "Span":
+        self._start = time.monotonic()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current.reset(self._token)
+        _record(self, time.monotonic() - self._start, self.failed or exc_type is not None)
+
+
+def span(name: str, label: str = "") -> Span:
+    return Span(name, label)
+
+
+def add(**counts: float) -> None:
+    """Add counts to the innermost open span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.add(**counts)
+
+
+def _record(s: Span, seconds: float, failed: bool) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault((s.name, s.label), {"count": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["errors"] += int(failed)
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        for key, value in s.counts.items():
+            stats[key] = stats.get(key, 0) + value
+
+
+def cost_usd(model: str, counts: dict) -> float | None:
+    """List-price cost of the tokens in ``counts`` for ``model``, or None if its price is unknown."""
+    for fragment, prices in MODEL_PRICES:
+        if fragment in model:
+            return sum(counts.get(key, 0) * price for key, price in zip(TOKEN_COUNTS, prices)) / 1_000_000
+    return None
+
+
+def report() -> dict:
+    """The run so far as a JSON-ready dict."""
+    with _stats_lock:
+        spans = [{"name": name, "label": label, **stats} for (name, label), stats in sorted(_stats.items())]
+    for entry in spans:
+        entry["seconds"] = round(entry["seconds"], 3)
+        entry["max_seconds"] = round(entry["max_seconds"], 3)
+    totals: dict[str, float] = {key: 0 for key in TOKEN_COUNTS}
+    totals["cost_usd"] = 0.0
+    for entry in spans:
+        if entry["name"] != "anthropic":
+            continue
+        for key in TOKEN_COUNTS:
+            totals[key] += entry.get(key, 0)
+        cost = cost_usd(entry["label"], entry)
+        if cost is not None:
+            entry["cost_usd"] = round(cost, 6)
+            totals["cost_usd"] += cost
+    totals["cost_usd"] = round(totals["cost_usd"], 6)
+    return {
+        "started_at": datetime.fromtimestamp(_started).isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "wall_seconds": round(time.time() - _started, 3),
+        "totals": totals,
+        "spans": spans,
+    }
+
+
+def _prom_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus(data: dict) -> str:
+    lines = [
+        "# HELP intake_last_run_timestamp_seconds When the last intake run report was written.",
+        "# TYPE intake_last_run_timestamp_seconds gauge",
+        f"intake_last_run_timestamp_seconds {time.time():.0f}",
+        "# TYPE intake_run_wall_seconds gauge",
+        f"intake_run_wall_seconds {data['wall_seconds']}",
+        "# TYPE intake_run_cost_usd gauge",
+        f"intake_run_cost_usd {data['totals']['cost_usd']}",
+    ]
+    metrics: dict[str, list[str]] = {}
+    for entry in data["spans"]:
+        labels = f'span="{_prom_label(entry["name"])}",label="{_prom_label(entry["label"])}"'
+        for key, value in entry.items():
+            if key in ("name", "label"):
+                continue
+            metric = f"intake_span_{key}"
+            metrics.setdefault(metric, []).append(f"{metric}{{{labels}}} {value:g}")
+    for metric, samples in sorted(metrics.items()):
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    tmp.replace(path)
+
+
+def write_report() -> Path | None:
+    """Write the run report (and the Prometheus textfile if enabled). Returns the report path."""
+    data = report()
+    path = LOG_DIR / f"run-{datetime.fromtimestamp(_started).strftime('%Y%m%d-%H%M%S')}.json"
+    try:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path, json.dumps(data, indent=2))
+        if METRICS_PROMETHEUS:
+            _write_atomic(LOG_DIR / PROM_FILE, _prometheus(data))
+        for old in sorted(LOG_DIR.glob("run-*.json"))[:-REPORT_KEEP]:
+            old.unlink(missing_ok=True)
+    except OSError as exc:
+        log(f"Warning: Could not write run report: {exc}")
+        return None
+    return path
+
+
+def summary() -> str:
+    """One line per span group for the end-of-run log."""
+    with _stats_lock:
+        items = sorted(_stats.items())
+    if not items:
+        return "Timings: nothing recorded."
+    parts = []
+    for (name, label), stats in items:
+        part = f"{name}{'/' + label if label else ''} {stats['count']}× {stats['seconds']:.1f}s"
+        if stats["errors"]:
+            part += f" ({stats['errors']} failed)"
+        parts.append(part)
+    return "Timings: " + ", ".join(parts) + "."
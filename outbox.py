@@ -0,0 +1,161 @@
+"""Persistent outbox of planned GitLab issues — makes posting resumable.
+
+Once a file's issues have been extracted and deduped they are written here,
+one JSON entry per source file under DATA_ROOT/_outbox, each item tagged with
+a content hash. Items are marked confirmed (with their iid) as GitLab accepts
+them. If a run fails partway through, the next run finds the entry, skips AI
+extraction and dedup entirely, and sends only the unconfirmed items. An entry
+is tied to a hash of its source file, so editing the file invalidates it.
+An entry planned while extraction is still streaming stays incomplete until
+the stream ends; an incomplete entry is discarded and the file re-extracted.
+"""
+
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+
+import issue_cache
+from config import DATA_ROOT, GITLAB_POST_CONCURRENCY, log
+from gitlab_client import post_issue_async
+from parser import is_prompt_request
+
+OUTBOX_DIR = DATA_ROOT / "_outbox"
+
+
+def _entry_path(filepath: Path) -> Path:
+    return OUTBOX_DIR / f"{filepath.name}.json"
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def source_hash(filepath: Path) -> str:
+    return hashlib.sha256(filepath.read_bytes()).hexdigest()
+
+
+def item_hash(issue: dict) -> str:
+    return _hash(f"{issue['title']}\n{issue['label']}\n{issue['description']}")
+
+
+def _save(entry: dict) -> None:
+    OUTBOX_DIR.mkdir(parents=True, exist_ok=True)
+    path = OUTBOX_DIR / f"{entry['file']}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(entry, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def has_entry(filepath: Path) -> bool:
+    return _entry_path(filepath).exists()
+
+
+def load(filepath: Path) -> dict | None:
+    """The outbox entry for ``filepath``, or None. A stale entry (file changed) is discarded."""
+    path = _entry_path(filepath)
+    if not path.exists():
+        return None
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        current = source_hash(filepath)
+    except (OSError, ValueError) as exc:
+        log(f"  Warning: could not read outbox entry for {filepath.name}: {exc}")
+        return None
+    if entry.get("source_hash") != current:
+        log(f"  {filepath.name} changed since its issues were planned — discarding outbox entry.")
+        path.unlink(missing_ok=True)
+        return None
+    if not entry.get("complete", True):
+        log(f"  {filepath.name} was cut off mid-extraction — discarding outbox entry and re-extracting.")
+        path.unlink(missing_ok=True)
+        return None
+    return entry
+
+
+def _item(issue: dict) -> dict:
+    return {
+        "hash": item_hash(issue),
+        "title": issue["title"],
+        "label": issue["label"],
+        "description": issue["description"],
+        "iid": None,
+        "attempted": False,
+    }
+
+
+def plan(filepath: Path, issues: list[dict], complete: bool = True) -> dict:
+    """Record the issues to post for ``filepath`` before any of them is sent.
+
+    Pass ``complete=False`` while extraction is still streaming, then add
+    further issues with ``extend`` and finish with ``mark_complete``.
+    """
+    entry = {
+        "file": filepath.name,
+        "source_hash": source_hash(filepath),
+        "complete": complete,
+        "items": [_item(issue) for issue in issues],
+    }
+    _save(entry)
+    return entry
+
+
+def extend(entry: dict, issues: list[dict]) -> None:
+    """Add more planned issues to an incomplete entry. Items already present (same hash) are skipped."""
+    known = {item["hash"] for item in entry["items"]}
+    entry["items"].extend(_item(issue) for issue in issues if item_hash(issue) not in known)
+    _save(entry)
+
+
+def mark_complete(entry: dict) -> None:
+    entry["complete"] = True
+    _save(entry)
+
+
+def pending(entry: dict) -> list[dict]:
+    return [item for item in entry["items"] if item["iid"] is None]
+
+
+def done(filepath: Path) -> None:
+    _entry_path(filepath).unlink(missing_ok=True)
+
+
+def _find_posted(item: dict) -> int | None:
+    """iid of an open board issue matching an attempted item — its POST may have landed unseen."""
+    for issue in issue_cache.open_issues():
+        if issue["title"] == item["title"]:
+            return issue["iid"]
+    return None
+
+
+async def send_async(entry: dict, pat: str) -> list[dict]:
+    """POST every unconfirmed item, at most GITLAB_POST_CONCURRENCY at once.
+
+    Each confirmation is saved as it arrives. Returns the items posted by this
+    call; anything left in ``pending(entry)`` afterwards failed.
+    """
+    slots = asyncio.Semaphore(GITLAB_POST_CONCURRENCY)
+    items = pending(entry)
+    posted: list[dict] = []
+
+    for item in items:
+        if item["attempted"]:
+            iid = _find_posted(item)
+            if iid is not None:
+                log(f"  Already on the board as #{iid}: {item['title']}")
+                item["iid"] = iid
+    items = pending(entry)
+    for item in items:
+        item["attempted"] = True
+    _save(entry)
+
+    async def _send(n: int, item: dict) -> None:
+        async with slots:
+            log(f"  Posting {n}/{len(items)}: {item['title']}")
+            prefix = "Prompt: " if is_prompt_request(item) else ""
+            if await post_issue_async(pat, item, False, prefix=prefix):
+                posted.append(item)
+                _save(entry)
+
+    await asyncio.gather(*(_send(n, item) for n, item in enumerate(items, 1)))
+    return posted
@@ -1,17 +1,92 @@
-"""Parse GITLAB ISSUE blocks from AI response text."""
+"""Parse issues from AI responses — structured (tool-use JSON) or GITLAB ISSUE markdown blocks."""
 
+import json
 import re
 
 ISSUE_PATTERN = re.compile(
-    r"### GITLAB ISSUE:\s*\[?\d+\]?\s*\n"
+    r"### GITLAB ISSUE:\s*\[?(?P<number>\d+)\]?\s*\n"
     r"\*\*Title:\*\*\s*(?P<title>.+?)\s*\n"
     r"\*\*Label:\*\*\s*(?P<label>.+?)\s*\n"
     r"\*\*Description:\*\*\s*\n(?P<description>.*?)(?=\n### GITLAB ISSUE:|\Z)",
     re.DOTALL,
 )
 
+# Tool the model is made to call in structured mode. Its input arrives as JSON
+# text in place of the markdown blocks, so the cache, batches and streaming
+# still deal in plain strings.
+# Every label the extraction prompt may give an issue — the board's stages plus the Prompt-Request flag
+ISSUE_LABELS = ["Spark", "Shaped", "Ready", "Building", "Graduated", "Prompt-Request"]
+
+ISSUES_TOOL = {
+    "name": "record_issues",
+    "description": "Record the GitLab issues extracted from the input, one entry per issue.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "issues": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "item": {
+                            "type": "integer",
+                            "description": "Number of the === ITEM n === the issue came from, when the input has items.",
+                        },
+                        "title": {"type": "string", "description": "Under 80 characters, clear and specific."},
+                        "labels": {
+                            "type": "array",
+                            "items": {"type": "string", "enum": ISSUE_LABELS},
+                            "description": "One stage label as the prompt's label guidance says, "
+                                           "plus Prompt-Request when the input asks for a prompt.",
+                        },
+                        "description": {"type": "string", "description": "Markdown body of the issue."},
+                    },
+                    "required": ["title", "labels", "description"],
+                },
+            },
+        },
+        "required": ["issues"],
+    },
+}
+
+
+def _validate_issue(obj) -> tuple[int | None, dict] | None:
+    """Check one structured issue and normalise it to the parse_issues shape. None if unusable."""
+    if not isinstance(obj, dict):
+        return None
+    title, description = obj.get("title"), obj.get("description")
+    if not isinstance(title, str) or not title.strip() or not isinstance(description, str):
+        return None
+    labels = obj.get("labels")
+    if isinstance(labels, str):
+        labels = [labels]
+    if not isinstance(labels, list) or not labels or not all(isinstance(l, str) for l in labels):
+        labels = ["Spark"]
+    item = obj.get("item")
+    issue = {"title": title.strip(), "label": ", ".join(l.strip() for l in labels), "description": description.strip()}
+    return (item if isinstance(item, int) else None), issue
+
+
+def _structured_issues(response_text: str) -> list[tuple[int | None, dict]] | None:
+    """Validated (item, issue) pairs from a structured response, or None if it isn't one."""
+    text = response_text.strip()
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    raw = data.get("issues") if isinstance(data, dict) else None
+    if not isinstance(raw, list):
+        return None
+    return [v for v in map(_validate_issue, raw) if v is not None]
+
 
 def parse_issues(response_text: str) -> list[dict]:
+    structured = _structured_issues(response_text)
+    if structured is not None:
+        return [issue for _, issue in structured]
+
     issues = []
     for m in ISSUE_PATTERN.finditer(response_text):
         title = m.group("title").strip()
@@ -21,6 +96,130 @@ def parse_issues(response_text: str) -> list[dict]:
     return issues
 
 
+def parse_numbered_issues(response_text: str) -> dict[int, list[dict]]:
+    """Parse issues grouped by item number — ``item`` when structured, else the ``[n]`` in each header."""
+    grouped: dict[int, list[dict]] = {}
+    structured = _structured_issues(response_text)
+    if structured is not None:
+        for item, issue in structured:
+            if item is not None:
+                grouped.setdefault(item, []).append(issue)
+        return grouped
+
+    for m in ISSUE_PATTERN.finditer(response_text):
+        grouped.setdefault(int(m.group("number")), []).append({
+            "title": m.group("title").strip(),
+            "label": m.group("label").strip(),
+            "description": m.group("description").strip(),
+        })
+    return grouped
+
+
+class IssueStreamParser:
+    """Incremental parser fed with response text as it streams in.
+
+    ``feed`` returns each issue completed by the new text and ``close`` returns
+    whatever completes at end of stream. A markdown block is complete once the
+    next header arrives; only the unfinished tail is kept and rescanned. A
+    structured (JSON) response is scanned brace by brace, so each entry of the
+    ``issues`` array is returned as soon as its object closes.
+    """
+
+    HEADER = "### GITLAB ISSUE:"
+
+    def __init__(self):
+        self._buffer = ""
+        self._json: bool | None = None  # decided by the first non-blank character
+        self._start = -1  # offset of the current block's header (markdown) or open issue object (JSON)
+        self._scan_from = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def _parse_block(self, block: str) -> list[dict]:
+        m = ISSUE_PATTERN.match(block)
+        if not m:
+            return []
+        return [{
+            "title": m.group("title").strip(),
+            "label": m.group("label").strip(),
+            "description": m.group("description").strip(),
+        }]
+
+    def _feed_json(self) -> list[dict]:
+        # Issue objects sit at depth 2: {"issues": [ {...}, {...} ]}
+        issues: list[dict] = []
+        buf = self._buffer
+        for i in range(self._scan_from, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if ch == "{" and self._depth == 2:
+                    self._start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if ch == "}" and self._depth == 2 and self._start >= 0:
+                    try:
+                        validated = _validate_issue(json.loads(buf[self._start:i + 1]))
+                    except ValueError:
+                        validated = None
+                    if validated is not None:
+                        issues.append(validated[1])
+                    self._start = -1
+        self._scan_from = len(buf)
+        return issues
+
+    def feed(self, text: str) -> list[dict]:
+        self._buffer += text
+        if self._json is None:
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return []
+            self._json = stripped.startswith("{")
+        if self._json:
+            return self._feed_json()
+
+        issues: list[dict] = []
+        while True:
+            pos = self._buffer.find(self.HEADER, self._scan_from)
+            if pos == -1:
+                # A header may be split across chunks — rescan the last few characters next time.
+                self._scan_from = max(self._scan_from, len(self._buffer) - len(self.HEADER) + 1)
+                return issues
+            if self._start >= 0:
+                issues.extend(self._parse_block(self._buffer[self._start:pos].rstrip("\n")))
+            self._buffer = self._buffer[pos:]
+            self._start = 0
+            self._scan_from = len(self.HEADER)
+
+    def close(self) -> list[dict]:
+        issues = []
+        if not self._json and self._start >= 0:
+            issues = self._parse_block(self._buffer[self._start:])
+        self.__init__()
+        return issues
+
+
+def format_issues(issues: list[dict]) -> str:
+    """Render issues back into GITLAB ISSUE blocks — the inverse of parse_issues."""
+    return "\n\n".join(
+        f"### GITLAB ISSUE: [{i}]\n"
+        f"**Title:** {issue['title']}\n"
+        f"**Label:** {issue['label']}\n"
+        f"**Description:**\n{issue['description']}"
+        for i, issue in enumerate(issues, 1)
+    )
+
+
 def is_prompt_request(issue: dict) -> bool:
     """Check if an issue has the Prompt-Request label."""
     return "prompt-request" in issue.get("label", "").lower()
@@ -0,0 +1,176 @@
+"""Shared rate governor for Anthropic calls — one view of the rate limits per model.
+
+Every request takes a slot from its model's governor before it is sent. The
+number of slots adapts AIMD-style: each success widens it a little (additive
+increase, about one slot per window of successes), each 429/529 halves it
+(multiplicative decrease). Any other failure — a 400, a 5xx, a dropped
+connection — leaves it as it is: it says nothing about the rate limits. Budgets come from the ``anthropic-ratelimit-*``
+response headers — requests and input tokens remaining until their reset —
+and are reserved locally as calls start, so callers starting together don't
+all spend the same headroom. When a budget is spent, new calls wait for its
+reset instead of hitting a 429. Retry delays are jittered so parallel callers
+that failed together don't retry together.
+"""
+
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+from config import AI_INITIAL_CONCURRENCY, AI_MAX_CONCURRENCY, log
+
+RETRY_DELAYS = [5, 15, 30]  # seconds — base backoff for transient errors, jittered per call
+LOW_BUDGET_FRACTION = 0.1  # stop widening once less than this share of a budget is left
+
+
+def _reset_at(value: str | None) -> float | None:
+    """Monotonic time of an RFC 3339 reset header, or None."""
+    if not value:
+        return None
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return time.monotonic() + max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+def _int_header(headers, name: str) -> int | None:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _Budget:
+    """One ``anthropic-ratelimit-<kind>-*`` budget: amount left and when it refills."""
+
+    def __init__(self):
+        self.limit: int | None = None
+        self.remaining: int | None = None
+        self.reset: float | None = None
+
+    def update(self, headers, kind: str) -> None:
+        remaining = _int_header(headers, f"anthropic-ratelimit-{kind}-remaining")
+        if remaining is None:
+            return
+        self.remaining = remaining
+        self.limit = _int_header(headers, f"anthropic-ratelimit-{kind}-limit") or self.limit
+        self.reset = _reset_at(headers.get(f"anthropic-ratelimit-{kind}-reset"))
+
+    def wait(self, amount: int, now: float) -> float:
+        """Seconds until ``amount`` fits in the budget (0 if it fits now or nothing is known)."""
+        if self.remaining is None or self.reset is None or now >= self.reset:
+            return 0.0
+        return 0.0 if self.remaining >= amount else self.reset - now
+
+    def take(self, amount: int) -> None:
+        if self.remaining is not None:
+            self.remaining -= amount
+
+    def low(self) -> bool:
+        return bool(self.limit) and self.remaining is not None and self.remaining < self.limit * LOW_BUDGET_FRACTION
+
+
+class Governor:
+    """Concurrency window and rate budgets for one model."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.window = float(AI_INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.requests = _Budget()
+        self.tokens = _Budget()
+        self.stats = {"calls": 0, "throttled": 0, "waited": 0.0, "peak_window": int(self.window)}
+        self._wakeups: dict[int, asyncio.Condition] = {}
+
+    def _condition(self) -> asyncio.Condition:
+        key = id(asyncio.get_running_loop())
+        cond = self._wakeups.get(key)
+        if cond is None:
+            cond = self._wakeups[key] = asyncio.Condition()
+        return cond
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait for a free slot and enough budget for one request of ``tokens`` input tokens."""
+        cond = self._condition()
+        started = time.monotonic()
+        async with cond:
+            while True:
+                now = time.monotonic()
+                wait = max(self.paused_until - now, self.requests.wait(1, now), self.tokens.wait(tokens, now))
+                if wait <= 0 and self.in_flight < int(self.window):
+                    break
+                try:
+                    await asyncio.wait_for(cond.wait(), timeout=wait if wait > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+            self.in_flight += 1
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        self.stats["calls"] += 1
+        self.stats["waited"] += time.monotonic() - started
+
+    async def release(self, headers=None, throttled: bool = False, retry_after: float | None = None,
+                      succeeded: bool = False) -> None:
+        """Return a slot, fold in the response's rate-limit headers and adjust the window.
+
+        The window shrinks when ``throttled`` and grows only when the call ``succeeded``.
+        """
+        if headers is not None:
+            self.requests.update(headers, "requests")
+            self.tokens.update(headers, "input-tokens")
+            if self.tokens.remaining is None:
+                self.tokens.update(headers, "tokens")
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            if throttled:
+                self.window = max(1.0, self.window / 2)
+                self.stats["throttled"] += 1
+                if retry_after:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                log(f"  Rate limited on {self.model} — concurrency window now {int(self.window)}.")
+            elif succeeded and not (self.requests.low() or self.tokens.low()):
+                self.window = min(float(AI_MAX_CONCURRENCY), self.window + 1 / self.window)
+                self.stats["peak_window"] = max(self.stats["peak_window"], int(self.window))
+            cond.notify_all()
+
+
+_governors: dict[str, Governor] = {}
+
+
+def governor(model: str) -> Governor:
+    gov = _governors.get(model)
+    if gov is None:
+        gov = _governors[model] = Governor(model)
+    return gov
+
+
+def retry_after(headers) -> float | None:
+    """The server's Retry-After in seconds, if it sent one."""
+    try:
+        value = headers.get("retry-after") if headers is not None else None
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff(attempt: int, server_delay: float | None = None) -> float:
+    """Delay before retry ``attempt`` — the server's Retry-After if given, else the base delay with jitter."""
+    if server_delay:
+        return server_delay + random.uniform(0, 1)
+    base = RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)]
+    return random.uniform(base / 2, base)
+
+
+def summary() -> str:
+    if not _governors:
+        return "Rate governor: no calls."
+    parts = [
+        f"{g.model}: {g.stats['calls']} call(s), {g.stats['throttled']} throttled, "
+        f"window {int(g.window)} (peak {g.stats['peak_window']}), {g.stats['waited']:.1f}s queued"
+        for g in _governors.values()
+    ]
+    return "Rate governor: " + "; ".join(parts) + "."
@@ -0,0 +1,83 @@
+"""Content-addressed on-disk cache of AI responses.
+
+Keyed by a hash of the full request (model, system prompt, input, max_tokens),
+so a retried file or a repeated dry run returns instantly while any change to
+the prompt or input misses. Entries live under DATA_ROOT/_cache/ai and are
+evicted by age and total size.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from config import DATA_ROOT, AI_CACHE_ENABLED, AI_CACHE_MAX_AGE_DAYS, AI_CACHE_MAX_MB, log
+
+CACHE_DIR = DATA_ROOT / "_cache" / "ai"
+
+enabled = AI_CACHE_ENABLED  # flipped off by --no-ai-cache
+
+
+def cache_key(params: dict) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _path(key: str):
+    return CACHE_DIR / key[:2] / f"{key}.json"
+
+
+def get(key: str) -> str | None:
+    if not enabled:
+        return None
+    path = _path(key)
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get("created", 0) > AI_CACHE_MAX_AGE_DAYS * 86400:
+        path.unlink(missing_ok=True)
+        return None
+    return entry.get("text")
+
+
+def put(key: str, model: str, text: str) -> None:
+    if not enabled:
+        return
+    path = _path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"created": time.time(), "model": model, "text": text}), encoding="utf-8")
+        tmp.replace(path)
+    except OSError as exc:
+        log(f"  Warning: could not write AI response cache: {exc}")
+
+
+def evict() -> None:
+    """Drop entries past the age limit, then oldest-first until under the size limit."""
+    if not CACHE_DIR.exists():
+        return
+    cutoff = time.time() - AI_CACHE_MAX_AGE_DAYS * 86400
+    entries = []
+    removed = 0
+    for path in CACHE_DIR.glob("*/*.json"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if stat.st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            removed += 1
+        else:
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    budget = AI_CACHE_MAX_MB * 1024 * 1024
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= budget:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    if removed:
+        log(f"  AI response cache: evicted {removed} entr{'y' if removed == 1 else 'ies'}.")
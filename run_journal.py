@@ -0,0 +1,94 @@
+"""Durable journal of pipeline steps per item, so a restarted run resumes where the last one stopped.
+
+Each intake file (by name) and each backlog issue (by iid) gets a row per
+completed step — Phase 1: extracted, deduped, posted; Phase 2: enriched,
+updated, prompt_built, delivered:<sink>, labelled. Steps that cost an AI call
+store the model's output together with a hash of the input it came from.
+A restarted run reuses a stored output as long as that input is unchanged,
+so a crash after a model call never pays for the call twice. Posting itself
+is made resumable by the outbox; the journal records what it produced. Rows
+older than KEEP_DAYS are pruned at the end of a run.
+"""
+
+import hashlib
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from config import DATA_ROOT, log
+
+JOURNAL_FILE = DATA_ROOT / "journal.sqlite"
+KEEP_DAYS = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS steps (
+    kind TEXT NOT NULL,
+    item TEXT NOT NULL,
+    step TEXT NOT NULL,
+    output TEXT NOT NULL,
+    source TEXT NOT NULL,
+    done_at TEXT NOT NULL,
+    PRIMARY KEY (kind, item, step)
+);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    JOURNAL_FILE.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(JOURNAL_FILE)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def input_hash(*parts: str) -> str:
+    """Hash of the input a step worked from — stored with its output, checked on reuse."""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def get(kind: str, item, step: str, source: str | None = None) -> str | None:
+    """A recorded step's output, or None if it hasn't been done (or was done for a different ``source``)."""
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute(
+                "SELECT output, source FROM steps WHERE kind = ? AND item = ? AND step = ?", (kind, str(item), step),
+            ).fetchone()
+    except sqlite3.Error as exc:
+        log(f"  Warning: could not read the run journal: {exc}")
+        return None
+    if row is None or (source is not None and row[1] != source):
+        return None
+    return row[0]
+
+
+def record(kind: str, item, step: str, output: str = "", source: str = "") -> None:
+    """Record that ``step`` finished for ``item``, with its output and the hash of its input."""
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO steps (kind, item, step, output, source, done_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, str(item), step, output, source, datetime.now().isoformat(timespec="seconds")),
+            )
+    except sqlite3.Error as exc:
+        log(f"  Warning: could not record {kind} {item} {step} in the run journal: {exc}")
+
+
+def forget(kind: str, item, *steps: str) -> None:
+    """Drop recorded steps for ``item`` once they can no longer be needed for a resume."""
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.executemany(
+                "DELETE FROM steps WHERE kind = ? AND item = ? AND step = ?", ((kind, str(item), s) for s in steps),
+            )
+    except sqlite3.Error as exc:
+        log(f"  Warning: could not update the run journal: {exc}")
+
+
+def prune() -> int:
+    """Drop steps older than KEEP_DAYS. Returns the number removed."""
+    cutoff = (datetime.now() - timedelta(days=KEEP_DAYS)).isoformat(timespec="seconds")
+    try:
+        with closing(_connect()) as conn, conn:
+            return conn.execute("DELETE FROM steps WHERE done_at < ?", (cutoff,)).rowcount
+    except sqlite3.Error as exc:
+        log(f"  Warning: could not prune the run journal: {exc}")
+        return 0
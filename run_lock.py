@@ -0,0 +1,49 @@
+"""Single-run lock — coalesces overlapping runs (scheduled ticks, a daemon, a manual run).
+
+The lock is an OS-level lock on DATA_ROOT/intake.lock, so it is released
+automatically when the holding process exits, even if it crashes.
+"""
+
+import os
+
+from config import DATA_ROOT, log
+
+LOCK_FILE = DATA_ROOT / "intake.lock"
+
+_handle = None  # kept open for the life of the process
+
+
+def acquire() -> bool:
+    """Take the run lock without blocking. Returns False if another process holds it."""
+    global _handle
+    if _handle is not None:
+        return True
+    try:
+        LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(LOCK_FILE, "a+")
+    except OSError as exc:
+        log(f"  Warning: could not open lock file {LOCK_FILE}: {exc} — running unlocked.")
+        return True
+
+    try:
+        try:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.seek(0)
+        holder = handle.read().strip()
+        handle.close()
+        if holder:
+            log(f"  Lock {LOCK_FILE.name} is held by pid {holder}.")
+        return False
+
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    _handle = handle
+    return True
@@ -0,0 +1,70 @@
+"""``--profile-startup`` — how long importing intake takes, module by module.
+
+Imports ``intake`` in a fresh interpreter under ``python -X importtime`` and
+logs the result: each of the project's own modules, then the heaviest
+packages they pull in. The total is checked against INTAKE_STARTUP_BUDGET_MS,
+so the report doubles as a regression check — it fails when over budget.
+Heavy SDKs (anthropic) shouldn't appear at all: the stage that first needs
+one imports it.
+"""
+
+import re
+import subprocess
+import sys
+import time
+
+from config import APP_DIR, STARTUP_BUDGET_MS, log
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+TOP_PACKAGES = 10
+
+
+def _import_times() -> tuple[float, dict[str, tuple[int, int]]]:
+    """(wall seconds for the whole interpreter, module → (self µs, cumulative µs)) for ``import intake``."""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import intake"],
+        cwd=APP_DIR, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        m = IMPORT_LINE.match(line)
+        if m:
+            modules[m[4]] = (int(m[1]), int(m[2]))
+    return wall, modules
+
+
+def profile_startup() -> bool:
+    """Log the import-time report. Returns False if importing intake is over budget (or fails)."""
+    try:
+        wall, modules = _import_times()
+    except (OSError, RuntimeError) as exc:
+        log(f"ERROR: Could not profile startup: {exc}")
+        return False
+
+    own = {path.stem for path in APP_DIR.glob("*.py")}
+    total_ms = modules.get("intake", (0, 0))[1] / 1000
+    log(f"Startup profile — importing intake: {total_ms:.0f} ms (interpreter start to exit: {wall * 1000:.0f} ms)")
+    log("  Project modules (self / cumulative ms):")
+    for name in sorted(own & modules.keys(), key=lambda n: -modules[n][1]):
+        self_us, cumulative_us = modules[name]
+        log(f"    {name:<20} {self_us / 1000:7.1f} {cumulative_us / 1000:9.1f}")
+
+    packages = sorted(
+        (name for name in modules if name not in own and "." not in name and not name.startswith("_")),
+        key=lambda n: -modules[n][1],
+    )[:TOP_PACKAGES]
+    log("  Heaviest packages (cumulative ms, nested ones counted again under their parent):")
+    for name in packages:
+        log(f"    {name:<20} {modules[name][1] / 1000:9.1f}")
+    if "anthropic" in modules:
+        log("  Warning: the anthropic SDK is imported at startup — import it in the stage that needs it.")
+
+    if total_ms > STARTUP_BUDGET_MS:
+        log(f"OVER BUDGET: {total_ms:.0f} ms > INTAKE_STARTUP_BUDGET_MS={STARTUP_BUDGET_MS:g} ms")
+        return False
+    log(f"Within budget ({STARTUP_BUDGET_MS:g} ms).")
+    return True